@@ -0,0 +1,227 @@
+"""
+Admission Control and Degradation
+Decides, when a frame arrives, whether it can still be answered before
+its deadline, and lowers the work per frame while the server stays
+overloaded.
+
+Each admitted frame carries a cost (model inputs at full size: 1 for a
+normal frame, tiles + 1 for a sliced one). The controller estimates a
+new frame's latency as
+
+    waited so far + service + (work ahead of it + cost - 1) * unit_cost
+
+- service: EWMA latency of frames that found the server idle.
+- unit_cost: EWMA of busy seconds per unit of work completed. When the
+  server is saturated this is the inverse of its throughput, batching
+  included.
+
+A frame whose estimate ends after its deadline is shed at once with a
+Retry-After hint, instead of queueing until the client has given up and
+wasting the work. Deadlines come from the client (X-Deadline-Ms) or
+default to `default_deadline`.
+
+Every `window` seconds the level goes up by one if the window shed frames
+or the estimated queueing delay passed `target` x the default deadline,
+and back down after `cooldown` calm windows. The caller maps levels to
+cheaper work (app.py: 1 no tiling, 2 smaller input size, 3 only frames
+with detections are stored).
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+ALPHA = 0.2  # EWMA weight of a new sample
+MIN_WINDOW_COST = 4  # fewer completed units in a window than this give no unit-cost sample
+SHED_RATE = 0.01  # shed fraction of a window that counts as overload
+CALM = 0.25  # queueing delay (x target) below which a window counts as calm
+
+
+class Ticket:
+    """One admission decision; pass it back to `done()` when the frame is finished."""
+
+    __slots__ = ("arrived", "deadline", "cost", "ahead", "estimate", "admitted", "retry_after", "level")
+
+    def __init__(self, arrived, deadline, cost, ahead, estimate, admitted, retry_after, level):
+        self.arrived = arrived
+        self.deadline = deadline
+        self.cost = cost
+        self.ahead = ahead
+        self.estimate = estimate
+        self.admitted = admitted
+        self.retry_after = retry_after
+        self.level = level
+
+    def expired(self, now=None):
+        """The deadline has passed (checked again before the model runs)."""
+        return self.deadline is not None and (now if now is not None else time.monotonic()) > self.deadline
+
+
+class AdmissionController:
+    def __init__(self, default_deadline=12.0, max_level=3, window=2.0, target=0.5, cooldown=3,
+                 latency_window=1024, clock=time.monotonic):
+        self.default_deadline = default_deadline
+        self.max_level = max(0, int(max_level))
+        self.window = window
+        self.target = target
+        self.cooldown = cooldown
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._backlog = 0.0  # cost of admitted, unfinished frames
+        self._service = None
+        self._unit_cost = None
+        self._level = 0
+        self._calm_windows = 0
+        self._busy = 0.0
+        self._busy_since = None
+        self._window_started = clock()
+        self._window_busy = 0.0
+        self._window_cost = 0.0
+        self._window_arrivals = 0
+        self._window_shed = 0
+        self._window_peak_delay = 0.0
+        self._latencies = deque(maxlen=latency_window)
+        self._admitted = 0
+        self._shed = 0
+        self._expired = 0
+        self._level_changes = 0
+
+    @property
+    def level(self):
+        return self._level
+
+    # --------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------
+
+    def admit(self, budget=None, cost=1.0, arrived=None, shed=True):
+        """
+        Ticket for a frame that arrived at `arrived` (clock time; default
+        now) with `budget` seconds to answer (None: the default deadline).
+        With `shed` off (stream sessions, which drop stale frames
+        themselves) it is always admitted but still counted.
+        """
+        now = self.clock()
+        arrived = now if arrived is None else arrived
+        budget = self.default_deadline if budget is None else budget
+        deadline = arrived + budget if shed and budget and budget > 0 else None
+        with self._lock:
+            self._roll_window(now)
+            ahead = self._backlog
+            estimate = self._estimate(now - arrived, ahead, cost)
+            self._window_arrivals += 1
+            self._window_peak_delay = max(self._window_peak_delay, self._queue_delay(ahead))
+            if deadline is not None and estimate is not None and arrived + estimate > deadline:
+                self._shed += 1
+                self._window_shed += 1
+                # Roughly when the work ahead will have drained far enough for a frame to fit
+                retry_after = max(1, math.ceil(arrived + estimate - deadline))
+                return Ticket(arrived, deadline, cost, ahead, estimate, False, retry_after, self._level)
+            if self._in_flight == 0:
+                self._busy_since = now
+            self._in_flight += 1
+            self._backlog += cost
+            self._admitted += 1
+            return Ticket(arrived, deadline, cost, ahead, estimate, True, None, self._level)
+
+    def expire(self, ticket):
+        """Record a frame dropped after admission because its deadline passed; call `done()` too."""
+        with self._lock:
+            self._expired += 1
+            self._window_shed += 1
+
+    def done(self, ticket, cost=None):
+        """The frame is answered; `cost` is the work it actually took, if it differs from the estimate."""
+        if not ticket.admitted:
+            return
+        now = self.clock()
+        cost = ticket.cost if cost is None else cost
+        with self._lock:
+            self._in_flight -= 1
+            self._backlog = max(0.0, self._backlog - ticket.cost)
+            if self._in_flight == 0 and self._busy_since is not None:
+                self._busy += now - self._busy_since
+                self._busy_since = None
+            self._window_cost += cost
+            latency = now - ticket.arrived
+            self._latencies.append(latency)
+            # Only single-frame answers: cache hits (cost 0) would drag the estimate
+            # towards zero, sliced ones (cost > 1) inflate it.
+            if 0 < cost <= 1 and (self._service is None or ticket.ahead == 0):
+                self._service = latency if self._service is None else (1 - ALPHA) * self._service + ALPHA * latency
+            self._roll_window(now)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else 0
+
+            offered = self._admitted + self._shed
+            return {
+                "level": self._level,
+                "max_level": self.max_level,
+                "default_deadline_ms": round(self.default_deadline * 1000),
+                "in_flight": self._in_flight,
+                "backlog_cost": round(self._backlog, 2),
+                "service_ms": round(self._service * 1000, 1) if self._service is not None else None,
+                "unit_cost_ms": round(self._unit_cost * 1000, 2) if self._unit_cost is not None else None,
+                "queue_delay_ms": round(self._queue_delay(self._backlog) * 1000, 1),
+                "admitted": self._admitted,
+                "shed": self._shed,
+                "expired": self._expired,
+                "shed_rate": round(self._shed / offered, 4) if offered else 0,
+                "level_changes": self._level_changes,
+                "latency_ms_p50": percentile(0.50),
+                "latency_ms_p95": percentile(0.95),
+                "latency_ms_p99": percentile(0.99),
+            }
+
+    # --------------------------------------------------------
+    # Estimates (called with the lock held)
+    # --------------------------------------------------------
+
+    def _queue_delay(self, ahead):
+        return ahead * self._unit_cost if self._unit_cost is not None else 0.0
+
+    def _estimate(self, waited, ahead, cost):
+        """Seconds from arrival to answer, or None before there is anything to go on."""
+        if self._service is None:
+            return None
+        unit_cost = self._unit_cost if self._unit_cost is not None else self._service
+        return waited + self._service + (ahead + cost - 1) * unit_cost
+
+    def _roll_window(self, now):
+        if now - self._window_started < self.window:
+            return
+        busy = self._busy + (now - self._busy_since if self._busy_since is not None else 0.0)
+        if self._window_cost >= MIN_WINDOW_COST:
+            sample = (busy - self._window_busy) / self._window_cost
+            self._unit_cost = sample if self._unit_cost is None else (1 - ALPHA) * self._unit_cost + ALPHA * sample
+
+        overloaded = (self._window_arrivals and self._window_shed / self._window_arrivals > SHED_RATE) \
+            or self._window_peak_delay > self.target * self.default_deadline
+        calm = not self._window_shed and self._window_peak_delay < CALM * self.target * self.default_deadline
+        if overloaded and self._level < self.max_level:
+            self._level += 1
+            self._level_changes += 1
+            self._calm_windows = 0
+        elif calm and self._level > 0:
+            self._calm_windows += 1
+            if self._calm_windows >= self.cooldown:
+                self._level -= 1
+                self._level_changes += 1
+                self._calm_windows = 0
+        elif not calm:
+            self._calm_windows = 0
+
+        self._window_started = now
+        self._window_busy = busy
+        self._window_cost = 0.0
+        self._window_arrivals = 0
+        self._window_shed = 0
+        self._window_peak_delay = 0.0
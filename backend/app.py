@@ -5,16 +5,42 @@ runs YOLOv5 detection, and returns bounding box results.
 """
 
 import os
-import uuid
+import json
+import time
+import atexit
+import threading
 import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from collections import Counter
+from flask import Flask, request, jsonify, send_file, Response, g, stream_with_context
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, insert, select, func, text, tuple_
 from PIL import Image
-import io
-import torch
 import numpy as np
 
+from admission import AdmissionController
+from batching import BatchScheduler
+from postprocess import LabelTable, postprocess
+from persistence import ImageWriter
+from ingest import DetectionWriter, enable_sqlite_wal
+from database import db, DamageSite, Detection, DetectionRollup, DetectionTotal, init_db
+from pagination import encode_cursor, decode_cursor
+from model_registry import ModelRegistry
+from frame_cache import FrameCache
+from stream import StreamMetrics, StreamSession
+import export
+import image_store
+import metrics
+import preprocess
+import spatial
+import rollups
+import sites
+import slicing
+
+try:
+    from flask_sock import ConnectionClosed, Sock  # optional: WebSocket /stream
+except ImportError:
+    Sock = None
+
 # ============================================================
 # APP CONFIGURATION
 # ============================================================
@@ -22,18 +48,144 @@ import numpy as np
 app = Flask(__name__)
 CORS(app)  # Allow mobile app to connect
 
-# Database
+# Database (DATABASE_PATH / UPLOAD_DIR move them, e.g. to a seeded benchmark database)
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(BASE_DIR, 'database', 'detections.db')}"
+DATABASE_PATH = os.path.abspath(os.environ.get("DATABASE_PATH") or os.path.join(BASE_DIR, "database", "detections.db"))
+app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DATABASE_PATH}"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Upload folder
-UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
+UPLOAD_FOLDER = os.path.abspath(os.environ.get("UPLOAD_DIR") or os.path.join(BASE_DIR, "uploads"))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(os.path.join(BASE_DIR, "database"), exist_ok=True)
+os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
 os.makedirs(os.path.join(BASE_DIR, "models"), exist_ok=True)
 
-db = SQLAlchemy(app)
+# Uploads: request size cap (413 above it), decoded pixel cap, model input size
+MAX_UPLOAD_MB = float(os.environ.get("MAX_UPLOAD_MB", 20))
+MAX_IMAGE_MP = float(os.environ.get("MAX_IMAGE_MP", 50))
+MODEL_INPUT_SIZE = int(os.environ.get("MODEL_INPUT_SIZE", 640))
+app.config["MAX_CONTENT_LENGTH"] = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+# Inference batching (frames from concurrent requests share one forward pass)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 25))
+
+# Admission control: a frame that cannot be answered within its deadline
+# (X-Deadline-Ms header, else ADMISSION_DEADLINE_MS; 0 disables shedding)
+# gets 503 + Retry-After at once. Under sustained overload, up to
+# ADMISSION_MAX_LEVEL steps of cheaper work: 1 no tiling, 2 inference at
+# DEGRADED_INPUT_SIZE, 3 only frames with detections are stored
+ADMISSION_DEADLINE_MS = float(os.environ.get("ADMISSION_DEADLINE_MS", 12000))
+ADMISSION_MAX_LEVEL = int(os.environ.get("ADMISSION_MAX_LEVEL", 3))
+ADMISSION_WINDOW_S = float(os.environ.get("ADMISSION_WINDOW_S", 2))
+DEGRADED_INPUT_SIZE = int(os.environ.get("DEGRADED_INPUT_SIZE", 416))
+
+# Background image writer (uploads are stored off the request path)
+IMAGE_WRITER_WORKERS = int(os.environ.get("IMAGE_WRITER_WORKERS", 2))
+IMAGE_WRITER_QUEUE = int(os.environ.get("IMAGE_WRITER_QUEUE", 256))
+
+# /uploads: content-addressed originals and on-demand thumbnails/previews
+# (kept in a cache of at most THUMBNAIL_CACHE_MB)
+THUMBNAIL_CACHE_MB = float(os.environ.get("THUMBNAIL_CACHE_MB", 256))
+UPLOAD_MAX_AGE_S = int(os.environ.get("UPLOAD_MAX_AGE_S", 365 * 24 * 3600))
+
+# Upload layout: files (one per frame) | segments (packed into append-only
+# segment files), retention of frames without detections (0 keeps them),
+# and the background pass that applies it and compacts segments
+UPLOAD_LAYOUT = os.environ.get("UPLOAD_LAYOUT", "files")
+SEGMENT_MAX_MB = float(os.environ.get("SEGMENT_MAX_MB", 256))
+EMPTY_FRAME_RETENTION_DAYS = float(os.environ.get("EMPTY_FRAME_RETENTION_DAYS", 0))
+UPLOAD_MAINTENANCE_INTERVAL_S = float(os.environ.get("UPLOAD_MAINTENANCE_INTERVAL_S", 3600))
+COMPACT_MIN_GARBAGE = float(os.environ.get("COMPACT_MIN_GARBAGE", 0.3))
+
+# Write-behind detection inserts (bulk flush on size or time)
+DB_FLUSH_ROWS = int(os.environ.get("DB_FLUSH_ROWS", 500))
+DB_FLUSH_MS = float(os.environ.get("DB_FLUSH_MS", 200))
+SQLITE_CACHE_MB = int(os.environ.get("SQLITE_CACHE_MB", 64))
+
+# History paging
+HISTORY_MAX_LIMIT = int(os.environ.get("HISTORY_MAX_LIMIT", 500))
+
+# Bulk export: rows fetched and encoded per chunk
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", export.CHUNK_ROWS))
+
+# Map: clusters below this zoom level, individual markers at or above it
+MAP_MARKER_ZOOM = int(os.environ.get("MAP_MARKER_ZOOM", 16))
+MAP_MAX_MARKERS = int(os.environ.get("MAP_MAX_MARKERS", 2000))
+
+# Optional cascade: a low-resolution pass of the same model decides whether
+# a frame is worth the full-resolution pass (0 disables the gate)
+GATE_SIZE = int(os.environ.get("GATE_SIZE", 0))
+GATE_THRESHOLD = float(os.environ.get("GATE_THRESHOLD", 0.10))  # keep low: favours recall
+
+# Sliced inference for high-resolution uploads: off | tiles | hybrid (tiles
+# plus the whole frame). Tiles are cut from the upload decoded at
+# SLICE_IMAGE_SIZE on its longest side (0: full resolution)
+SLICE_MODE = os.environ.get("SLICE_MODE", "off")
+SLICE_TILE = int(os.environ.get("SLICE_TILE", 640))
+SLICE_OVERLAP = float(os.environ.get("SLICE_OVERLAP", 0.2))
+SLICE_IMAGE_SIZE = int(os.environ.get("SLICE_IMAGE_SIZE", 1920))
+SLICE_MERGE = float(os.environ.get("SLICE_MERGE", 0.5))  # overlap (of the smaller box) that merges two boxes
+
+# Detections of the same code within this distance and time window are
+# merged into one damage site (0 disables merging)
+SITE_RADIUS_M = float(os.environ.get("SITE_RADIUS_M", sites.SITE_RADIUS_M))
+SITE_WINDOW_DAYS = float(os.environ.get("SITE_WINDOW_DAYS", sites.SITE_WINDOW.days))
+
+# Near-duplicate frames per device return cached detections (0 disables)
+FRAME_CACHE_SIZE = int(os.environ.get("FRAME_CACHE_SIZE", 8))
+FRAME_CACHE_SESSIONS = int(os.environ.get("FRAME_CACHE_SESSIONS", 256))
+FRAME_CACHE_HAMMING = int(os.environ.get("FRAME_CACHE_HAMMING", 6))
+FRAME_CACHE_DISTANCE_M = float(os.environ.get("FRAME_CACHE_DISTANCE_M", 15))
+FRAME_CACHE_MAX_AGE_S = float(os.environ.get("FRAME_CACHE_MAX_AGE_S", 120))
+
+# Prometheus /metrics. Worker processes merge their metrics through
+# METRICS_DIR (serve.py creates one); the sampling profiler under
+# /debug/profile is only available with PROFILER_ENABLED=1
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_INTERVAL_S = float(os.environ.get("METRICS_INTERVAL_S", 5))
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED") == "1"
+
+# WebSocket /stream: largest accepted frame (same cap as uploads) and
+# keep-alive ping interval (idle mobile connections are dropped by NATs)
+app.config["SOCK_SERVER_OPTIONS"] = {"max_message_size": app.config["MAX_CONTENT_LENGTH"],
+                                     "ping_interval": float(os.environ.get("STREAM_PING_S", 25))}
+
+db.init_app(app)
+
+with app.app_context():
+    enable_sqlite_wal(db.engine, cache_mb=SQLITE_CACHE_MB)
+
+# ============================================================
+# METRICS (see metrics.py)
+# ============================================================
+
+metrics_registry = metrics.Registry(METRICS_DIR, METRICS_INTERVAL_S)
+REQUEST_SECONDS = metrics_registry.histogram(
+    "rdd_http_request_seconds", "HTTP request latency", ("endpoint", "method", "status"))
+STAGE_SECONDS = metrics_registry.histogram(
+    "rdd_stage_seconds", "Time spent per pipeline stage (per frame; forward and db_flush per batch)", ("stage",))
+BATCH_SIZE = metrics_registry.histogram(
+    "rdd_model_batch_size", "Frames per forward pass", buckets=(1, 2, 4, 8, 16, 32, 64))
+FRAMES = metrics_registry.counter(
+    "rdd_frames_total", "Frames by outcome (detected, cached, gated, rejected, shed, error)", ("outcome",))
+DETECTIONS = metrics_registry.counter("rdd_detections_total", "Detections returned", ("damage_code",))
+ERRORS = metrics_registry.counter("rdd_errors_total", "Errors by pipeline stage", ("stage",))
+ROWS_LOST = metrics_registry.counter("rdd_detection_rows_lost_total", "Detection rows dropped after failed inserts")
+QUEUE_DEPTH = metrics_registry.gauge("rdd_queue_depth", "Items waiting in background queues", ("queue",))
+MODEL_READY = metrics_registry.gauge("rdd_model_ready", "1 once the model is loaded (in every process)", merge="min")
+ACTIVE_STREAMS = metrics_registry.gauge("rdd_active_streams", "Open /stream sessions")
+MEMORY = metrics_registry.gauge("rdd_process_memory_bytes", "Resident memory per process", ("pid", "kind"))
+DEGRADATION = metrics_registry.gauge("rdd_degradation_level",
+                                     "Admission control degradation level, highest over processes (0: full quality)",
+                                     merge="max")
+
+upload_store = image_store.ImageStore(UPLOAD_FOLDER, derived_max_bytes=int(THUMBNAIL_CACHE_MB * 1024 * 1024),
+                                      layout=UPLOAD_LAYOUT, segment_max_bytes=int(SEGMENT_MAX_MB * 1024 * 1024))
+image_writer = ImageWriter(workers=IMAGE_WRITER_WORKERS, max_queue=IMAGE_WRITER_QUEUE,
+                           write=lambda filename, data: upload_store.write(filename, data),
+                           on_write=lambda seconds: STAGE_SECONDS.observe(seconds, stage="image_write"))
+atexit.register(image_writer.shutdown)  # flush queued images on shutdown
 
 # ============================================================
 # DAMAGE TYPE LABELS (from RDD2022 dataset)
@@ -47,43 +199,23 @@ DAMAGE_LABELS = {
 }
 
 # ============================================================
-# DATABASE MODEL
+# DATABASE (model lives in database.py)
 # ============================================================
 
-class Detection(db.Model):
-    """Stores each detection record with location and damage info."""
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    latitude = db.Column(db.Float, nullable=True)
-    longitude = db.Column(db.Float, nullable=True)
-    image_filename = db.Column(db.String(255), nullable=True)
-    damage_type = db.Column(db.String(50), nullable=False)
-    damage_code = db.Column(db.String(10), nullable=False)
-    confidence = db.Column(db.Float, nullable=False)
-    bbox_x1 = db.Column(db.Float, nullable=False)
-    bbox_y1 = db.Column(db.Float, nullable=False)
-    bbox_x2 = db.Column(db.Float, nullable=False)
-    bbox_y2 = db.Column(db.Float, nullable=False)
-    notes = db.Column(db.Text, nullable=True)
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "timestamp": self.timestamp.isoformat(),
-            "latitude": self.latitude,
-            "longitude": self.longitude,
-            "image_filename": self.image_filename,
-            "damage_type": self.damage_type,
-            "damage_code": self.damage_code,
-            "confidence": round(self.confidence, 4),
-            "bbox": {
-                "x1": round(self.bbox_x1, 2),
-                "y1": round(self.bbox_y1, 2),
-                "x2": round(self.bbox_x2, 2),
-                "y2": round(self.bbox_y2, 2),
-            },
-            "notes": self.notes,
-        }
+def insert_detections(rows):
+    """Merge rows into damage sites and bulk-insert them (executemany) in a single transaction."""
+    started = time.perf_counter()
+    with app.app_context():
+        if SITE_RADIUS_M > 0:
+            sites.assign_sites(db.session.connection(), DamageSite.__table__, rows,
+                               SITE_RADIUS_M, datetime.timedelta(days=SITE_WINDOW_DAYS))
+        db.session.execute(insert(Detection), rows)
+        db.session.commit()
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="db_flush")
+
+
+detection_writer = DetectionWriter(insert_detections, max_rows=DB_FLUSH_ROWS, max_delay_ms=DB_FLUSH_MS)
+atexit.register(detection_writer.shutdown)  # flush buffered rows on shutdown
 
 # ============================================================
 # LOAD YOLOV5 MODEL
@@ -91,29 +223,75 @@ class Detection(db.Model):
 
 MODEL_PATH = os.path.join(BASE_DIR, "models", "best.pt")
 
-def load_model():
-    """
-    Load the trained YOLOv5 model.
-    If no custom model exists, it downloads the default YOLOv5s as fallback.
-    Replace 'best.pt' with your trained weights after training.
-    """
-    if os.path.exists(MODEL_PATH):
-        print(f"✅ Loading custom model from {MODEL_PATH}")
-        model = torch.hub.load("ultralytics/yolov5", "custom", path=MODEL_PATH, force_reload=False)
-    else:
-        print("⚠️  No custom model found at models/best.pt")
-        print("   Using default YOLOv5s. Train your model first for road damage detection.")
-        print("   Run: python train.py")
-        model = torch.hub.load("ultralytics/yolov5", "yolov5s", force_reload=False)
-
+def configure_model(model):
+    """Detection thresholds applied once the inference backend is loaded."""
     model.conf = 0.40  # Confidence threshold (40%)
     model.iou = 0.45   # NMS IoU threshold
     model.max_det = 20  # Max detections per image
-    return model
 
-print("🔄 Loading YOLOv5 model...")
-model = load_model()
-print("✅ Model loaded successfully!")
+
+# Weights come from models/ and the network is built from a local YOLOv5
+# source tree, or run on ONNX Runtime with INFERENCE_BACKEND=onnx|onnx-int8
+# (see model_registry.py and inference.py). Loading happens in the background
+# so the port comes up immediately; /detect returns 503 until it is ready.
+registry = ModelRegistry(configure=configure_model)
+registry.load_async()
+
+_labels = {}
+
+
+def get_labels():
+    """LabelTable for the loaded model (built once, needs the model's class names)."""
+    if "table" not in _labels:
+        _labels["table"] = LabelTable(DAMAGE_LABELS, getattr(registry.get(), "names", None))
+    return _labels["table"]
+
+
+def predict_batch(images):
+    """Run one forward pass over a list of images, returning one (n, 6) array per image."""
+    started = time.perf_counter()
+    results = registry.get().predict(images)
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="forward")
+    BATCH_SIZE.observe(len(images))
+    return results
+
+
+inference = BatchScheduler(predict_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+
+
+def predict_degraded_batch(images):
+    """Overload level 2: the same model on frames letterboxed to DEGRADED_INPUT_SIZE."""
+    started = time.perf_counter()
+    results = registry.get().predict(images, size=DEGRADED_INPUT_SIZE)
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="forward")
+    BATCH_SIZE.observe(len(images))
+    return results
+
+
+degraded_inference = BatchScheduler(predict_degraded_batch, max_batch_size=BATCH_MAX_SIZE,
+                                    max_wait_ms=BATCH_MAX_WAIT_MS) if ADMISSION_MAX_LEVEL >= 2 else None
+admission_control = AdmissionController(default_deadline=ADMISSION_DEADLINE_MS / 1000, max_level=ADMISSION_MAX_LEVEL,
+                                        window=ADMISSION_WINDOW_S, clock=time.perf_counter)
+
+
+def predict_gate_batch(images):
+    """Low-resolution pass: any box above GATE_THRESHOLD sends the frame on to the full model."""
+    started = time.perf_counter()
+    results = registry.get().predict(images, size=GATE_SIZE, conf=GATE_THRESHOLD)
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="gate_forward")
+    return results
+
+
+gate = BatchScheduler(predict_gate_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS) if GATE_SIZE else None
+gate_counts = {"passed": 0, "skipped": 0}
+gate_lock = threading.Lock()
+
+stream_metrics = StreamMetrics()
+
+frame_cache = FrameCache(
+    max_sessions=FRAME_CACHE_SESSIONS, per_session=FRAME_CACHE_SIZE, max_hamming=FRAME_CACHE_HAMMING,
+    max_distance_m=FRAME_CACHE_DISTANCE_M, max_age_seconds=FRAME_CACHE_MAX_AGE_S,
+) if FRAME_CACHE_SIZE > 0 else None
 
 # ============================================================
 # API ROUTES
@@ -121,17 +299,177 @@ print("✅ Model loaded successfully!")
 
 @app.route("/", methods=["GET"])
 def index():
-    """Health check endpoint."""
+    """Health check endpoint (answers while the model is still loading)."""
     return jsonify({
         "status": "running",
         "app": "Road Damage Detection API",
         "version": "1.0.0",
-        "model_loaded": model is not None,
+        "model_loaded": registry.ready,
+        "model": registry.status(),
         "custom_model": os.path.exists(MODEL_PATH),
         "damage_types": list(DAMAGE_LABELS.values()),
     })
 
 
+def predict_sliced(frame, mode):
+    """
+    Whole frame (hybrid) and tiles of `frame.source`, all queued on the
+    batch scheduler at once; merged boxes in upload pixels.
+    """
+    windows = slicing.tile_windows(frame.source.shape[1], frame.source.shape[0], SLICE_TILE, SLICE_OVERLAP)
+    futures = [inference.submit(frame.array)] if mode == "hybrid" else []
+    futures += [inference.submit(tile) for tile in slicing.crop(frame.source, windows)]
+    results = [future.result() for future in futures]
+    full = frame.restore(results.pop(0)) if mode == "hybrid" else None
+    predictions = slicing.merge(results, windows, (frame.scale_x, frame.scale_y), full, SLICE_MERGE,
+                                registry.get().max_det)
+    return predictions, len(windows)
+
+
+def lap(timings, stage, since):
+    """Record the milliseconds since `since` under `stage`; returns the new start time."""
+    now = time.perf_counter()
+    timings[stage] = round((now - since) * 1000, 2)
+    return now
+
+
+def observe_stages(timings, outcome):
+    """Feed one frame's timings_ms into the stage histograms."""
+    for stage, ms in timings.items():
+        STAGE_SECONDS.observe(ms / 1000, stage=stage)
+    FRAMES.inc(outcome=outcome)
+
+
+def frame_cost(slice_mode, level):
+    """Expected model work for a frame, in full-size model inputs (see admission.py)."""
+    if slice_mode != "off" and level < 1:
+        side = SLICE_IMAGE_SIZE or 4000  # full resolution: assume a 12 MP photo
+        tiles = len(slicing.tile_windows(side, side * 3 // 4, SLICE_TILE, SLICE_OVERLAP))
+        return tiles + (slice_mode == "hybrid")
+    if level >= 2 and degraded_inference:
+        return (DEGRADED_INPUT_SIZE / MODEL_INPUT_SIZE) ** 2
+    return 1.0
+
+
+def frame_work(body, ticket):
+    """Model work a finished frame actually took (cached and failed frames took none)."""
+    if not body.get("success") or body.get("cached"):
+        return 0.0
+    if body.get("sliced"):
+        return body["sliced"]["tiles"] + (body["sliced"]["mode"] == "hybrid")
+    return ticket.cost
+
+
+def detect_frame(image_bytes, latitude=None, longitude=None, save_to_db=True, session=None, slice_mode=None,
+                 ticket=None, identified=True):
+    """
+    Decode, detect and (optionally) save one frame; shared by /detect and
+    /stream. `slice_mode` overrides SLICE_MODE; the admission `ticket`
+    sets the degradation level and deadline. `identified` is False when
+    `session` is only the client address, which devices behind one NAT
+    share: the frame cache then matches exact repeats only. Returns
+    (response dict, HTTP status).
+    """
+    level = ticket.level if ticket else 0
+    slice_mode = "off" if level >= 1 else slice_mode or SLICE_MODE
+    sliced = slice_mode != "off"
+    reduced = level >= 2 and degraded_inference is not None
+    try:
+        # Read and process image
+        timings = {}
+        started = time.perf_counter()
+        timestamp = datetime.datetime.utcnow()
+        # Reduced-size decode + letterbox to the model input (boxes are mapped back below)
+        try:
+            frame = preprocess.prepare(image_bytes, DEGRADED_INPUT_SIZE if reduced else MODEL_INPUT_SIZE,
+                                       max_pixels=int(MAX_IMAGE_MP * 1e6),
+                                       source_size=SLICE_IMAGE_SIZE if sliced else None)
+        except (preprocess.UploadTooLarge, Image.DecompressionBombError) as e:
+            FRAMES.inc(outcome="rejected")
+            return {"success": False, "error": str(e)}, 413
+        started = lap(timings, "decode", started)
+
+        if frame_cache:
+            cache_keys = frame_cache.keys(image_bytes, frame.array)
+            cached = frame_cache.lookup(session, cache_keys, latitude, longitude, similar=identified)
+            started = lap(timings, "cache", started)
+            if cached:
+                result, match = cached
+                observe_stages(timings, "cached")
+                return {**result, "cached": match, "timings_ms": timings}, 200
+
+        # Waited too long in the server to be of use to the client any more
+        if ticket and ticket.expired(time.perf_counter()):
+            admission_control.expire(ticket)
+            FRAMES.inc(outcome="shed")
+            return {"success": False, "error": "Deadline passed before inference", "shed": True,
+                    "retry_after_s": 1}, 503
+
+        # Save uploaded image in the background (original bytes if already JPEG)
+        # Named by content hash: a repeated upload is already stored
+        filename, is_new = upload_store.claim(image_bytes)
+        store_image = is_new and image_writer.pending(filename) is None
+        if store_image and level < 3:
+            image_writer.submit(filename, image_bytes)
+
+        # Cheap low-resolution pass first, if enabled
+        passed = True
+        if gate:
+            passed = len(gate.predict(frame.array)) > 0
+            with gate_lock:
+                gate_counts["passed" if passed else "skipped"] += 1
+            started = lap(timings, "gate", started)
+
+        # Run YOLOv5 detection (batched with other in-flight requests)
+        tiles = 0
+        if passed and sliced:
+            predictions, tiles = predict_sliced(frame, slice_mode)
+            started = lap(timings, "detect", started)
+        elif passed:
+            # (n, 6) array: x1, y1, x2, y2, confidence, class — in upload pixels after restore()
+            predictions = frame.restore((degraded_inference if reduced else inference).predict(frame.array))
+            started = lap(timings, "detect", started)
+        else:
+            predictions = np.zeros((0, 6), dtype=np.float32)
+
+        detections, rows = postprocess(
+            predictions, get_labels(),
+            timestamp=timestamp, latitude=latitude, longitude=longitude, image_filename=filename,
+        )
+        started = lap(timings, "postprocess", started)
+        if store_image and level >= 3 and detections:
+            image_writer.submit(filename, image_bytes)  # overloaded: frames without detections are not kept
+
+        # Queue detections for the next bulk insert (write-behind)
+        if save_to_db:
+            detection_writer.add(rows)
+
+        result = {
+            "success": True,
+            "detections": detections,
+            "count": len(detections),
+            "image_filename": filename,
+            "image_size": {"width": frame.width, "height": frame.height},
+        }
+        if gate:
+            result["gated"] = not passed
+        if sliced:
+            result["sliced"] = {"mode": slice_mode, "tiles": tiles}
+        if level:
+            result["degraded"] = level
+        if frame_cache and not reduced:
+            frame_cache.store(session, cache_keys, result, latitude, longitude)
+        observe_stages(timings, "detected" if passed else "gated")
+        for code, count in Counter(d["damage_code"] for d in detections).items():
+            DETECTIONS.inc(count, damage_code=code)
+        return {**result, "timings_ms": timings}, 200
+
+    except Exception as e:
+        FRAMES.inc(outcome="error")
+        ERRORS.inc(stage="detect")
+        return {"success": False, "error": str(e)}, 500
+
+
 @app.route("/detect", methods=["POST"])
 def detect():
     """
@@ -143,6 +481,23 @@ def detect():
         - latitude: float (optional)
         - longitude: float (optional)
         - save: bool (optional, default True — saves to database)
+        - session_id / device_id: str (optional, scopes the repeat-frame
+          cache; without one, frames are scoped to the client address and
+          only exact repeats are served from the cache)
+        - slice: off | tiles | hybrid (optional, default SLICE_MODE) —
+          sliced inference for small damage in high-resolution photos
+
+    A frame that repeats one of the session's recent frames returns the
+    earlier result with "cached": "exact" | "similar", without running the
+    model or saving anything. With GATE_SIZE set, frames the low-resolution
+    pass finds nothing in skip the full model ("gated": true).
+    "timings_ms" breaks the request down per stage.
+
+    Admission: the optional X-Deadline-Ms header says how long the client
+    will wait (default ADMISSION_DEADLINE_MS). A frame that cannot be
+    answered in time gets 503 with "shed": true and a Retry-After header
+    straight away; under sustained overload frames are answered with less
+    work ("degraded": level, see admission.py).
 
     Response:
         {
@@ -155,164 +510,535 @@ def detect():
     if "image" not in request.files:
         return jsonify({"success": False, "error": "No image provided"}), 400
 
-    file = request.files["image"]
+    if not registry.ready:
+        state = registry.status()["state"]
+        return jsonify({"success": False, "error": f"Model is {state}", "model_state": state}), 503, {"Retry-After": "5"}
+
+    slice_mode = request.form.get("slice", SLICE_MODE)
+    if slice_mode not in slicing.MODES:
+        return jsonify({"success": False, "error": f"slice must be one of {', '.join(slicing.MODES)}"}), 400
+
     latitude = request.form.get("latitude", type=float)
     longitude = request.form.get("longitude", type=float)
     save_to_db = request.form.get("save", "true").lower() == "true"
+    device = request.form.get("session_id") or request.form.get("device_id")
+    session = device or request.remote_addr
+    budget = request.headers.get("X-Deadline-Ms", type=float)
+    ticket = admission_control.admit(budget / 1000 if budget else None, frame_cost(slice_mode, admission_control.level),
+                                     arrived=g.get("request_started"))
+    if not ticket.admitted:
+        FRAMES.inc(outcome="shed")
+        return jsonify({"success": False, "error": "Server overloaded", "shed": True,
+                        "retry_after_s": ticket.retry_after}), 503, {"Retry-After": str(ticket.retry_after)}
 
+    body = {}
     try:
-        # Read and process image
-        image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-
-        # Save uploaded image
-        filename = f"{uuid.uuid4().hex[:12]}.jpg"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        image.save(filepath, "JPEG", quality=85)
-
-        # Run YOLOv5 detection
-        results = model(image)
-        predictions = results.pandas().xyxy[0]  # DataFrame with columns: xmin, ymin, xmax, ymax, confidence, class, name
-
-        detections = []
-        for _, row in predictions.iterrows():
-            class_id = int(row["class"])
-            label_info = DAMAGE_LABELS.get(class_id, {
-                "code": f"D{class_id}",
-                "name": row.get("name", f"Class {class_id}"),
-                "color": "#999999",
-                "severity": "unknown",
-            })
-
-            detection = {
-                "damage_type": label_info["name"],
-                "damage_code": label_info["code"],
-                "confidence": round(float(row["confidence"]), 4),
-                "color": label_info["color"],
-                "severity": label_info["severity"],
-                "bbox": {
-                    "x1": round(float(row["xmin"]), 2),
-                    "y1": round(float(row["ymin"]), 2),
-                    "x2": round(float(row["xmax"]), 2),
-                    "y2": round(float(row["ymax"]), 2),
-                },
-            }
-            detections.append(detection)
-
-            # Save each detection to database
-            if save_to_db:
-                record = Detection(
-                    latitude=latitude,
-                    longitude=longitude,
-                    image_filename=filename,
-                    damage_type=label_info["name"],
-                    damage_code=label_info["code"],
-                    confidence=float(row["confidence"]),
-                    bbox_x1=float(row["xmin"]),
-                    bbox_y1=float(row["ymin"]),
-                    bbox_x2=float(row["xmax"]),
-                    bbox_y2=float(row["ymax"]),
-                )
-                db.session.add(record)
-
-        if save_to_db and detections:
-            db.session.commit()
+        started = time.perf_counter()
+        image_bytes = request.files["image"].read()
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="read")
+        body, status = detect_frame(image_bytes, latitude, longitude, save_to_db, session, slice_mode, ticket,
+                                    identified=device is not None)
+    finally:
+        admission_control.done(ticket, frame_work(body, ticket))
+    headers = {"Retry-After": str(body["retry_after_s"])} if body.get("retry_after_s") else {}
+    return jsonify(body), status, headers
 
-        return jsonify({
-            "success": True,
-            "detections": detections,
-            "count": len(detections),
-            "image_filename": filename,
-            "image_size": {"width": image.width, "height": image.height},
-        })
 
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+def _coordinate(meta, key):
+    try:
+        return float(meta[key]) if meta.get(key) is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def stream_session(ws):
+    """
+    Persistent detection session (see stream.py for the protocol).
+    Query params: session_id / device_id, save (default true), slice.
+    """
+    device = request.args.get("session_id") or request.args.get("device_id")
+    session = device or request.remote_addr
+    save_to_db = request.args.get("save", "true").lower() == "true"
+    slice_mode = request.args.get("slice", SLICE_MODE)
+    if slice_mode not in slicing.MODES:
+        slice_mode = SLICE_MODE
+
+    def process(image_bytes, meta):
+        if not registry.ready:
+            return {"success": False, "error": f"Model is {registry.status()['state']}"}
+        # Counted for admission, never shed: the session already drops frames it falls behind on
+        ticket = admission_control.admit(cost=frame_cost(slice_mode, admission_control.level), shed=False)
+        body = {}
+        try:
+            body, _ = detect_frame(image_bytes, _coordinate(meta, "latitude"), _coordinate(meta, "longitude"),
+                                   save_to_db, session, slice_mode, ticket, identified=device is not None)
+        finally:
+            admission_control.done(ticket, frame_work(body, ticket))
+        return body
+
+    worker = StreamSession(process, ws.send, stream_metrics)
+    worker.send({"type": "ready", "session_id": session, "model_loaded": registry.ready})
+    meta = None
+    try:
+        while True:
+            message = ws.receive()
+            if isinstance(message, bytes):
+                worker.offer(message, meta)
+                meta = None
+                continue
+            try:
+                message = json.loads(message)
+            except (TypeError, ValueError):
+                worker.send({"type": "error", "error": "Expected JSON text or a binary frame"})
+                continue
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") == "stats":
+                worker.send({"type": "stats", **worker.stats()})
+            else:
+                meta = message  # metadata for the next binary frame
+    except ConnectionClosed:
+        pass
+    finally:
+        worker.close()
+
+
+if Sock is not None:
+    sock = Sock(app)
+    sock.route("/stream")(stream_session)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics_registry.ensure_started()
+    if upload_store.segments or EMPTY_FRAME_RETENTION_DAYS > 0:
+        upload_store.start_maintenance(UPLOAD_MAINTENANCE_INTERVAL_S, expire_empty_frames, COMPACT_MIN_GARBAGE)
+
+
+@app.after_request
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None and request.endpoint != "stream_session":  # sessions last minutes
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or "not_found",
+                                method=request.method, status=response.status_code)
+    return response
+
+
+@metrics_registry.collector
+def collect_runtime_metrics():
+    """Gauges read at scrape / snapshot time."""
+    pid = os.getpid()
+    rss, peak = metrics.process_memory()
+    MEMORY.set(rss, pid=pid, kind="rss")
+    MEMORY.set(peak, pid=pid, kind="peak_rss")
+    model = inference.stats()
+    QUEUE_DEPTH.set(model["queue_depth"], queue="inference")
+    ERRORS.set(model["errors"], stage="inference")
+    if gate:
+        QUEUE_DEPTH.set(gate.queue_depth(), queue="gate")
+    if degraded_inference:
+        QUEUE_DEPTH.set(degraded_inference.queue_depth(), queue="degraded_inference")
+    DEGRADATION.set(admission_control.level)
+    images = image_writer.stats()
+    QUEUE_DEPTH.set(images["queue_depth"], queue="image_writer")
+    ERRORS.set(images["errors"], stage="image_write")
+    rows = detection_writer.stats()
+    QUEUE_DEPTH.set(rows["pending_rows"], queue="detection_writer")
+    ERRORS.set(rows["errors"], stage="db_flush")
+    ROWS_LOST.set(rows["rows_lost"])
+    MODEL_READY.set(int(registry.ready))
+    ACTIVE_STREAMS.set(stream_metrics.active)
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus text format: stage latency histograms, frame/detection/error counters, queues, memory."""
+    return Response(metrics_registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/debug/profile", methods=["GET", "POST", "DELETE"])
+def sampling_profiler():
+    """
+    Sampling profiler for flame graphs (needs PROFILER_ENABLED=1); runs in
+    every worker process.
+        POST   ?seconds=30&interval_ms=10 — start (restarts with empty counts)
+        GET    — folded stacks collected so far (?format=json for status)
+        DELETE — stop
+    """
+    if not PROFILER_ENABLED:
+        return jsonify({"success": False, "error": "Profiler disabled (set PROFILER_ENABLED=1)"}), 404
+    if request.method == "POST":
+        seconds = max(1.0, min(request.args.get("seconds", 30, type=float), 600))
+        interval_ms = max(1.0, request.args.get("interval_ms", 10, type=float))
+        metrics_registry.start_profiler(seconds, interval_ms / 1000)
+        return jsonify({"success": True, "seconds": seconds, "interval_ms": interval_ms})
+    if request.method == "DELETE":
+        metrics_registry.stop_profiler()
+        return jsonify({"success": True})
+    profile = metrics_registry.profile()
+    if request.args.get("format") == "json":
+        return jsonify({"success": True, "running": profile["running"], "samples": profile["samples"],
+                        "stacks": profile["folded"].count("\n")})
+    return Response(profile["folded"], mimetype="text/plain")
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"success": False, "error": f"Upload exceeds {MAX_UPLOAD_MB:g} MB"}), 413
+
+
+@app.route("/inference/stats", methods=["GET"])
+def inference_stats():
+    """Batch scheduler counters (batch sizes, latency, throughput, queue depth) and admission control."""
+    return jsonify({
+        "success": True,
+        "batching": inference.stats(),
+        "admission": admission_control.stats(),
+        "degraded_batching": degraded_inference.stats() if degraded_inference else None,
+        "frame_cache": frame_cache.stats() if frame_cache else None,
+        "streams": stream_metrics.stats(),
+        "gate": {**gate_counts, "size": GATE_SIZE, "threshold": GATE_THRESHOLD, "batching": gate.stats()} if gate else None,
+    })
+
+
+@app.route("/storage/stats", methods=["GET"])
+def storage_stats():
+    """Background writer counters (queue depth, write/flush latency) and image store counters (thumbnails, segments, retention)."""
+    return jsonify({
+        "success": True,
+        "image_writer": image_writer.stats(),
+        "image_store": upload_store.stats(),
+        "detection_writer": detection_writer.stats(),
+    })
+
+
+def count_detections(mode="cached"):
+    """
+    Total number of detections.
+    mode: "cached" (the trigger-maintained totals table, O(1)),
+    "exact" (COUNT(*) over the table), "approx" (MAX(rowid), overcounts
+    after deletes) or "none".
+    """
+    if mode == "none":
+        return None
+    if mode == "approx":
+        return db.session.execute(text("SELECT COALESCE(MAX(rowid), 0) FROM detection")).scalar()
+    if mode == "exact":
+        return Detection.query.count()
+    totals = rollups.totals(db.session.connection(), DetectionTotal.__table__)
+    return sum(count for count, _ in totals.values())
 
 
 @app.route("/history", methods=["GET"])
 def history():
     """
-    Get detection history.
-    Query params: limit (int), offset (int)
+    Get detection history, newest first.
+    Query params:
+        view (str) — detections (default) | sites (merged damage sites,
+                     most recently seen first)
+        limit (int)
+        cursor (str) — `next_cursor` from the previous page (keyset paging)
+        offset (int) — legacy paging, ignored when cursor is given
+        count (str) — exact | cached (default) | approx | none
     """
-    limit = request.args.get("limit", 50, type=int)
+    limit = max(1, min(request.args.get("limit", 50, type=int), HISTORY_MAX_LIMIT))
     offset = request.args.get("offset", 0, type=int)
+    cursor = request.args.get("cursor")
+    count_mode = request.args.get("count", "cached")
+    view_sites = request.args.get("view") == "sites"
 
-    records = (
-        Detection.query
-        .order_by(Detection.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    total = Detection.query.count()
+    model = DamageSite if view_sites else Detection
+    order_column = DamageSite.last_seen if view_sites else Detection.timestamp
+    query = model.query.order_by(order_column.desc(), model.id.desc())
+    if cursor:
+        try:
+            after_timestamp, after_id = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        query = query.filter(tuple_(order_column, model.id) < tuple_(after_timestamp, after_id))
+        offset = 0
+    elif offset:
+        query = query.offset(offset)
+    records = query.limit(limit).all()
+
+    next_cursor = None
+    if len(records) == limit:
+        last = records[-1]
+        next_cursor = encode_cursor(last.last_seen if view_sites else last.timestamp, last.id)
+
+    if view_sites:
+        total = None if count_mode == "none" else DamageSite.query.count()
+    else:
+        total = count_detections(count_mode)
 
     return jsonify({
         "success": True,
+        "view": "sites" if view_sites else "detections",
         "records": [r.to_dict() for r in records],
         "total": total,
         "limit": limit,
         "offset": offset,
+        "next_cursor": next_cursor,
     })
 
 
 @app.route("/history/map", methods=["GET"])
 def map_data():
     """
-    Get all detections with GPS coordinates for map visualization.
-    Returns only records that have latitude and longitude.
+    Get GPS-tagged detections for map visualization.
+    Query params:
+        view (str) — detections (default) | sites (one marker per damage site)
+        bbox (str) — "min_lon,min_lat,max_lon,max_lat" of the visible region
+        zoom (int) — map zoom level (0-24)
+
+    Below MAP_MARKER_ZOOM the response holds pre-aggregated clusters
+    (count, dominant damage code, max severity); at or above it, the
+    individual markers in the box (at most MAP_MAX_MARKERS, newest first).
+    Without bbox, every geotagged detection is returned (legacy behaviour).
     """
+    view_sites = request.args.get("view") == "sites"
+    model = DamageSite if view_sites else Detection
+    newest_first = DamageSite.last_seen.desc() if view_sites else Detection.timestamp.desc()
+
+    if "bbox" not in request.args:
+        records = (
+            model.query
+            .filter(model.latitude.isnot(None), model.longitude.isnot(None))
+            .order_by(newest_first)
+            .all()
+        )
+        return jsonify({
+            "success": True,
+            "markers": [r.to_dict() for r in records],
+            "total": len(records),
+        })
+
+    try:
+        bbox = spatial.parse_bbox(request.args["bbox"])
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    zoom = max(0, min(request.args.get("zoom", MAP_MARKER_ZOOM, type=int), spatial.MAX_ZOOM))
+
+    if zoom < MAP_MARKER_ZOOM:
+        severity_by_code = {info["code"]: info["severity"] for info in DAMAGE_LABELS.values()}
+        clusters = spatial.cluster(db.session.connection(), model.__table__, bbox, zoom, severity_by_code)
+        return jsonify({
+            "success": True,
+            "mode": "clusters",
+            "zoom": zoom,
+            "clusters": clusters,
+            "total": sum(c["count"] for c in clusters),
+        })
+
     records = (
-        Detection.query
-        .filter(Detection.latitude.isnot(None), Detection.longitude.isnot(None))
-        .order_by(Detection.timestamp.desc())
+        model.query
+        .filter(spatial.bbox_filter(model, bbox))
+        .order_by(newest_first)
+        .limit(MAP_MAX_MARKERS + 1)
         .all()
     )
     return jsonify({
         "success": True,
-        "markers": [r.to_dict() for r in records],
-        "total": len(records),
+        "mode": "markers",
+        "zoom": zoom,
+        "markers": [r.to_dict() for r in records[:MAP_MAX_MARKERS]],
+        "total": min(len(records), MAP_MAX_MARKERS),
+        "truncated": len(records) > MAP_MAX_MARKERS,
     })
 
 
+@app.route("/export", methods=["GET"])
+def export_detections():
+    """
+    Download detections for GIS tools, streamed in constant memory.
+    Query params (all optional):
+        format (str) — csv (default) | geojson | parquet
+        start, end (str) — inclusive UTC range, "YYYY-MM-DD" or ISO datetime
+        bbox (str) — "min_lon,min_lat,max_lon,max_lat"
+        damage_code (str) — comma-separated codes, e.g. "D20,D40"
+        gzip (bool) — compress csv / geojson on the fly
+    """
+    fmt = request.args.get("format", "csv").lower()
+    compress = request.args.get("gzip", "false").lower() == "true"
+    try:
+        export.check_format(fmt, compress)
+        filters = {
+            "start": export.parse_time(request.args.get("start")),
+            "end": export.parse_time(request.args.get("end"), end=True),
+            "bbox": spatial.parse_bbox(request.args["bbox"]) if "bbox" in request.args else None,
+            "codes": export.parse_codes(request.args.get("damage_code")),
+        }
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    if detection_writer.pending():
+        detection_writer.flush()  # include rows still buffered for the next bulk insert
+
+    def generate():
+        with db.engine.connect() as connection:
+            yield from export.export(connection, Detection.__table__, fmt, compress, EXPORT_CHUNK_ROWS, **filters)
+
+    name = export.filename(fmt, compress)
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/gzip" if compress else export.CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+
 @app.route("/history/stats", methods=["GET"])
 def stats():
-    """Get summary statistics of all detections."""
-    total = Detection.query.count()
+    """
+    Get summary statistics of detections.
+    Query params (all optional):
+        start, end (str) — inclusive UTC day window, "YYYY-MM-DD"
+        bbox (str) — "min_lon,min_lat,max_lon,max_lat" (resolved to ~600 m rollup cells)
+        by_day (bool) — also return per-day, per-damage-code counts
+        exact (bool) — grouped aggregates over the detection table instead of the
+                       rollups (same filters; the bbox is exact, not per rollup cell)
 
-    # Count by damage type
-    type_counts = {}
-    for code, info in DAMAGE_LABELS.items():
-        count = Detection.query.filter_by(damage_code=info["code"]).count()
-        type_counts[info["name"]] = count
+    Unfiltered stats come from the trigger-maintained per-code totals (O(1));
+    filtered stats sum the per-day rollups.
+    """
+    start = request.args.get("start")
+    end = request.args.get("end")
+    by_day = request.args.get("by_day", "false").lower() == "true"
+    exact = request.args.get("exact", "false").lower() == "true"
+    bbox = None
+    try:
+        if "bbox" in request.args:
+            bbox = spatial.parse_bbox(request.args["bbox"])
+        for day in (start, end):
+            if day:
+                datetime.date.fromisoformat(day)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
 
-    # Average confidence
-    from sqlalchemy import func
-    avg_conf = db.session.query(func.avg(Detection.confidence)).scalar() or 0
+    connection = db.session.connection()
+    daily = None
+    if exact:
+        conditions = []
+        if start:
+            conditions.append(Detection.timestamp >= datetime.datetime.fromisoformat(start))
+        if end:
+            conditions.append(Detection.timestamp < datetime.datetime.fromisoformat(end) + datetime.timedelta(days=1))
+        if bbox is not None:
+            conditions.append(spatial.bbox_filter(Detection, bbox))
+        aggregates = (func.count(), func.sum(Detection.confidence))
+        rows = db.session.execute(
+            select(Detection.damage_code, *aggregates).where(and_(True, *conditions)).group_by(Detection.damage_code)
+        )
+        by_code = {code: (count, conf_sum) for code, count, conf_sum in rows}
+        if by_day:
+            day = func.date(Detection.timestamp)
+            rows = db.session.execute(
+                select(day, Detection.damage_code, *aggregates).where(and_(True, *conditions))
+                .group_by(day, Detection.damage_code).order_by(day, Detection.damage_code)
+            )
+            daily = {(d, code): (count, conf_sum) for d, code, count, conf_sum in rows}
+    elif start or end or bbox or by_day:
+        by_code = rollups.summarize(connection, DetectionRollup.__table__, start, end, bbox)
+        if by_day:
+            daily = rollups.summarize(connection, DetectionRollup.__table__, start, end, bbox, by_day=True)
+    else:
+        by_code = rollups.totals(connection, DetectionTotal.__table__)
 
-    return jsonify({
+    total = sum(count for count, _ in by_code.values())
+    confidence_sum = sum(conf_sum for _, conf_sum in by_code.values())
+
+    # Count by damage type
+    type_counts = {info["name"]: by_code.get(info["code"], (0, 0))[0] for info in DAMAGE_LABELS.values()}
+
+    response = {
         "success": True,
         "total_detections": total,
         "by_type": type_counts,
-        "average_confidence": round(float(avg_conf), 4),
-    })
+        "by_code": {code: count for code, (count, _) in by_code.items()},
+        "average_confidence": round(confidence_sum / total, 4) if total else 0,
+    }
+    if daily is not None:
+        response["by_day"] = [
+            {"day": day, "damage_code": code, "count": count, "average_confidence": round(conf_sum / count, 4)}
+            for (day, code), (count, conf_sum) in daily.items()
+        ]
+    return jsonify(response)
 
 
 @app.route("/uploads/<filename>", methods=["GET"])
 def serve_upload(filename):
-    """Serve uploaded images."""
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    """
+    Uploaded image; ?size=thumb (160 px) or ?size=preview (640 px) for a
+    downscaled copy. Stored images never change: responses carry a strong
+    ETag and long-lived Cache-Control, and conditional (304) and Range
+    requests are honoured.
+    """
+    variant = request.args.get("size")
+    if variant and variant not in image_store.VARIANTS:
+        return jsonify({"success": False,
+                        "error": f"size must be one of {', '.join(image_store.VARIANTS)}"}), 400
+
+    data = image_writer.pending(filename)
+    if data is not None:  # still queued for writing: serve it, but do not let clients cache it
+        body = image_store.render(data, variant) if variant else data
+        return Response(body, mimetype="image/jpeg", headers={"Cache-Control": "no-cache"})
+
+    try:
+        source = upload_store.derivative(filename, variant) if variant else upload_store.source(filename)
+    except (OSError, Image.UnidentifiedImageError):
+        source = None
+    if source is None or (isinstance(source, str) and not os.path.isfile(source)):
+        return jsonify({"success": False, "error": "Not found"}), 404
+    if isinstance(source, str):
+        response = send_file(source, mimetype="image/jpeg", etag=upload_store.etag(filename, variant) or True,
+                             conditional=True, max_age=UPLOAD_MAX_AGE_S)
+    else:  # bytes from a segment
+        response = Response(source, mimetype="image/jpeg")
+        response.set_etag(upload_store.etag(filename))
+        response.cache_control.max_age = UPLOAD_MAX_AGE_S
+        response.expires = int(time.time() + UPLOAD_MAX_AGE_S)
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(source))
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def referenced_images(filenames):
+    """The subset of `filenames` that a detection or damage site still points to."""
+    referenced = set()
+    for i in range(0, len(filenames), 500):
+        chunk = filenames[i:i + 500]
+        for column in (Detection.image_filename, DamageSite.best_image_filename):
+            referenced.update(db.session.execute(select(column).where(column.in_(chunk)).distinct()).scalars())
+    return referenced
+
+
+def expire_empty_frames(store):
+    """Retention policy: frames older than EMPTY_FRAME_RETENTION_DAYS without detections."""
+    if EMPTY_FRAME_RETENTION_DAYS <= 0:
+        return []
+    detection_writer.flush()  # buffered rows count as references
+    candidates = store.older_than(time.time() - EMPTY_FRAME_RETENTION_DAYS * 86400)
+    with app.app_context():
+        referenced = referenced_images(candidates)
+    return [name for name in candidates if name not in referenced]
 
 
 @app.route("/history/<detection_id>", methods=["DELETE"])
 def delete_detection(detection_id):
-    """Delete a detection record."""
+    """Delete a detection record, and its image once nothing else refers to it."""
+    if detection_writer.pending():
+        detection_writer.flush()  # the record, or another reference to its image, may still be buffered
     record = Detection.query.get(detection_id)
     if not record:
         return jsonify({"success": False, "error": "Not found"}), 404
+    filename, site_id = record.image_filename, record.site_id
     db.session.delete(record)
+    db.session.flush()
+    sites.remove_observation(db.session.connection(), DamageSite.__table__, Detection.__table__, site_id)
     db.session.commit()
+    if filename and not referenced_images([filename]):
+        upload_store.remove([filename])  # other boxes of the frame keep it
     return jsonify({"success": True, "message": "Deleted"})
 
 
@@ -322,7 +1048,7 @@ def delete_detection(detection_id):
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        init_db(db.engine)
         print("✅ Database initialized")
 
     print("\n" + "=" * 50)
@@ -330,7 +1056,13 @@ if __name__ == "__main__":
     print("=" * 50)
     print(f"📡 Server: http://0.0.0.0:5000")
     print(f"📂 Uploads: {UPLOAD_FOLDER}")
-    print(f"🧠 Model: {'Custom (best.pt)' if os.path.exists(MODEL_PATH) else 'Default YOLOv5s'}")
+    model_name = os.path.basename(registry.weights) if registry.weights else "stub detector" if registry.backend == "stub" \
+        else "Default YOLOv5s (torch.hub)"
+    print(f"🧠 Model: {model_name} (loading in background)")
+    print(f"📦 Batching: up to {BATCH_MAX_SIZE} frames / {BATCH_MAX_WAIT_MS:g} ms")
     print("=" * 50 + "\n")
 
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Development server. Set FLASK_DEBUG=1 for the debugger and auto-reload
+    # (the reloader runs a second process, which loads the model twice).
+    # For production use: python serve.py
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
@@ -0,0 +1,177 @@
+"""
+Dynamic Micro-Batching Scheduler
+Queues decoded frames from concurrent /detect requests and runs them
+through the model in batches, routing each result back to its request.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """
+    Collects frames into batches and runs them on a single worker thread.
+
+    A batch is dispatched as soon as it holds `max_batch_size` frames, or
+    `max_wait_ms` after its first frame arrived, whichever comes first.
+    `predict_fn` receives a list of frames and must return a list of
+    results of the same length and order.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=25.0, window_seconds=60.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.window_seconds = window_seconds
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self._batches = 0
+        self._frames = 0
+        self._errors = 0
+        self._batch_sizes = {}
+        self._total_batch_ms = 0.0
+        self._max_batch_ms = 0.0
+        self._last_batch_ms = 0.0
+        self._total_wait_ms = 0.0
+        self._recent = deque()  # (finished_at, frames) for throughput
+
+    # --------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------
+
+    def submit(self, frame):
+        """Queue a frame and return a Future resolving to its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((frame, future, time.perf_counter()))
+        return future
+
+    def predict(self, frame, timeout=None):
+        """Queue a frame and block until its result is ready."""
+        return self.submit(frame).result(timeout=timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """Per-batch latency and throughput counters for tuning."""
+        with self._lock:
+            now = time.perf_counter()
+            self._trim_window(now)
+            window_frames = sum(n for _, n in self._recent)
+            window = min(self.window_seconds, max(now - self._recent[0][0], 1e-6)) if self._recent else 0
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "frames": self._frames,
+                "errors": self._errors,
+                "avg_batch_size": round(self._frames / self._batches, 2) if self._batches else 0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_batch_ms": round(self._total_batch_ms / self._batches, 2) if self._batches else 0,
+                "last_batch_ms": round(self._last_batch_ms, 2),
+                "max_batch_ms": round(self._max_batch_ms, 2),
+                "avg_queue_wait_ms": round(self._total_wait_ms / self._frames, 2) if self._frames else 0,
+                "frames_per_second": round(window_frames / window, 2) if window else 0,
+            }
+
+    def shutdown(self, timeout=5.0):
+        """Stop the worker after the frames already queued are processed."""
+        self._stopping = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    # --------------------------------------------------------
+    # Worker
+    # --------------------------------------------------------
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so a worker started in a parent
+        # process is restarted in each child on first use.
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                self._queue = queue.Queue()
+                self._reset_counters()
+            self._stopping = False
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+            self._thread.start()
+
+    def _collect(self):
+        """Block for the first frame, then gather more until full or timed out."""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = self._collect()
+            if not batch:
+                continue
+
+            frames = [frame for frame, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = self.predict_fn(frames)
+                if len(results) != len(frames):
+                    raise RuntimeError(f"predict_fn returned {len(results)} results for {len(frames)} frames")
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            self._record(batch, started, finished)
+
+    def _record(self, batch, started, finished):
+        elapsed_ms = (finished - started) * 1000
+        size = len(batch)
+        with self._lock:
+            self._batches += 1
+            self._frames += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._total_batch_ms += elapsed_ms
+            self._last_batch_ms = elapsed_ms
+            self._max_batch_ms = max(self._max_batch_ms, elapsed_ms)
+            self._total_wait_ms += sum((started - queued) * 1000 for _, _, queued in batch)
+            self._recent.append((finished, size))
+            self._trim_window(finished)
+
+    def _trim_window(self, now):
+        while self._recent and now - self._recent[0][0] > self.window_seconds:
+            self._recent.popleft()
@@ -0,0 +1,159 @@
+"""
+Benchmark: inference backends, accuracy vs speed.
+
+Runs every backend over the validation split (backend/data/images/val
+with YOLO labels in backend/data/labels/val) and reports mAP@0.5 next to
+ms/frame, so the CPU backend can be chosen knowing the trade-off.
+
+Usage:
+    python backend/benchmarks/bench_backends.py
+    python backend/benchmarks/bench_backends.py --backends torch,onnx,onnx-int8 --limit 200 --threads 4
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import IMAGE_EXTENSIONS  # noqa: E402
+from model_registry import BASE_DIR, ModelRegistry  # noqa: E402
+
+VAL_IMAGES = os.path.join(BASE_DIR, "data", "images", "val")
+VAL_LABELS = os.path.join(BASE_DIR, "data", "labels", "val")
+
+
+def load_split(images_dir=VAL_IMAGES, labels_dir=VAL_LABELS, limit=None):
+    """[(image path, (n, 5) array of class, x1, y1, x2, y2 in pixels)] for a YOLO-format split."""
+    paths = sorted(p for p in glob.glob(os.path.join(images_dir, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+    split = []
+    for path in paths[:limit]:
+        label_path = os.path.join(labels_dir, os.path.splitext(os.path.basename(path))[0] + ".txt")
+        labels = np.zeros((0, 5))
+        if os.path.exists(label_path):
+            rows = np.loadtxt(label_path, ndmin=2)
+            if rows.size:
+                width, height = Image.open(path).size
+                cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+                labels = np.column_stack([rows[:, 0], cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+        split.append((path, labels))
+    return split
+
+
+def box_iou(box, boxes):
+    w = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    h = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    overlap = w * h
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return overlap / (area + areas - overlap + 1e-9)
+
+
+def average_precision(predictions, truths, class_id, iou_threshold=0.5):
+    """VOC-style all-point AP for one class. predictions/truths: one array per image."""
+    scored = []  # (confidence, true positive)
+    positives = 0
+    for pred, truth in zip(predictions, truths):
+        gt = truth[truth[:, 0] == class_id, 1:]
+        positives += len(gt)
+        matched = np.zeros(len(gt), dtype=bool)
+        pred = pred[pred[:, 5] == class_id]
+        for row in pred[pred[:, 4].argsort()[::-1]]:
+            hit = False
+            if len(gt):
+                ious = box_iou(row[:4], gt)
+                best = int(ious.argmax())
+                if ious[best] >= iou_threshold and not matched[best]:
+                    matched[best] = hit = True
+            scored.append((row[4], hit))
+    if positives == 0:
+        return None
+
+    scored.sort(key=lambda item: -item[0])
+    hits = np.array([hit for _, hit in scored], dtype=float)
+    tp, fp = np.cumsum(hits), np.cumsum(1 - hits)
+    recall = np.concatenate([[0], tp / positives, [1]])
+    precision = np.concatenate([[1], tp / np.maximum(tp + fp, 1e-9), [0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    changes = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[changes + 1] - recall[changes]) * precision[changes + 1]))
+
+
+def evaluate(predictions, truths, num_classes, iou_threshold=0.5):
+    """(mAP, {class_id: AP}) over classes that appear in the ground truth."""
+    per_class = {}
+    for class_id in range(num_classes):
+        ap = average_precision(predictions, truths, class_id, iou_threshold)
+        if ap is not None:
+            per_class[class_id] = ap
+    return (float(np.mean(list(per_class.values()))) if per_class else 0.0), per_class
+
+
+def run_backend(name, split, conf, iou, threads, warmup=3):
+    def configure(backend):
+        backend.conf, backend.iou, backend.max_det = conf, iou, 300
+
+    backend = ModelRegistry(configure=configure, backend=name).load()
+    if threads:
+        backend.set_num_threads(threads)
+
+    images = [Image.open(path).convert("RGB") for path, _ in split]
+    for image in images[:warmup]:
+        backend.predict([image])
+
+    predictions, elapsed = [], 0.0
+    for image in images:
+        started = time.perf_counter()
+        predictions.extend(backend.predict([image]))
+        elapsed += time.perf_counter() - started
+    return predictions, elapsed * 1000 / max(1, len(images)), backend.names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference backends (mAP@0.5 vs ms/frame)")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--limit", type=int, help="Only use the first N validation images")
+    parser.add_argument("--conf", type=float, default=0.001, help="Confidence threshold used for mAP")
+    parser.add_argument("--iou", type=float, default=0.6, help="NMS IoU threshold")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (default: backend default)")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    split = load_split(limit=args.limit)
+    if not split:
+        raise SystemExit(f"❌ No validation images in {VAL_IMAGES} (see download_dataset.py)")
+    truths = [labels for _, labels in split]
+    print(f"📊 {len(split)} validation images, {sum(len(t) for t in truths)} labelled boxes\n")
+    print(f"{'backend':>10} | {'mAP@0.5':>7} | {'ms/frame':>8} | per-class AP")
+    print("-" * 72)
+
+    results = {}
+    for name in args.backends.split(","):
+        try:
+            predictions, ms, names = run_backend(name, split, args.conf, args.iou, args.threads)
+        except Exception as e:
+            print(f"{name:>10} | skipped: {e}")
+            continue
+        names = names or {}
+        if isinstance(names, list):
+            names = dict(enumerate(names))
+        mean_ap, per_class = evaluate(predictions, truths, max(len(names), 4))
+        per_class_text = "  ".join(f"{names.get(c, c)}={ap:.3f}" for c, ap in per_class.items())
+        print(f"{name:>10} | {mean_ap:>7.3f} | {ms:>8.1f} | {per_class_text}")
+        results[name] = {"map50": round(mean_ap, 4), "ms_per_frame": round(ms, 2),
+                         "per_class": {str(names.get(c, c)): round(ap, 4) for c, ap in per_class.items()}}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
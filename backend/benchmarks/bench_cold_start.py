@@ -0,0 +1,78 @@
+"""
+Benchmark: API cold start.
+
+Starts `app.py` in a fresh interpreter and measures
+  - import-to-port-ready: process start until GET / answers
+  - import-to-model-ready: process start until / reports model_loaded
+for torch.hub loading (MODEL_SOURCE=hub, the old behaviour) and the local
+registry (MODEL_SOURCE=auto, local YOLOv5 source + best.torchscript/.pt).
+
+Usage:
+    python backend/benchmarks/bench_cold_start.py
+    python backend/benchmarks/bench_cold_start.py --runs 5 --sources hub,auto
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(source, port, timeout=600):
+    env = dict(os.environ, MODEL_SOURCE=source, PORT=str(port), FLASK_DEBUG="0")
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    port_ready = model_ready = None
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited during startup (MODEL_SOURCE={source})")
+            try:
+                health = requests.get(f"http://127.0.0.1:{port}/", timeout=2).json()
+            except requests.RequestException:
+                time.sleep(0.05)
+                continue
+            if port_ready is None:
+                port_ready = time.perf_counter() - started
+            if health.get("model_loaded") or health.get("model", {}).get("state") == "failed":
+                model_ready = time.perf_counter() - started
+                loader = health.get("model", {}).get("loader")
+                break
+            time.sleep(0.05)
+        else:
+            raise RuntimeError(f"model not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return port_ready, model_ready, loader
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API cold start")
+    parser.add_argument("--sources", default="hub,auto", help="MODEL_SOURCE values to compare")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=5066)
+    args = parser.parse_args()
+
+    print(f"{'source':>8} | {'loader':>24} | {'port ready s':>12} | {'model ready s':>13}")
+    print("-" * 68)
+    for source in args.sources.split(","):
+        port_times, model_times, loader = [], [], None
+        for _ in range(args.runs):
+            port_ready, model_ready, loader = measure(source, args.port)
+            port_times.append(port_ready)
+            model_times.append(model_ready)
+        print(f"{source:>8} | {str(loader):>24} | {statistics.median(port_times):>12.2f} | "
+              f"{statistics.median(model_times):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
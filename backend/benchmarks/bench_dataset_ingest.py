@@ -0,0 +1,96 @@
+"""
+Benchmark: dataset ingestion, cold vs. warm.
+
+Generates a synthetic dataset (random-byte "images" of RDD2022's typical
+size plus YOLO label files, as a directory and as a zip; kept in the temp
+directory between runs) and ingests it into a scratch data directory
+with dataset_ingest.py in each mode: once into an empty directory (cold)
+and again unchanged (warm). The old approach (shutil.copy2 one file at a
+time into train, as download_dataset.py did) is the baseline; it has no
+warm path, every run copies everything.
+
+"Cold" means an empty destination, not a cold page cache: the source
+files are read from memory after the first run.
+
+Usage:
+    python backend/benchmarks/bench_dataset_ingest.py [--images 20000] [--kb 90] [--workers 16]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_ingest  # noqa: E402
+
+
+def make_source(images, kb):
+    root = os.path.join(tempfile.gettempdir(), f"rdd_bench_ingest_{images}_{kb}")
+    archive = root + ".zip"
+    if not os.path.exists(archive):
+        print(f"📦 Generating {images:,} images of {kb} KB in {root}")
+        for kind in ("images", "labels"):
+            os.makedirs(os.path.join(root, kind), exist_ok=True)
+        for i in range(images):
+            name = f"Country_{i:06d}"
+            with open(os.path.join(root, "images", name + ".jpg"), "wb") as f:
+                f.write(os.urandom(kb * 1024))
+            with open(os.path.join(root, "labels", name + ".txt"), "w") as f:
+                f.write(f"{i % 4} 0.5 0.5 0.2 0.1\n")
+        with zipfile.ZipFile(archive + ".part", "w", zipfile.ZIP_STORED) as z:  # JPEGs do not deflate
+            for kind in ("images", "labels"):
+                for name in sorted(os.listdir(os.path.join(root, kind))):
+                    z.write(os.path.join(root, kind, name), f"RDD2022/{kind}/{name}")
+        os.replace(archive + ".part", archive)
+    return root, archive
+
+
+def legacy_copy(root, data_dir):
+    """What download_dataset.py did before: copy2 every file into train, one at a time."""
+    for kind in ("images", "labels"):
+        dst = os.path.join(data_dir, kind, "train")
+        os.makedirs(dst, exist_ok=True)
+        for name in os.listdir(os.path.join(root, kind)):
+            shutil.copy2(os.path.join(root, kind, name), os.path.join(dst, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dataset ingestion (cold vs warm)")
+    parser.add_argument("--images", type=int, default=20000)
+    parser.add_argument("--kb", type=int, default=90, help="Size of each synthetic image")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 4) * 2))
+    parser.add_argument("--modes", default="copy,hardlink,symlink,zip")
+    args = parser.parse_args()
+
+    root, archive = make_source(args.images, args.kb)
+    scratch = tempfile.mkdtemp(prefix="rdd_ingest_", dir=os.path.dirname(root))  # same disk, so hardlinks work
+
+    print(f"\n{'ingest':>22} | {'cold s':>7} | {'warm s':>7} | {'transferred (cold/warm)':>23}")
+    print("-" * 70)
+    try:
+        data_dir = os.path.join(scratch, "legacy")
+        started = time.perf_counter()
+        legacy_copy(root, data_dir)
+        elapsed = time.perf_counter() - started
+        print(f"{'copy2 loop (before)':>22} | {elapsed:>7.2f} | {elapsed:>7.2f} | {'all / all':>23}")
+        shutil.rmtree(data_dir)
+
+        for mode in args.modes.split(","):
+            data_dir = os.path.join(scratch, mode)
+            source = archive if mode == "zip" else root
+            runs = [dataset_ingest.ingest([source], data_dir, "copy" if mode == "zip" else mode,
+                                          workers=args.workers, verbose=False) for _ in range(2)]
+            moved = [f"{r.get('new', 0) + r.get('updated', 0):,}" for r in runs]
+            print(f"{f'{mode} ({args.workers} threads)':>22} | {runs[0]['seconds']:>7.2f} | "
+                  f"{runs[1]['seconds']:>7.2f} | {' / '.join(moved):>23}")
+            shutil.rmtree(data_dir)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
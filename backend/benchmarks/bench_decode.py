@@ -0,0 +1,108 @@
+"""
+Benchmark: decoding 12 MP phone photos for /detect.
+
+Compares the old path (full-resolution `Image.open(...).convert("RGB")`,
+then the model resizes) with preprocess.prepare() (reduced-size JPEG
+decode + letterbox into a reused buffer). Each mode runs in its own
+process so peak RSS is measured separately.
+
+Usage:
+    python backend/benchmarks/bench_decode.py [--image photo.jpg] [--repeat 20]
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import preprocess  # noqa: E402
+
+
+def synthetic_photo(width=4000, height=3000, seed=0):
+    """A 12 MP road-like frame: smooth gradients plus mild noise (realistic JPEG size)."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 90 + 60 * (y / height) + 10 * np.sin(x / 37.0)
+    pixels = base[..., None] + rng.normal(0, 6, (height, width, 3))
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype("uint8")).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def decode_full(data, size):
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    # What AutoShape does next: a resized copy at the model input size
+    ratio = size / max(image.size)
+    return np.asarray(image.resize((round(image.width * ratio), round(image.height * ratio))))
+
+
+def decode_fast(data, size):
+    return preprocess.prepare(data, size).array
+
+
+def run_mode(mode, path, repeat, size):
+    """Child process: decode `repeat` times; print ms/frame and peak RSS as JSON."""
+    with open(path, "rb") as f:
+        data = f.read()
+    fn = decode_full if mode == "full" else decode_fast
+    fn(data, size)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data, size)
+        timings.append((time.perf_counter() - started) * 1000)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+    timings.sort()
+    print(json.dumps({"ms_p50": timings[len(timings) // 2], "ms_max": timings[-1], "peak_rss_mb": peak_kb / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload decoding")
+    parser.add_argument("--image", help="JPEG to decode (default: synthetic 12 MP frame)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--size", type=int, default=640, help="Model input size")
+    parser.add_argument("--child", choices=["full", "fast", "synthetic"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == "synthetic":
+        with open(args.image, "wb") as f:
+            f.write(synthetic_photo())
+        return
+    if args.child:
+        run_mode(args.child, args.image, args.repeat, args.size)
+        return
+
+    path = args.image
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), "rdd_bench_12mp.jpg")
+        if not os.path.exists(path):
+            # In a child process: peak RSS is inherited across fork + exec
+            subprocess.run([sys.executable, __file__, "--child", "synthetic", "--image", path], check=True)
+    width, height = Image.open(path).size
+    print(f"🖼️  {width}x{height} ({width * height / 1e6:.1f} MP), {os.path.getsize(path) / 1e6:.1f} MB, "
+          f"{args.repeat} decodes\n")
+    print(f"{'path':>22} | {'ms p50':>7} | {'ms max':>7} | {'peak RSS MB':>11}")
+    print("-" * 58)
+    for mode, label in (("full", "full decode (before)"), ("fast", "draft + letterbox")):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--image", path, "--repeat", str(args.repeat),
+             "--size", str(args.size)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        r = json.loads(out)
+        print(f"{label:>22} | {r['ms_p50']:>7.1f} | {r['ms_max']:>7.1f} | {r['peak_rss_mb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
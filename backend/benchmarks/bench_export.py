@@ -0,0 +1,141 @@
+"""
+Benchmark: bulk export of detections.
+
+Seeds a scratch SQLite database (5M synthetic detections by default, kept
+in the temp directory between runs) and exports it with export.py in each
+format, measuring time to first byte, time to the first chunk of rows,
+total time, output size and peak RSS. The filtered runs (a quarter of the city, or potholes and alligator
+cracks only) check that filters keep the streaming, index-ordered plan. For comparison, the old approach (load every row with `.all()` and
+serialize through `to_dict()` at once, as /history/map does) runs on a
+subset. Each export runs in its own process so peak RSS is measured
+separately.
+
+Usage:
+    python backend/benchmarks/bench_export.py [--rows 5000000] [--baseline-rows 1000000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import export  # noqa: E402
+from database import Detection, init_db  # noqa: E402
+from ingest import enable_sqlite_wal  # noqa: E402
+from synthetic import CITY_BBOX, seed_detections  # noqa: E402
+
+MODES = {
+    "all": "all() + to_dict (before)",
+    "csv": "csv",
+    "csv.gz": "csv + gzip",
+    "geojson": "geojson",
+    "geojson.gz": "geojson + gzip",
+    "parquet": "parquet (zstd)",
+    "csv-bbox": "csv, bbox filter",
+    "csv-codes": "csv, codes filter",
+}
+FILTERS = {
+    "bbox": {"bbox": (CITY_BBOX[0], CITY_BBOX[1], (CITY_BBOX[0] + CITY_BBOX[2]) / 2, (CITY_BBOX[1] + CITY_BBOX[3]) / 2)},
+    "codes": {"codes": ["D20", "D40"]},
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_mode(mode, db_path, chunk, baseline_rows):
+    """Child process: export to /dev/null; print timings and peak RSS as JSON."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    started = time.perf_counter()
+    first_byte = None
+    written = 0
+    if mode == "all":
+        with Session(engine) as session:
+            records = session.execute(select(Detection).limit(baseline_rows)).scalars().all()
+            body = json.dumps({"markers": [r.to_dict() for r in records], "total": len(records)}).encode()
+        first_byte = time.perf_counter()
+        written = len(body)
+    else:
+        mode, _, where = mode.partition("-")
+        fmt, _, gz = mode.partition(".")
+        with engine.connect() as conn, open(os.devnull, "wb") as out:
+            for piece in export.export(conn, Detection.__table__, fmt, bool(gz), chunk, **FILTERS.get(where, {})):
+                if first_byte is None and piece:
+                    first_byte = time.perf_counter()
+                out.write(piece)
+                written += len(piece)
+    finished = time.perf_counter()
+    first_rows = None
+    if mode != "all":
+        # The header goes out before the query runs: time the first chunk of rows on its own
+        with engine.connect() as conn:
+            started_rows = time.perf_counter()
+            next(export.iter_chunks(conn, export.build_query(Detection.__table__, **FILTERS.get(where, {})), chunk), None)
+            first_rows = (time.perf_counter() - started_rows) * 1000
+    print(json.dumps({"ttfb_ms": ((first_byte or finished) - started) * 1000, "first_rows_ms": first_rows,
+                      "seconds": finished - started, "mb": written / 1e6, "peak_rss_mb": peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk detection export")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--baseline-rows", type=int, default=1_000_000,
+                        help="Rows for the all()+to_dict baseline (it holds everything in memory)")
+    parser.add_argument("--chunk", type=int, default=export.CHUNK_ROWS)
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated subset of: " + ", ".join(MODES))
+    parser.add_argument("--child", choices=[*MODES, "seed"], help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == "seed":
+        engine = create_engine(f"sqlite:///{args.db}")
+        enable_sqlite_wal(engine)
+        init_db(engine)
+        seed_detections(engine, args.rows)
+        return
+    if args.child:
+        run_mode(args.child, args.db, args.chunk, args.baseline_rows)
+        return
+
+    db_path = os.path.join(tempfile.gettempdir(), f"rdd_bench_export_{args.rows}.db")
+    if not os.path.exists(db_path):
+        print(f"📦 Seeding {args.rows:,} detections into {db_path}")
+        # In a child process: peak RSS is inherited across fork + exec
+        subprocess.run([sys.executable, __file__, "--child", "seed", "--db", db_path, "--rows", str(args.rows)],
+                       check=True)
+
+    print(f"\n{'export':>26} | {'rows':>9} | {'TTFB ms':>8} | {'rows ms':>8} | {'seconds':>8} | {'MB':>8} | "
+          f"{'peak RSS MB':>11}")
+    print("-" * 97)
+    for mode in args.modes.split(","):
+        if mode == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print(f"{MODES[mode]:>26} | skipped (pip install pyarrow)")
+                continue
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--db", db_path, "--chunk", str(args.chunk),
+             "--baseline-rows", str(args.baseline_rows)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        r = json.loads(out)
+        rows = min(args.rows, args.baseline_rows) if mode == "all" else args.rows
+        rows = f"{rows:,}" if "-" not in mode else "filtered"
+        first_rows = f"{r['first_rows_ms']:.1f}" if r["first_rows_ms"] is not None else "-"
+        print(f"{MODES[mode]:>26} | {rows:>9} | {r['ttfb_ms']:>8.1f} | {first_rows:>8} | {r['seconds']:>8.1f} | {r['mb']:>8.1f} | "
+              f"{r['peak_rss_mb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: /history page fetch cost at increasing depth.
+
+Seeds a scratch SQLite database with synthetic detections (1M by default)
+and times one 50-row page at several depths with:
+
+    offset   ORDER BY timestamp DESC LIMIT/OFFSET (the old query)
+    keyset   WHERE (timestamp, id) < cursor  (the new query)
+
+first on the old schema (no indexes), then with the indexes from
+database.py. COUNT(*) vs. the approximate MAX(rowid) count is timed too.
+
+Usage:
+    python backend/benchmarks/bench_history.py [--rows 1000000] [--limit 50]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, text, tuple_
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import Detection, db, init_db  # noqa: E402
+from ingest import enable_sqlite_wal  # noqa: E402
+from synthetic import seed_detections  # noqa: E402
+
+
+def timed(conn, statement, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(statement).all()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run_depths(engine, depths, limit):
+    table = Detection.__table__
+    order = (table.c.timestamp.desc(), table.c.id.desc())
+    with engine.connect() as conn:
+        for depth in depths:
+            offset_ms = timed(conn, select(table).order_by(*order).offset(depth).limit(limit))
+            if depth:
+                # The cursor a client would hold after reading `depth` rows (not timed)
+                last = conn.execute(select(table.c.timestamp, table.c.id).order_by(*order)
+                                    .offset(depth - 1).limit(1)).one()
+                keyset = (select(table).where(tuple_(table.c.timestamp, table.c.id) < tuple_(*last))
+                          .order_by(*order).limit(limit))
+            else:
+                keyset = select(table).order_by(*order).limit(limit)
+            keyset_ms = timed(conn, keyset)
+            print(f"{depth:>10,} | {offset_ms:>11.2f} | {keyset_ms:>11.2f}")
+        count_ms = timed(conn, text("SELECT COUNT(*) FROM detection"))
+        approx_ms = timed(conn, text("SELECT MAX(rowid) FROM detection"))
+        print(f"\n   COUNT(*): {count_ms:.2f} ms   MAX(rowid): {approx_ms:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /history paging at depth")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic detections to seed")
+    parser.add_argument("--limit", type=int, default=50, help="Page size")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_history_"), "detections.db")
+    engine = create_engine(f"sqlite:///{path}")
+    enable_sqlite_wal(engine)
+
+    # Old schema first: the table without any of the new indexes
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for index in Detection.__table__.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+    print(f"📦 Seeding {args.rows:,} detections into {path}")
+    seed_detections(engine, args.rows)
+
+    depths = [d for d in (0, 1_000, 10_000, 100_000, 500_000, args.rows - args.limit) if d < args.rows]
+    header = f"{'depth':>10} | {'offset (ms)':>11} | {'keyset (ms)':>11}"
+
+    print("\n🐢 Without indexes")
+    print(header + "\n" + "-" * len(header))
+    run_depths(engine, depths, args.limit)
+
+    started = time.perf_counter()
+    init_db(engine)
+    print(f"\n🔧 Built indexes in {time.perf_counter() - started:.1f} s")
+
+    print("\n🚀 With indexes")
+    print(header + "\n" + "-" * len(header))
+    run_depths(engine, depths, args.limit)
+
+
+if __name__ == "__main__":
+    main()
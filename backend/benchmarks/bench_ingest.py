@@ -0,0 +1,102 @@
+"""
+Load benchmark: sustained Detection inserts/sec with many concurrent writers.
+
+Simulates N request threads, each saving a few detections per "request",
+against a scratch SQLite database in three modes:
+
+    per-request   one INSERT + COMMIT per request, default rollback journal
+    per-request+wal   same, with the server's WAL pragmas
+    write-behind  DetectionWriter bulk flushes, WAL pragmas (what app.py does)
+
+Usage:
+    python backend/benchmarks/bench_ingest.py [--writers 32] [--requests 100] [--boxes 3]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import Detection, init_db  # noqa: E402
+from ingest import DetectionWriter, enable_sqlite_wal  # noqa: E402
+
+detection = Detection.__table__
+
+
+def make_rows(boxes):
+    now = datetime.datetime.utcnow()
+    return [
+        {
+            "timestamp": now, "latitude": 14.28, "longitude": 120.95, "image_filename": "bench.jpg",
+            "damage_type": "Pothole", "damage_code": "D40", "confidence": 0.8,
+            "bbox_x1": 1.0, "bbox_y1": 2.0, "bbox_x2": 3.0, "bbox_y2": 4.0,
+        }
+        for _ in range(boxes)
+    ]
+
+
+def run(mode, writers, requests, boxes):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_ingest_"), "detections.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30})
+    if mode != "per-request":
+        enable_sqlite_wal(engine)
+    init_db(engine)
+
+    def insert_rows(rows):
+        with engine.begin() as conn:
+            conn.execute(insert(detection), rows)
+
+    writer = DetectionWriter(insert_rows) if mode == "write-behind" else None
+    errors = []
+
+    def client():
+        try:
+            for _ in range(requests):
+                rows = make_rows(boxes)
+                if writer:
+                    writer.add(rows)
+                else:
+                    insert_rows(rows)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=client) for _ in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if writer:
+        writer.shutdown()
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        stored = conn.exec_driver_sql("SELECT count(*) FROM detection").scalar()
+    engine.dispose()
+    return stored, elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Detection inserts")
+    parser.add_argument("--writers", type=int, default=32, help="Concurrent request threads")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per thread")
+    parser.add_argument("--boxes", type=int, default=3, help="Detections saved per request")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.requests} requests x {args.boxes} boxes\n")
+    print(f"{'mode':<16} | {'rows':>7} | {'seconds':>7} | {'rows/sec':>9} | {'req/sec':>8} | errors")
+    print("-" * 68)
+    for mode in ("per-request", "per-request+wal", "write-behind"):
+        stored, elapsed, errors = run(mode, args.writers, args.requests, args.boxes)
+        print(f"{mode:<16} | {stored:>7} | {elapsed:>7.2f} | {stored / elapsed:>9.0f} | "
+              f"{stored / args.boxes / elapsed:>8.0f} | {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: label statistics, naive vs. cached.
+
+Generates a synthetic labels directory (40k YOLO .txt files by default,
+kept in the temp directory between runs) and times:
+
+    naive        np.loadtxt() file by file, then the class histogram
+    cold build   label_stats.load() with no cache (parallel parse + write)
+    warm         load() with the cache up to date (stat + compare only)
+    warm, 1%     load() after touching 1% of the files
+    trusted      load(refresh=False): memory-map the cache only
+
+and the stats / validate / per-class queries on the cached columns.
+
+Usage:
+    python backend/benchmarks/bench_labels.py [--files 40000] [--workers 4]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import label_stats  # noqa: E402
+
+
+def make_labels(files, seed=0):
+    labels_dir = os.path.join(tempfile.gettempdir(), f"rdd_bench_labels_{files}", "labels", "train")
+    if not os.path.isdir(labels_dir):
+        print(f"📦 Writing {files:,} label files to {labels_dir}")
+        os.makedirs(labels_dir + ".part")
+        rng = np.random.default_rng(seed)
+        for i in range(files):
+            n = rng.integers(0, 6)
+            rows = np.column_stack([rng.integers(0, 4, n), rng.uniform(0.2, 0.8, (n, 2)), rng.uniform(0.01, 0.3, (n, 2))])
+            with open(os.path.join(labels_dir + ".part", f"Country_{i:06d}.txt"), "w") as f:
+                f.writelines(f"{int(r[0])} {r[1]:.6f} {r[2]:.6f} {r[3]:.6f} {r[4]:.6f}\n" for r in rows)
+        os.rename(labels_dir + ".part", labels_dir)
+    return labels_dir
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cached label statistics")
+    parser.add_argument("--files", type=int, default=40000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    labels_dir = make_labels(args.files)
+    shutil.rmtree(label_stats.cache_dir_for(labels_dir), ignore_errors=True)
+    names = sorted(os.listdir(labels_dir))
+
+    def naive():
+        counts = np.zeros(4, dtype=np.int64)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # loadtxt warns on empty files
+            for name in names:
+                rows = np.loadtxt(os.path.join(labels_dir, name), ndmin=2)
+                if rows.size:
+                    counts += np.bincount(rows[:, 0].astype(int), minlength=4)
+        return counts
+
+    print(f"\n{'step':>28} | {'ms':>9} | parsed")
+    print("-" * 52)
+    _, ms = timed(naive)
+    print(f"{'naive np.loadtxt per file':>28} | {ms:>9.1f} | {len(names):,}")
+    for label, prepare, refresh in (
+        ("cold build", None, True),
+        ("warm (cache up to date)", None, True),
+        ("warm, 1% of files touched", "touch", True),
+        ("trusted (--no-refresh)", None, False),
+    ):
+        if prepare == "touch":
+            for name in names[::100]:
+                os.utime(os.path.join(labels_dir, name), ns=(time.time_ns(), time.time_ns()))
+        cache, ms = timed(lambda: label_stats.load(labels_dir, refresh=refresh, workers=args.workers))
+        print(f"{label:>28} | {ms:>9.1f} | {cache.refreshed['parsed']:,}")
+
+    print(f"\n{'query':>28} | {'ms':>9}")
+    print("-" * 42)
+    for label, query in (
+        ("stats", lambda: cache.stats(["D00", "D10", "D20", "D40"])),
+        ("validate (nc=4)", lambda: cache.validate(4)),
+        ("images with D40", lambda: cache.images_with(3)),
+    ):
+        _, ms = timed(query)
+        print(f"{label:>28} | {ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: /history/map on synthetic city-scale data.
+
+Seeds a scratch database with detections along survey routes across
+Metro Manila, then compares the legacy "every marker" response with the
+bbox + zoom API (clusters below MAP_MARKER_ZOOM, markers above it) for
+viewports at several zoom levels. Reports query+serialize time and
+JSON payload size.
+
+Usage:
+    python backend/benchmarks/bench_map.py [--rows 500000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import spatial  # noqa: E402
+from database import Detection, init_db  # noqa: E402
+from ingest import enable_sqlite_wal  # noqa: E402
+from synthetic import seed_detections  # noqa: E402
+
+SEVERITY_BY_CODE = {"D00": "moderate", "D10": "moderate", "D20": "severe", "D40": "severe"}
+
+
+def viewport(center, zoom, width_px=400, height_px=800):
+    """Bounding box a phone screen shows around `center` (lat, lon) at `zoom`."""
+    degrees_per_px = 360.0 / (256 * 2 ** zoom)
+    half_w, half_h = width_px / 2 * degrees_per_px, height_px / 2 * degrees_per_px
+    return (center[1] - half_w, center[0] - half_h, center[1] + half_w, center[0] + half_h)
+
+
+def measure(fn, repeat=3):
+    best, payload = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        payload = json.dumps(fn())
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /history/map queries")
+    parser.add_argument("--rows", type=int, default=500_000, help="Synthetic detections to seed")
+    parser.add_argument("--marker-zoom", type=int, default=16, help="Zoom at which markers replace clusters")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_map_"), "detections.db")
+    engine = create_engine(f"sqlite:///{path}")
+    enable_sqlite_wal(engine)
+    init_db(engine)
+    print(f"📦 Seeding {args.rows:,} detections into {path}")
+    seed_detections(engine, args.rows)
+
+    table = Detection.__table__
+    print(f"\n{'request':<22} | {'items':>7} | {'ms':>9} | {'payload':>10}")
+    print("-" * 58)
+    with Session(engine) as session:
+        # Center the viewport on a surveyed road, like a user checking their route
+        center = session.execute(select(table.c.latitude, table.c.longitude).limit(1)).one()
+
+        def legacy():
+            records = session.scalars(
+                select(Detection)
+                .where(Detection.latitude.isnot(None), Detection.longitude.isnot(None))
+                .order_by(Detection.timestamp.desc())
+            ).all()
+            session.expunge_all()
+            return {"markers": [r.to_dict() for r in records], "total": len(records)}
+
+        ms, size = measure(legacy, repeat=1)
+        print(f"{'legacy (no bbox)':<22} | {args.rows:>7,} | {ms:>9.1f} | {size / 1e6:>8.1f} MB")
+
+        for zoom in (10, 12, 14, args.marker_zoom, 18):
+            bbox = viewport(center, zoom)
+            if zoom < args.marker_zoom:
+                def request():
+                    clusters = spatial.cluster(session.connection(), table, bbox, zoom, SEVERITY_BY_CODE)
+                    return {"clusters": clusters}
+            else:
+                def request():
+                    records = session.scalars(
+                        select(Detection).where(spatial.bbox_filter(Detection, bbox))
+                        .order_by(Detection.timestamp.desc()).limit(2000)
+                    ).all()
+                    session.expunge_all()
+                    return {"markers": [r.to_dict() for r in records]}
+            ms, size = measure(request)
+            items = len(next(iter(request().values())))
+            kind = "clusters" if zoom < args.marker_zoom else "markers"
+            print(f"{f'zoom {zoom} ({kind})':<22} | {items:>7,} | {ms:>9.1f} | {size / 1e3:>8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
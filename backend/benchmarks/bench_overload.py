@@ -0,0 +1,158 @@
+"""
+Benchmark: goodput and tail latency under overload, with and without
+admission control (admission.py).
+
+Simulates the /detect path in one process: Poisson arrivals go to a pool
+of handler threads (gunicorn's threads; the executor queue stands in for
+the listen backlog), which run frames through a BatchScheduler whose
+model is a sleep of `--fixed-ms` + `--frame-ms` per frame in the batch.
+A share of requests are sliced (`--sliced`, 5 tiles + the whole frame).
+Clients give up after `--timeout-s` and send X-Deadline-Ms a little below
+it. Three configurations at each load:
+
+    none       every request is queued and processed
+    shed       deadline shedding only (max_level 0)
+    degrade    shedding plus degradation (1: no tiling, 2: reduced input
+               size, a scheduler whose per-frame cost is `--degraded-ratio`
+               of the full one)
+
+Level 3 (not storing frames without detections) saves disk writes, which
+this simulation does not model.
+
+Reports per second of the run: offered requests, goodput (answered within
+the client timeout), shed and timed-out shares, p50/p99 latency of the
+answered requests, and the mean degradation level.
+
+Usage:
+    python backend/benchmarks/bench_overload.py [--seconds 20] [--loads 0.5,1,2,4]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from admission import AdmissionController  # noqa: E402
+from batching import BatchScheduler  # noqa: E402
+
+SLICED_TILES = 6  # tiles + the whole frame (hybrid)
+DEGRADED_COST = (416 / 640) ** 2  # app.frame_cost() at DEGRADED_INPUT_SIZE=416
+
+
+def sleeper(fixed_ms, frame_ms):
+    def predict(frames):
+        time.sleep((fixed_ms + frame_ms * len(frames)) / 1000)
+        return [None] * len(frames)
+    return predict
+
+
+def capacity(args):
+    """Requests/s the full-quality path sustains with full batches."""
+    batch_s = (args.fixed_ms + args.frame_ms * args.batch) / 1000
+    units_per_request = 1 + args.sliced * (SLICED_TILES - 1)
+    return args.batch / batch_s / units_per_request
+
+
+def run(config, rate, args, seed):
+    full = BatchScheduler(sleeper(args.fixed_ms, args.frame_ms), max_batch_size=args.batch, max_wait_ms=args.wait_ms)
+    degraded = BatchScheduler(sleeper(args.fixed_ms, args.frame_ms * args.degraded_ratio),
+                              max_batch_size=args.batch, max_wait_ms=args.wait_ms)
+    controller = None
+    if config != "none":
+        controller = AdmissionController(default_deadline=args.timeout_s, max_level=0 if config == "shed" else 3,
+                                         window=args.window_s, clock=time.perf_counter)
+    budget = args.timeout_s - args.margin_s
+
+    lock = threading.Lock()
+    answered, shed, expired = [], [0], [0]
+
+    def handle(arrived, sliced):
+        level = controller.level if controller else 0
+        tiles = SLICED_TILES if sliced and level < 1 else 1
+        cost = tiles if tiles > 1 else DEGRADED_COST if level >= 2 else 1.0
+        ticket = controller.admit(budget, cost, arrived=arrived) if controller else None
+        if ticket and not ticket.admitted:
+            with lock:
+                shed[0] += 1
+            return
+        try:
+            time.sleep(0.002)  # decode
+            if ticket and ticket.expired(time.perf_counter()):
+                controller.expire(ticket)
+                with lock:
+                    expired[0] += 1
+                return
+            scheduler = degraded if level >= 2 else full
+            for future in [scheduler.submit(None) for _ in range(tiles)]:
+                future.result()
+        finally:
+            if ticket:
+                controller.done(ticket)
+        with lock:
+            answered.append(time.perf_counter() - arrived)
+
+    rng = np.random.default_rng(seed)
+    count = int(rate * args.seconds)
+    offsets = np.cumsum(rng.exponential(1 / rate, count))
+    sliced = rng.random(count) < args.sliced
+    levels = []
+    pool = ThreadPoolExecutor(max_workers=args.threads)
+    started = time.perf_counter()
+    for offset, is_sliced in zip(offsets, sliced):
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        levels.append(controller.level if controller else 0)
+        pool.submit(handle, started + offset, is_sliced)
+    pool.shutdown(wait=True)
+
+    latencies = np.array(answered)
+    good = latencies[latencies <= args.timeout_s]
+    return {
+        "offered": count / args.seconds,
+        "goodput": len(good) / args.seconds,
+        "shed": (shed[0] + expired[0]) / count,
+        "timeout": (len(latencies) - len(good)) / count,
+        "p50": np.percentile(good, 50) * 1000 if len(good) else float("nan"),
+        "p99": np.percentile(good, 99) * 1000 if len(good) else float("nan"),
+        "level": float(np.mean(levels)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate /detect under overload with and without admission control")
+    parser.add_argument("--seconds", type=float, default=20, help="Arrivals per run")
+    parser.add_argument("--loads", default="0.5,1,2,4", help="Offered load as multiples of capacity")
+    parser.add_argument("--fixed-ms", type=float, default=40, help="Per-batch model time")
+    parser.add_argument("--frame-ms", type=float, default=20, help="Per-frame model time")
+    parser.add_argument("--degraded-ratio", type=float, default=0.45, help="Per-frame time at the reduced input size")
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--wait-ms", type=float, default=25)
+    parser.add_argument("--sliced", type=float, default=0.25, help="Share of requests with slice=hybrid")
+    parser.add_argument("--threads", type=int, default=32, help="Handler threads")
+    parser.add_argument("--timeout-s", type=float, default=3.0, help="Client timeout")
+    parser.add_argument("--margin-s", type=float, default=0.4, help="X-Deadline-Ms is the timeout less this")
+    parser.add_argument("--window-s", type=float, default=1.0, help="ADMISSION_WINDOW_S")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base = capacity(args)
+    print(f"\ncapacity ≈ {base:.1f} req/s ({args.sliced:.0%} sliced), client timeout {args.timeout_s:g}s, "
+          f"{args.seconds:g}s per run\n")
+    print(f"{'load':>5} | {'config':>8} | {'offered/s':>9} | {'goodput/s':>9} | {'shed':>6} | {'timeout':>7} | "
+          f"{'p50 ms':>7} | {'p99 ms':>7} | {'level':>5}")
+    print("-" * 88)
+    for load in (float(x) for x in args.loads.split(",")):
+        for config in ("none", "shed", "degrade"):
+            r = run(config, load * base, args, args.seed)
+            print(f"{load:>4g}x | {config:>8} | {r['offered']:>9.1f} | {r['goodput']:>9.1f} | {r['shed']:>6.1%} | "
+                  f"{r['timeout']:>7.1%} | {r['p50']:>7.0f} | {r['p99']:>7.0f} | {r['level']:>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Micro-benchmark: pandas/iterrows post-processing vs. vectorized NumPy path.
+
+Compares the old `results.pandas().xyxy[0]` + `iterrows()` loop with
+`postprocess.postprocess()` at 1, 20 and 300 boxes per frame. Both paths
+produce the JSON detections and the Detection row data; ORM/DB cost is
+excluded so only post-processing is measured.
+
+Usage:
+    python backend/benchmarks/bench_postprocess.py [--repeat 2000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from postprocess import LabelTable, postprocess  # noqa: E402
+
+DAMAGE_LABELS = {
+    0: {"code": "D00", "name": "Longitudinal Crack", "color": "#FF6B6B", "severity": "moderate"},
+    1: {"code": "D10", "name": "Transverse Crack", "color": "#FFA500", "severity": "moderate"},
+    2: {"code": "D20", "name": "Alligator Crack", "color": "#FF4444", "severity": "severe"},
+    3: {"code": "D40", "name": "Pothole", "color": "#CC0000", "severity": "severe"},
+}
+NAMES = {0: "D00", 1: "D10", 2: "D20", 3: "D40"}
+
+
+def synthetic_predictions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    pred = np.zeros((n, 6), dtype=np.float32)
+    pred[:, 0:2] = rng.uniform(0, 600, (n, 2))
+    pred[:, 2:4] = pred[:, 0:2] + rng.uniform(10, 200, (n, 2))
+    pred[:, 4] = rng.uniform(0.4, 1.0, n)
+    pred[:, 5] = rng.integers(0, 4, n)
+    return pred
+
+
+def legacy_path(pred):
+    """The pre-vectorization code: DataFrame construction + iterrows()."""
+    import pandas as pd
+
+    # What YOLOv5's Detections.pandas() builds per image
+    df = pd.DataFrame(pred, columns=["xmin", "ymin", "xmax", "ymax", "confidence", "class"])
+    df["class"] = df["class"].astype(int)
+    df["name"] = [NAMES[c] for c in df["class"]]
+
+    detections, rows = [], []
+    for _, row in df.iterrows():
+        class_id = int(row["class"])
+        label_info = DAMAGE_LABELS.get(class_id, {
+            "code": f"D{class_id}",
+            "name": row.get("name", f"Class {class_id}"),
+            "color": "#999999",
+            "severity": "unknown",
+        })
+        detections.append({
+            "damage_type": label_info["name"],
+            "damage_code": label_info["code"],
+            "confidence": round(float(row["confidence"]), 4),
+            "color": label_info["color"],
+            "severity": label_info["severity"],
+            "bbox": {
+                "x1": round(float(row["xmin"]), 2),
+                "y1": round(float(row["ymin"]), 2),
+                "x2": round(float(row["xmax"]), 2),
+                "y2": round(float(row["ymax"]), 2),
+            },
+        })
+        rows.append(dict(
+            latitude=14.28, longitude=120.95, image_filename="bench.jpg",
+            damage_type=label_info["name"], damage_code=label_info["code"],
+            confidence=float(row["confidence"]),
+            bbox_x1=float(row["xmin"]), bbox_y1=float(row["ymin"]),
+            bbox_x2=float(row["xmax"]), bbox_y2=float(row["ymax"]),
+        ))
+    return detections, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detection post-processing")
+    parser.add_argument("--repeat", type=int, default=500, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    labels = LabelTable(DAMAGE_LABELS, NAMES)
+
+    print(f"{'boxes':>6} | {'pandas (µs)':>12} | {'numpy (µs)':>11} | {'speedup':>7}")
+    print("-" * 46)
+    for n in (1, 20, 300):
+        pred = synthetic_predictions(n)
+        repeat = max(10, args.repeat // max(1, n // 20))
+
+        # Sanity check: both paths produce the same payload
+        assert legacy_path(pred)[0] == postprocess(pred, labels)[0]
+
+        legacy = min(timeit.repeat(lambda: legacy_path(pred), number=repeat, repeat=3)) / repeat
+        fast = min(timeit.repeat(
+            lambda: postprocess(pred, labels, latitude=14.28, longitude=120.95, image_filename="bench.jpg"),
+            number=repeat, repeat=3,
+        )) / repeat
+        print(f"{n:>6} | {legacy * 1e6:>12.1f} | {fast * 1e6:>11.1f} | {legacy / fast:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
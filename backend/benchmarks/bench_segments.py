@@ -0,0 +1,145 @@
+"""
+Benchmark: flat files vs. segment-packed uploads.
+
+Stores the same synthetic frames (random bytes of dashcam-JPEG sizes) in
+an ImageStore with each layout and measures:
+
+    write        store every image (what the ImageWriter does per upload)
+    open         a fresh process's first read (segments: loading the index)
+    read, cold   random reads after evicting the files from the page cache
+    read, warm   the same reads again
+    delete 50%   remove half of the images
+    compact      reclaim their space (segments only; files are unlinked at delete)
+
+Reports throughput, p50/p99 read latency, files created and bytes on disk.
+
+Usage:
+    python backend/benchmarks/bench_segments.py [--images 5000] [--kb 120] [--reads 2000]
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import image_store  # noqa: E402
+
+
+def make_images(count, kb, seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = np.clip(rng.normal(kb * 1024, kb * 256, count), 8 * 1024, None).astype(int)
+    images = [rng.bytes(int(size)) for size in sizes]
+    return [(hashlib.sha256(data).hexdigest()[:32] + ".jpg", data) for data in images]
+
+
+def disk_usage(root):
+    files, used = 0, 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            st = os.stat(os.path.join(dirpath, name))
+            files += 1
+            used += st.st_blocks * 512
+    return files, used
+
+
+def drop_page_cache(root):
+    """Evict the store's files from the page cache (no root needed)."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            fd = os.open(os.path.join(dirpath, name), os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)  # clean pages only: written data was synced
+            finally:
+                os.close(fd)
+    return True
+
+
+def timed_reads(store, names):
+    latencies = []
+    for name in names:
+        started = time.perf_counter()
+        data = store.read(name)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert data is not None, name
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def run(layout, images, reads, seed):
+    root = tempfile.mkdtemp(prefix=f"rdd_bench_{layout}_")
+    results = {}
+    try:
+        store = image_store.ImageStore(root, layout=layout)
+        total = sum(len(data) for _, data in images)
+        started = time.perf_counter()
+        for name, data in images:
+            store.write(name, data)
+        if store.segments:
+            store.segments.sync()
+            store.segments.seal()  # as when the writing process exits
+        else:
+            os.sync()  # flat files: flush the written pages too, for a like-for-like figure
+        elapsed = time.perf_counter() - started
+        results["write"] = (len(images) / elapsed, total / elapsed / 1e6)
+        results["disk"] = disk_usage(root)
+
+        # A new process (worker start, bulk_process) opening the store
+        store = image_store.ImageStore(root, layout=layout)
+        started = time.perf_counter()
+        store.read(images[0][0])
+        results["open"] = (time.perf_counter() - started) * 1000
+
+        order = np.random.default_rng(seed).integers(0, len(images), reads)
+        names = [images[i][0] for i in order]
+        results["cold"] = timed_reads(store, names) if drop_page_cache(root) else None
+        results["warm"] = timed_reads(store, names)
+
+        started = time.perf_counter()
+        store.remove([name for name, _ in images[::2]])
+        results["delete"] = (time.perf_counter() - started) * 1000
+        if store.segments:
+            store.segments.seal()  # the segment holding the tombstones
+            started = time.perf_counter()
+            summary = store.segments.compact()
+            results["compact"] = ((time.perf_counter() - started) * 1000, summary["reclaimed_bytes"])
+        results["disk_after"] = disk_usage(root)
+        for name, data in images[1::2][:200]:
+            assert store.read(name) == data
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark flat-file vs. segment upload storage")
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--kb", type=int, default=120, help="Mean image size")
+    parser.add_argument("--reads", type=int, default=2000, help="Random reads per pass")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    images = make_images(args.images, args.kb, args.seed)
+    print(f"\n{args.images:,} images, {sum(len(d) for _, d in images) / 1e6:,.0f} MB, {args.reads:,} random reads\n")
+    print(f"{'layout':>8} | {'write/s':>8} | {'MB/s':>6} | {'open ms':>7} | {'cold p50/p99 ms':>15} | "
+          f"{'warm p50/p99 ms':>15} | {'files':>6} | {'MB on disk':>10} | {'delete ms':>9} | {'compact ms':>10} | "
+          f"{'MB after':>8}")
+    print("-" * 134)
+    for layout in image_store.LAYOUTS:
+        r = run(layout, images, args.reads, args.seed)
+        cold = f"{r['cold'][0]:.3f} / {r['cold'][1]:.3f}" if r["cold"] else "n/a"
+        warm = f"{r['warm'][0]:.3f} / {r['warm'][1]:.3f}"
+        compact = f"{r['compact'][0]:.0f}" if "compact" in r else "-"
+        print(f"{layout:>8} | {r['write'][0]:>8.0f} | {r['write'][1]:>6.0f} | {r['open']:>7.1f} | {cold:>15} | "
+              f"{warm:>15} | {r['disk'][0]:>6} | {r['disk'][1] / 1e6:>10.0f} | {r['delete']:>9.0f} | {compact:>10} | "
+              f"{r['disk_after'][1] / 1e6:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: merging detections into damage sites as the table grows.
+
+Seeds scratch databases with increasing numbers of damage sites, then
+times `sites.assign_sites` on flush-sized batches of new detections
+(rolled back after each run). With the quadkey index the per-detection
+cost should stay flat as the site table grows.
+
+Usage:
+    python backend/benchmarks/bench_sites.py [--sizes 10000,100000,1000000] [--batch 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sites  # noqa: E402
+from database import DamageSite, init_db  # noqa: E402
+from ingest import enable_sqlite_wal  # noqa: E402
+from synthetic import detection_rows  # noqa: E402
+
+
+def seed_sites(engine, count, chunk=50000):
+    table = DamageSite.__table__
+    with engine.begin() as conn:
+        for first in range(0, count, chunk):
+            batch = []
+            for row in detection_rows(min(chunk, count - first), first=first, seed=1):
+                site = sites._new_site(row)
+                site["id"] = row["id"]
+                batch.append(site)
+            conn.execute(insert(table), batch)
+
+
+def measure(engine, batch, repeat=5):
+    """Median ms to assign one batch (each run rolled back)."""
+    timings = []
+    for r in range(repeat):
+        rows = list(detection_rows(batch, first=10_000_000 + r * batch, seed=1))
+        with engine.connect() as conn:
+            transaction = conn.begin()
+            started = time.perf_counter()
+            sites.assign_sites(conn, DamageSite.__table__, rows)
+            timings.append((time.perf_counter() - started) * 1000)
+            transaction.rollback()
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark damage-site merging")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Site table sizes")
+    parser.add_argument("--batch", type=int, default=500, help="Detections per flush")
+    args = parser.parse_args()
+
+    print(f"{'sites':>10} | {'ms/batch':>9} | {'µs/detection':>12}")
+    print("-" * 38)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",")):
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, f'sites_{size}.db')}")
+            enable_sqlite_wal(engine)
+            init_db(engine)
+            seed_sites(engine, size)
+            ms = measure(engine, args.batch)
+            print(f"{size:>10,} | {ms:>9.1f} | {ms * 1000 / args.batch:>12.1f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
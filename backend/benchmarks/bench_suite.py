@@ -0,0 +1,358 @@
+"""
+Benchmark suite: end-to-end throughput, latency and memory per endpoint,
+compared against a saved baseline.
+
+Runs offline on a CPU-only Linux box. serve.py (gunicorn) is started with
+INFERENCE_BACKEND=stub, a stand-in detector with a fixed per-batch and
+per-image delay and box count (see inference.StubBackend), on a fresh copy
+of a seeded SQLite database. A new server is started for every database
+size and endpoint, so each endpoint's peak memory is its own. Concurrent
+clients then drive:
+
+    detect         POST /detect with distinct synthetic dashcam JPEGs (saved)
+    history        GET /history: first page, then keyset pages via next_cursor
+    history_map    GET /history/map at random viewports along the survey routes, zoom 12-18
+    history_stats  GET /history/stats, all time and per day for a viewport
+
+Reports requests/s, p50/p95/p99 latency, errors and the worker's peak RSS
+(from /metrics). --json writes the results; --baseline compares them with
+an earlier --json file and exits with status 1 when an endpoint's
+throughput fell, p95 rose or peak memory grew by more than --tolerance.
+
+Usage:
+    python backend/benchmarks/bench_suite.py --json baseline.json
+    python backend/benchmarks/bench_suite.py --baseline baseline.json
+    python backend/benchmarks/bench_suite.py --rows 10000,200000 --endpoints detect,history --duration 20
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_map import viewport  # noqa: E402
+from database import init_db  # noqa: E402
+from ingest import enable_sqlite_wal  # noqa: E402
+from load_test import BACKEND_DIR, percentile, wait_until_ready  # noqa: E402
+from synthetic import detection_rows, road_jpeg, seed_detections  # noqa: E402
+
+ENDPOINTS = ("detect", "history", "history_map", "history_stats")
+FRAMES = 64  # distinct JPEGs the detect clients cycle through
+HISTORY_DEPTH = 20  # pages a history client follows before starting over
+MAP_ZOOMS = (12, 14, 16, 18)
+LATENCY_FLOOR_MS = 1.0  # p95 changes smaller than this are noise, not regressions
+PEAK_RSS = re.compile(r'^rdd_process_memory_bytes\{[^}]*kind="peak_rss"[^}]*\} (\S+)$', re.MULTILINE)
+
+
+# ============================================================
+# DATA
+# ============================================================
+
+def seed_database(directory, rows, seed):
+    """A seeded database file (made once per size, copied for every run)."""
+    path = os.path.join(directory, f"seed_{rows}.db")
+    engine = create_engine(f"sqlite:///{path}")
+    enable_sqlite_wal(engine)
+    init_db(engine)
+    seed_detections(engine, rows, seed=seed, quiet=True)
+    engine.dispose()  # the last connection checkpoints the WAL into the file
+    return path
+
+
+def map_centers(rows, seed, count=256):
+    """Points on the seeded survey routes, where a user would look at the map."""
+    return [(r["latitude"], r["longitude"]) for r in detection_rows(min(count, rows), seed=seed)]
+
+
+# ============================================================
+# CLIENTS
+# ============================================================
+
+def make_client(endpoint, url, index, frames, centers, seed):
+    """One client's request function: sends a request and returns whether it succeeded."""
+    session = requests.Session()
+    rng = random.Random(seed * 1000 + index)
+
+    if endpoint == "detect":
+        position = [index * 7]
+
+        def request():
+            position[0] += 1
+            response = session.post(
+                f"{url}/detect",
+                files={"image": ("frame.jpg", frames[position[0] % len(frames)], "image/jpeg")},
+                data={"latitude": "14.2833", "longitude": "120.9567", "session_id": f"bench-{index}"},
+                timeout=60,
+            )
+            return response.status_code == 200
+
+    elif endpoint == "history":
+        state = {"cursor": None, "pages": 0}
+
+        def request():
+            params = {"limit": 50}
+            if state["cursor"] and state["pages"] < HISTORY_DEPTH:
+                params["cursor"] = state["cursor"]
+            else:
+                state["pages"] = 0
+            response = session.get(f"{url}/history", params=params, timeout=60)
+            if response.status_code != 200:
+                return False
+            state["cursor"] = response.json().get("next_cursor")
+            state["pages"] += 1
+            return True
+
+    elif endpoint == "history_map":
+        def request():
+            zoom = rng.choice(MAP_ZOOMS)
+            bbox = viewport(rng.choice(centers), zoom)
+            response = session.get(f"{url}/history/map", timeout=60,
+                                   params={"bbox": ",".join(f"{v:.6f}" for v in bbox), "zoom": zoom})
+            return response.status_code == 200
+
+    elif endpoint == "history_stats":
+        def request():
+            if rng.random() < 0.5:
+                params = {}
+            else:
+                bbox = viewport(rng.choice(centers), 12)
+                params = {"bbox": ",".join(f"{v:.6f}" for v in bbox), "by_day": "true"}
+            response = session.get(f"{url}/history/stats", params=params, timeout=60)
+            return response.status_code == 200
+
+    else:
+        raise ValueError(f"unknown endpoint {endpoint!r}")
+    return request
+
+
+def run_clients(clients, duration, warmup):
+    """Call every client in a loop on its own thread; latencies of the measured period."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    def loop(request):
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                return
+            try:
+                ok = request()
+            except requests.RequestException:
+                ok = False
+            done = time.perf_counter()
+            if sent < measure_from:
+                continue
+            with lock:
+                if ok:
+                    latencies.append((done - sent) * 1000)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=loop, args=(client,), daemon=True) for client in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return latencies, errors[0]
+
+
+# ============================================================
+# SERVER
+# ============================================================
+
+def start_server(args, database, uploads, metrics_dir, log):
+    env = {
+        **os.environ,
+        "INFERENCE_BACKEND": "stub",
+        "STUB_BOXES": str(args.stub_boxes),
+        "STUB_BATCH_MS": str(args.stub_batch_ms),
+        "STUB_IMAGE_MS": str(args.stub_image_ms),
+        "DATABASE_PATH": database,
+        "UPLOAD_DIR": uploads,
+        "METRICS_DIR": metrics_dir,
+        "METRICS_INTERVAL_S": "1",
+    }
+    cmd = [sys.executable, "serve.py", "--workers", str(args.workers), "--threads", str(args.threads),
+           "--host", "127.0.0.1", "--port", str(args.port)]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def peak_rss_mb(url):
+    """Largest peak RSS among the server's worker processes."""
+    time.sleep(1.5)  # let every worker publish a fresh snapshot
+    values = [float(v) for v in PEAK_RSS.findall(requests.get(f"{url}/metrics", timeout=10).text)]
+    return round(max(values) / 2 ** 20, 1) if values else None
+
+
+def run_endpoint(endpoint, rows, seed_path, frames, centers, args, scratch):
+    run_dir = tempfile.mkdtemp(prefix=f"{endpoint}_{rows}_", dir=scratch)
+    database = os.path.join(run_dir, "detections.db")
+    shutil.copyfile(seed_path, database)
+    log_path = os.path.join(run_dir, "server.log")
+    url = f"http://127.0.0.1:{args.port}"
+    with open(log_path, "w") as log:
+        process = start_server(args, database, os.path.join(run_dir, "uploads"), os.path.join(run_dir, "metrics"), log)
+        try:
+            try:
+                wait_until_ready(url, process, timeout=120)
+            except RuntimeError:
+                with open(log_path) as f:
+                    print(f.read()[-2000:])
+                raise
+            idle = peak_rss_mb(url)
+            clients = [make_client(endpoint, url, i, frames, centers, args.seed) for i in range(args.concurrency)]
+            latencies, errors = run_clients(clients, args.duration, args.warmup)
+            peak = peak_rss_mb(url)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return {
+        "endpoint": endpoint,
+        "rows": rows,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / args.duration, 2),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "idle_rss_mb": idle,
+        "peak_rss_mb": peak,
+    }
+
+
+# ============================================================
+# BASELINE
+# ============================================================
+
+def regressions(current, baseline, tolerance):
+    """Reasons `current` is worse than `baseline` (empty if it is not)."""
+    found = []
+    if baseline["rps"] and current["rps"] < baseline["rps"] * (1 - tolerance):
+        found.append(f"req/s {baseline['rps']:g} -> {current['rps']:g}")
+    if current["p95_ms"] > baseline["p95_ms"] * (1 + tolerance) and current["p95_ms"] - baseline["p95_ms"] > LATENCY_FLOOR_MS:
+        found.append(f"p95 {baseline['p95_ms']:g} -> {current['p95_ms']:g} ms")
+    if baseline.get("peak_rss_mb") and current.get("peak_rss_mb") \
+            and current["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        found.append(f"peak RSS {baseline['peak_rss_mb']:g} -> {current['peak_rss_mb']:g} MB")
+    if current["errors"] > baseline["errors"]:
+        found.append(f"errors {baseline['errors']} -> {current['errors']}")
+    return found
+
+
+def compare(report, baseline, tolerance):
+    """Print the differences from the baseline; returns the number of regressed runs."""
+    changed = {k: (baseline["config"].get(k), v) for k, v in report["config"].items()
+               if k not in ("rows", "endpoints") and baseline["config"].get(k) != v}  # runs are matched by key
+    if changed:
+        print("\n⚠️  Baseline was recorded with a different configuration, results may not be comparable:")
+        for key, (old, new) in changed.items():
+            print(f"   {key}: {old} -> {new}")
+    if baseline["machine"] != report["machine"]:
+        print(f"\n⚠️  Baseline was recorded on {baseline['machine']}")
+
+    print(f"\nAgainst baseline from {baseline['created']} (tolerance {tolerance:.0%}):\n")
+    failed = 0
+    for key, current in report["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            print(f"   {key:<24} new")
+            continue
+        found = regressions(current, previous, tolerance)
+        failed += bool(found)
+        rps = (current["rps"] / previous["rps"] - 1) if previous["rps"] else 0
+        p95 = (current["p95_ms"] / previous["p95_ms"] - 1) if previous["p95_ms"] else 0
+        status = "❌ " + "; ".join(found) if found else "✅"
+        print(f"   {key:<24} req/s {rps:>+7.1%}  p95 {p95:>+7.1%}  {status}")
+    return failed
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite with a stub model and a JSON baseline")
+    parser.add_argument("--rows", default="10000,100000", help="Seeded database sizes")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--workers", type=int, default=1, help="serve.py worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="Request threads per worker")
+    parser.add_argument("--port", type=int, default=5066)
+    parser.add_argument("--stub-boxes", type=int, default=3, help="Boxes the stub detector returns per image")
+    parser.add_argument("--stub-batch-ms", type=float, default=20.0, help="Stub detector time per batch")
+    parser.add_argument("--stub-image-ms", type=float, default=10.0, help="Stub detector time per image")
+    parser.add_argument("--width", type=int, default=1280, help="Synthetic frame size")
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file (use it as a later --baseline)")
+    parser.add_argument("--baseline", help="Results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative change before a regression")
+    args = parser.parse_args()
+
+    sizes = [int(r) for r in args.rows.split(",")]
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))} (choose from {', '.join(ENDPOINTS)})")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("json", "baseline", "tolerance", "port")}
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": f"{platform.machine()} {os.cpu_count()} CPUs, Python {platform.python_version()}",
+        "config": config,
+        "results": {},
+    }
+    frames = [road_jpeg(args.width, args.height, seed=args.seed * 1000 + i) for i in range(FRAMES)]
+    print(f"\n🚗 {args.concurrency} clients, {args.duration:g} s per run, {args.workers} worker(s) x {args.threads} threads, "
+          f"stub {args.stub_batch_ms:g} + {args.stub_image_ms:g} ms/image, {args.stub_boxes} boxes\n")
+    print(f"{'rows':>8} | {'endpoint':<14} | {'requests':>8} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | "
+          f"{'p99 ms':>8} | {'errors':>6} | {'RSS MB idle/peak':>16}")
+    print("-" * 104)
+
+    scratch = tempfile.mkdtemp(prefix="rdd_bench_suite_")
+    try:
+        for rows in sizes:
+            seed_path = seed_database(scratch, rows, args.seed)
+            centers = map_centers(rows, args.seed)
+            for endpoint in endpoints:
+                r = run_endpoint(endpoint, rows, seed_path, frames, centers, args, scratch)
+                report["results"][f"{rows}/{endpoint}"] = r
+                memory = f"{r['idle_rss_mb']} / {r['peak_rss_mb']}"
+                print(f"{rows:>8,} | {endpoint:<14} | {r['requests']:>8} | {r['rps']:>8.1f} | {r['p50_ms']:>8.1f} | "
+                      f"{r['p95_ms']:>8.1f} | {r['p99_ms']:>8.1f} | {r['errors']:>6} | {memory:>16}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 Results written to {args.json}")
+    if baseline is not None and compare(report, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: images for one history page (100 items) over /uploads.
+
+Stores 100 synthetic dashcam-sized JPEGs in a scratch image store and
+fetches them through the app's /uploads route (Flask test client, so
+latency excludes the network) the way the history list would:
+
+    original      full-size frames, as HistoryScreen loaded them before
+    thumb, cold   ?size=thumb, generated on this request
+    thumb, warm   ?size=thumb, from the derivative cache
+    revalidate    thumb with If-None-Match (a client whose cache entry is stale)
+    preview       ?size=preview (the detail view), cold and warm
+
+Reports bytes transferred, total and p95 per-image latency, and the
+transfer time on a 10 Mbit/s mobile link. With the immutable
+Cache-Control, a client that still has the page cached sends no
+requests at all.
+
+Usage:
+    python backend/benchmarks/bench_uploads.py [--items 100] [--width 1920] [--height 1080]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import image_store  # noqa: E402
+
+LINK_MBIT = 10
+
+
+def synthetic_jpeg(rng, width, height):
+    """Road-like texture: smooth gradients plus fine noise, so it compresses like a photo."""
+    coarse = rng.integers(60, 200, (height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.BICUBIC)
+    pixels = np.asarray(image, dtype=np.int16) + rng.integers(-8, 8, (height, width, 1), dtype=np.int16)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def fetch(client, names, query="", etags=None):
+    """(bytes, per-image ms, statuses, ETags) for fetching every name."""
+    sizes, latencies, statuses, seen = 0, [], set(), {}
+    for name in names:
+        headers = {"If-None-Match": etags[name]} if etags else {}
+        started = time.perf_counter()
+        response = client.get(f"/uploads/{name}{query}", headers=headers)
+        body = response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        sizes += len(body)
+        statuses.add(response.status_code)
+        seen[name] = response.headers.get("ETag")
+    return sizes, latencies, statuses, seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /uploads for a history page")
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    import app as server  # noqa: E402  (the model loads in the background; it is not needed here)
+
+    scratch = tempfile.mkdtemp(prefix="rdd_bench_uploads_")
+    server.upload_store = image_store.ImageStore(scratch)
+    rng = np.random.default_rng(0)
+    names = []
+    for _ in range(args.items):
+        data = synthetic_jpeg(rng, args.width, args.height)
+        name, _ = server.upload_store.claim(data)
+        server.upload_store.write(name, data)
+        names.append(name)
+
+    client = server.app.test_client()
+    print(f"\n{args.items} images of {args.width}x{args.height}\n")
+    print(f"{'request':>14} | {'status':>6} | {'KB total':>9} | {'KB/image':>8} | {'ms total':>8} | "
+          f"{'p95 ms':>7} | {f'{LINK_MBIT} Mbit/s':>10}")
+    print("-" * 82)
+    try:
+        etags = None
+        for label, query, revalidate in (
+            ("original", "", False),
+            ("thumb, cold", "?size=thumb", False),
+            ("thumb, warm", "?size=thumb", False),
+            ("revalidate", "?size=thumb", True),
+            ("preview, cold", "?size=preview", False),
+            ("preview, warm", "?size=preview", False),
+        ):
+            sizes, latencies, statuses, seen = fetch(client, names, query, etags if revalidate else None)
+            etags = seen if query == "?size=thumb" and not revalidate else etags
+            link_s = sizes * 8 / (LINK_MBIT * 1e6)
+            print(f"{label:>14} | {','.join(map(str, sorted(statuses))):>6} | {sizes / 1024:>9.0f} | "
+                  f"{sizes / 1024 / len(names):>8.1f} | {sum(latencies):>8.0f} | "
+                  f"{np.percentile(latencies, 95):>7.1f} | {link_s:>9.1f}s")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Evaluate the low-resolution gate ahead of the full detector.
+
+Runs the full model and the gate pass (GATE_SIZE) over the validation
+split once, then sweeps gate thresholds and reports, per threshold:
+  - skipped:   frames the gate would not send to the full model
+  - lost det:  full-model detections that fall in skipped frames
+  - lost GT:   labelled boxes that fall in skipped frames
+  - speedup:   full-model-only time / cascade time (gate + passed frames)
+
+Usage:
+    python backend/benchmarks/eval_gate.py
+    python backend/benchmarks/eval_gate.py --size 256 --thresholds 0.05,0.1,0.2 --backend onnx
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_backends import VAL_IMAGES, load_split  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the low-resolution gating stage")
+    parser.add_argument("--backend", default=os.environ.get("INFERENCE_BACKEND", "torch"))
+    parser.add_argument("--size", type=int, default=int(os.environ.get("GATE_SIZE", 0) or 320), help="Gate input size")
+    parser.add_argument("--thresholds", default="0.02,0.05,0.1,0.15,0.2,0.3")
+    parser.add_argument("--conf", type=float, default=0.40, help="Full-model confidence threshold (as served)")
+    parser.add_argument("--limit", type=int, help="Only use the first N validation images")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    thresholds = sorted(float(t) for t in args.thresholds.split(","))
+    split = load_split(limit=args.limit)
+    if not split:
+        raise SystemExit(f"❌ No validation images in {VAL_IMAGES} (see download_dataset.py)")
+
+    def configure(backend):
+        backend.conf, backend.iou, backend.max_det = args.conf, 0.45, 20
+
+    backend = ModelRegistry(configure=configure, backend=args.backend).load()
+    images = [Image.open(path).convert("RGB") for path, _ in split]
+    for image in images[:3]:  # warm-up
+        backend.predict([image])
+        backend.predict([image], size=args.size, conf=thresholds[0])
+
+    frames = []  # (full detections, gate max confidence, labelled boxes, full ms, gate ms)
+    for image, (_, labels) in zip(images, split):
+        full, full_ms = timed(backend.predict, [image])
+        gated, gate_ms = timed(backend.predict, [image], size=args.size, conf=thresholds[0])
+        gate_max = float(gated[0][:, 4].max()) if len(gated[0]) else 0.0
+        frames.append((len(full[0]), gate_max, len(labels), full_ms, gate_ms))
+
+    total_det = sum(f[0] for f in frames) or 1
+    total_gt = sum(f[2] for f in frames) or 1
+    baseline_ms = sum(f[3] for f in frames)
+    print(f"📊 {len(frames)} frames, gate {args.size}px vs full model: "
+          f"{baseline_ms / len(frames):.1f} ms/frame, {sum(f[4] for f in frames) / len(frames):.1f} ms/frame gate\n")
+    print(f"{'threshold':>9} | {'skipped':>7} | {'lost det':>8} | {'lost GT':>7} | {'ms/frame':>8} | speedup")
+    print("-" * 64)
+
+    results = []
+    for threshold in thresholds:
+        skipped = [f for f in frames if f[1] < threshold]
+        cascade_ms = sum(f[4] for f in frames) + sum(f[3] for f in frames if f[1] >= threshold)
+        row = {
+            "threshold": threshold,
+            "skipped_rate": round(len(skipped) / len(frames), 4),
+            "lost_detection_rate": round(sum(f[0] for f in skipped) / total_det, 4),
+            "lost_ground_truth_rate": round(sum(f[2] for f in skipped) / total_gt, 4),
+            "ms_per_frame": round(cascade_ms / len(frames), 2),
+            "speedup": round(baseline_ms / cascade_ms, 3),
+        }
+        results.append(row)
+        print(f"{threshold:>9.2f} | {row['skipped_rate']:>7.1%} | {row['lost_detection_rate']:>8.1%} | "
+              f"{row['lost_ground_truth_rate']:>7.1%} | {row['ms_per_frame']:>8.1f} | {row['speedup']:.2f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"size": args.size, "backend": args.backend, "thresholds": results}, f, indent=2)
+        print(f"\n📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Evaluate sliced inference: recall gain vs. latency cost.
+
+Runs the validation split through whole-frame inference and through the
+sliced modes (slicing.py) for each tile/overlap setting, and reports per
+mode: recall@0.5 (all boxes, small boxes, and the thin-crack classes
+D00/D10), mAP@0.5, tiles per image and ms/image. Images are decoded the
+way /detect does (at SLICE_IMAGE_SIZE for the sliced modes).
+
+Usage:
+    python backend/benchmarks/eval_slicing.py
+    python backend/benchmarks/eval_slicing.py --tiles 512,640 --overlaps 0.1,0.2 --image-size 0 --limit 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import preprocess  # noqa: E402
+import slicing  # noqa: E402
+from bench_backends import VAL_IMAGES, box_iou, evaluate, load_split  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+
+THIN_CLASSES = (0, 1)  # D00 longitudinal, D10 transverse cracks
+
+
+def recall(predictions, truths, iou_threshold=0.5, select=None):
+    """Share of labelled boxes (optionally only those `select` keeps) matched by a prediction of their class."""
+    found = total = 0
+    for pred, truth in zip(predictions, truths):
+        if select is not None:
+            truth = truth[select(truth)]
+        for row in truth:
+            total += 1
+            candidates = pred[pred[:, 5] == row[0]]
+            if len(candidates) and box_iou(row[1:], candidates[:, :4]).max() >= iou_threshold:
+                found += 1
+    return found / total if total else float("nan")
+
+
+def run(backend, split, mode, size, tile, overlap, image_size, merge_threshold):
+    """(predictions in original pixels, ms/image, tiles/image) for one setting."""
+    predictions, elapsed, tiles = [], 0.0, 0
+    for path, _ in split:
+        with open(path, "rb") as f:
+            data = f.read()
+        started = time.perf_counter()
+        if mode == "off":
+            frame = preprocess.prepare(data, size)
+            predictions.append(frame.restore(backend.predict([frame.array])[0]))
+        else:
+            frame = preprocess.prepare(data, size, source_size=image_size)
+            full = frame.restore(backend.predict([frame.array])[0]) if mode == "hybrid" else None
+            windows = slicing.tile_windows(frame.source.shape[1], frame.source.shape[0], tile, overlap)
+            tiles += len(windows)
+            predictions.append(slicing.merge(backend.predict(slicing.crop(frame.source, windows)), windows,
+                                             (frame.scale_x, frame.scale_y), full, merge_threshold))
+        elapsed += time.perf_counter() - started
+    return predictions, elapsed * 1000 / len(split), tiles / len(split)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate sliced inference (recall vs latency)")
+    parser.add_argument("--backend", default=os.environ.get("INFERENCE_BACKEND", "torch"))
+    parser.add_argument("--modes", default="off,tiles,hybrid")
+    parser.add_argument("--size", type=int, default=int(os.environ.get("MODEL_INPUT_SIZE", 640)), help="Model input size")
+    parser.add_argument("--tiles", default=os.environ.get("SLICE_TILE", "640"), help="Tile sizes to try")
+    parser.add_argument("--overlaps", default=os.environ.get("SLICE_OVERLAP", "0.2"), help="Tile overlaps to try")
+    parser.add_argument("--image-size", type=int, default=int(os.environ.get("SLICE_IMAGE_SIZE", 1920)),
+                        help="Longest side the tiles are cut from (0: full resolution)")
+    parser.add_argument("--merge", type=float, default=float(os.environ.get("SLICE_MERGE", 0.5)))
+    parser.add_argument("--conf", type=float, default=0.40, help="Confidence threshold (as served)")
+    parser.add_argument("--small", type=float, default=0.001, help="'Small' boxes: below this fraction of the image area")
+    parser.add_argument("--limit", type=int, help="Only use the first N validation images")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    split = load_split(limit=args.limit)
+    if not split:
+        raise SystemExit(f"❌ No validation images in {VAL_IMAGES} (see download_dataset.py)")
+    truths = [labels for _, labels in split]
+    areas = []
+    for path, _ in split:
+        with Image.open(path) as image:
+            areas.append(image.width * image.height)
+
+    def configure(backend):
+        backend.conf, backend.iou, backend.max_det = args.conf, 0.45, 300
+
+    backend = ModelRegistry(configure=configure, backend=args.backend).load()
+    run(backend, split[:3], "off", args.size, None, None, args.image_size, args.merge)  # warm-up
+
+    settings = []
+    for mode in args.modes.split(","):
+        if mode == "off":
+            settings.append((mode, None, None))
+        else:
+            settings += [(mode, int(t), float(o)) for t in args.tiles.split(",") for o in args.overlaps.split(",")]
+
+    small_truths = [t[((t[:, 3] - t[:, 1]) * (t[:, 4] - t[:, 2])) < args.small * area] for t, area in zip(truths, areas)]
+    print(f"📊 {len(split)} validation images, {sum(len(t) for t in truths)} labelled boxes "
+          f"({sum(len(t) for t in small_truths)} small)\n")
+    print(f"{'mode':>8} | {'tile':>5} | {'overlap':>7} | {'tiles':>5} | {'recall':>6} | {'small':>6} | "
+          f"{'D00/D10':>7} | {'mAP@0.5':>7} | {'ms/image':>8}")
+    print("-" * 90)
+
+    results = []
+    for mode, tile, overlap in settings:
+        predictions, ms, tiles = run(backend, split, mode, args.size, tile, overlap, args.image_size, args.merge)
+        overall = recall(predictions, truths)
+        small = recall(predictions, small_truths)
+        thin = recall(predictions, truths, select=lambda t: np.isin(t[:, 0], THIN_CLASSES))
+        mean_ap, _ = evaluate(predictions, truths, max(len(backend.names or {}), 4))
+        print(f"{mode:>8} | {tile or '-':>5} | {overlap if overlap is not None else '-':>7} | {tiles:>5.1f} | "
+              f"{overall:>6.3f} | {small:>6.3f} | {thin:>7.3f} | {mean_ap:>7.3f} | {ms:>8.1f}")
+        results.append({"mode": mode, "tile": tile, "overlap": overlap, "tiles_per_image": round(tiles, 2),
+                        "recall": round(overall, 4), "recall_small": round(small, 4), "recall_thin": round(thin, 4),
+                        "map50": round(mean_ap, 4), "ms_per_image": round(ms, 2)})
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"image_size": args.image_size, "conf": args.conf, "results": results}, f, indent=2)
+        print(f"\n📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
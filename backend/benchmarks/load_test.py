@@ -0,0 +1,170 @@
+"""
+Load test for POST /detect.
+
+Drives the API with concurrent clients posting JPEG frames and reports
+requests/sec and p50/p95/p99 latency. Either targets a running server,
+or starts `serve.py` once per worker count and sweeps them.
+
+Usage:
+    # Against a server that is already running
+    python backend/benchmarks/load_test.py --url http://localhost:5000
+
+    # Start serve.py at 1, 2, 4 and 8 workers and compare (CPU-only box)
+    python backend/benchmarks/load_test.py --sweep 1,2,4,8 --duration 30 --concurrency 16
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic_jpeg(width=1280, height=720, seed=0):
+    """A noisy road-grey frame (noise keeps JPEG size realistic)."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.normal(110, 25, (height, width, 3)).clip(0, 255).astype("uint8")
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def run_load(url, image_bytes, concurrency, duration, save=False, warmup=3.0):
+    """Post frames from `concurrency` threads for `duration` seconds; return a summary dict."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def client():
+        session = requests.Session()
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                return
+            ok = False
+            try:
+                response = session.post(
+                    f"{url}/detect",
+                    files={"image": ("frame.jpg", image_bytes, "image/jpeg")},
+                    data={"latitude": "14.2833", "longitude": "120.9567", "save": str(save).lower()},
+                    timeout=60,
+                )
+                ok = response.status_code == 200
+            except requests.RequestException:
+                pass
+            done = time.perf_counter()
+            if sent < measure_from:
+                continue
+            with lock:
+                if ok:
+                    latencies.append((done - sent) * 1000)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / duration, 2),
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+    }
+
+
+def wait_until_ready(url, process, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if requests.get(f"{url}/", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server not ready after {timeout}s")
+
+
+def start_server(workers, port, threads):
+    cmd = [sys.executable, "serve.py", "--workers", str(workers), "--threads", str(threads),
+           "--host", "127.0.0.1", "--port", str(port)]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def print_row(label, result):
+    print(f"{label:>8} | {result['requests']:>8} | {result['rps']:>7.1f} | {result['p50_ms']:>8.1f} | "
+          f"{result['p95_ms']:>8.1f} | {result['p99_ms']:>8.1f} | {result['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test POST /detect")
+    parser.add_argument("--url", help="Target a running server instead of starting serve.py")
+    parser.add_argument("--sweep", default="1,2,4,8", help="Worker counts to start serve.py with")
+    parser.add_argument("--threads", type=int, default=8, help="Request threads per worker (sweep mode)")
+    parser.add_argument("--port", type=int, default=5055, help="Port for servers started in sweep mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per run")
+    parser.add_argument("--image", help="JPEG to post (default: synthetic 1280x720 frame)")
+    parser.add_argument("--save", action="store_true", help="Let the server save detections")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = synthetic_jpeg()
+
+    print(f"🚗 {args.concurrency} clients, {args.duration:g} s per run, {len(image_bytes) / 1024:.0f} KB frames\n")
+    print(f"{'workers':>8} | {'requests':>8} | {'req/s':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | errors")
+    print("-" * 72)
+
+    results = {}
+    if args.url:
+        results["external"] = run_load(args.url.rstrip("/"), image_bytes, args.concurrency, args.duration, args.save)
+        print_row("-", results["external"])
+    else:
+        for workers in (int(w) for w in args.sweep.split(",")):
+            process = start_server(workers, args.port, args.threads)
+            url = f"http://127.0.0.1:{args.port}"
+            try:
+                wait_until_ready(url, process)
+                results[workers] = run_load(url, image_bytes, args.concurrency, args.duration, args.save)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+            print_row(str(workers), results[workers])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({str(k): v for k, v in results.items()}, f, indent=2)
+        print(f"\n📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Synthetic data shared by the benchmarks: seeded SQLite databases of
+Detection rows spread over a city-sized area, and dashcam-like JPEGs.
+"""
+
+import datetime
+import io
+import os
+import random
+import sys
+import uuid
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import Detection  # noqa: E402
+from spatial import quadkey  # noqa: E402
+
+CODES = [("D00", "Longitudinal Crack"), ("D10", "Transverse Crack"), ("D20", "Alligator Crack"), ("D40", "Pothole")]
+
+# Roughly Metro Manila + Cavite: min_lon, min_lat, max_lon, max_lat
+CITY_BBOX = (120.90, 14.20, 121.15, 14.80)
+
+
+def detection_rows(count, first=0, seed=0, bbox=CITY_BBOX, start=datetime.datetime(2025, 1, 1), roads=400):
+    """
+    Yield `count` detection rows, two seconds apart, clustered along
+    `roads` random survey routes inside `bbox` (dense, like real surveys).
+    """
+    rng = random.Random(seed)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    routes = [
+        (rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon), rng.uniform(-1, 1), rng.uniform(-1, 1))
+        for _ in range(roads)
+    ]
+    rng = random.Random(seed * 1_000_003 + first)
+    for i in range(first, first + count):
+        lat0, lon0, dlat, dlon = routes[rng.randrange(roads)]
+        t = rng.random() * 0.05
+        lat = min(max(lat0 + dlat * t + rng.gauss(0, 0.0002), min_lat), max_lat)
+        lon = min(max(lon0 + dlon * t + rng.gauss(0, 0.0002), min_lon), max_lon)
+        code, name = CODES[rng.randrange(4)]
+        x, y = rng.uniform(0, 600), rng.uniform(0, 400)
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "timestamp": start + datetime.timedelta(seconds=i * 2),
+            "latitude": lat, "longitude": lon, "quadkey": quadkey(lat, lon),
+            "image_filename": f"{i:012x}.jpg", "damage_type": name, "damage_code": code,
+            "confidence": rng.uniform(0.4, 1.0),
+            "bbox_x1": x, "bbox_y1": y, "bbox_x2": x + 50, "bbox_y2": y + 50,
+        }
+
+
+def seed_detections(engine, rows, chunk=50000, seed=0, quiet=False, **kwargs):
+    """Insert `rows` synthetic detections in chunks of `chunk` rows."""
+    table = Detection.__table__
+    with engine.begin() as conn:
+        for first in range(0, rows, chunk):
+            batch = list(detection_rows(min(chunk, rows - first), first=first, seed=seed, **kwargs))
+            conn.execute(insert(table), batch)
+            if not quiet:
+                print(f"\r   seeded {first + len(batch):,}/{rows:,}", end="", flush=True)
+    if not quiet:
+        print()
+
+
+def road_jpeg(width=1280, height=720, seed=0, quality=85):
+    """Road-like texture (smooth gradients plus fine noise) that compresses like a photo."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(60, 200, (height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.BICUBIC)
+    pixels = np.asarray(image, dtype=np.int16) + rng.integers(-8, 8, (height, width, 1), dtype=np.int16)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
@@ -0,0 +1,584 @@
+"""
+Offline Bulk Survey Processor
+Runs detection over a folder of dashcam/phone images and video files
+recorded offline and writes the results to the same database as the API,
+without going through /detect.
+
+    python bulk_process.py /media/survey-2026-03 --fps 2 --workers 6
+
+- Frames are decoded by a pool of worker processes (reduced-size JPEG
+  decoding, videos sampled at --fps) and run through the model in batches.
+- GPS comes from, in order: a CSV with a filename column, the photo's
+  EXIF GPS, or a GPX/CSV track interpolated at the frame's time. A track
+  named like the file (clip01.mp4 + clip01.gpx) is used for that file;
+  other tracks in the folder are merged into one survey track.
+- --slice tiles|hybrid runs sliced inference (slicing.py) with the API's
+  SLICE_* settings, for small damage in high-resolution frames.
+- Detections are bulk-inserted (and merged into damage sites) like the
+  API's write-behind flush.
+- Finished images and video segments are appended to a JSON-lines
+  checkpoint after each database commit, so a killed job resumes where
+  it stopped. Row ids are deterministic, so frames committed just before
+  a crash are not inserted twice. Files that could not be read are
+  recorded as failed and tried again on the next run.
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from postprocess import postprocess
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".ts")
+ID_NAMESPACE = uuid.UUID("5b0a4a5e-2f4e-4d59-9a3b-6d1f3c0b7a11")
+EPOCH = datetime.datetime(1970, 1, 1)
+
+LAT_COLUMNS = ("latitude", "lat")
+LON_COLUMNS = ("longitude", "lon", "lng")
+TIME_COLUMNS = ("timestamp", "time", "datetime", "date_time")
+FILE_COLUMNS = ("filename", "file", "image", "name")
+
+
+# ============================================================
+# GPS SIDECARS
+# ============================================================
+
+def parse_time(value):
+    """ISO-8601 (GPX style, trailing Z allowed) or Unix seconds -> naive UTC datetime."""
+    value = value.strip()
+    try:
+        return datetime.datetime.utcfromtimestamp(float(value))
+    except ValueError:
+        pass
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class Track:
+    """Time-ordered GPS points; `locate(t)` interpolates between them."""
+
+    def __init__(self, points, max_gap_seconds=30.0):
+        points = sorted(points)
+        self.times = np.array([(p[0] - EPOCH).total_seconds() for p in points])
+        self.lats = np.array([p[1] for p in points])
+        self.lons = np.array([p[2] for p in points])
+        self.max_gap = max_gap_seconds
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def start(self):
+        return EPOCH + datetime.timedelta(seconds=float(self.times[0])) if len(self) else None
+
+    def locate(self, when):
+        """(lat, lon) at `when`, or (None, None) outside the track or inside a gap."""
+        if when is None or not len(self):
+            return None, None
+        t = (when - EPOCH).total_seconds()
+        i = int(np.searchsorted(self.times, t))
+        before = self.times[max(i - 1, 0)]
+        after = self.times[min(i, len(self) - 1)]
+        if min(abs(t - before), abs(after - t)) > self.max_gap:
+            return None, None
+        return float(np.interp(t, self.times, self.lats)), float(np.interp(t, self.times, self.lons))
+
+
+def read_gpx(path):
+    points = []
+    for _, element in ET.iterparse(path):
+        if element.tag.rsplit("}", 1)[-1] not in ("trkpt", "rtept", "wpt"):
+            continue
+        when = next((child.text for child in element if child.tag.rsplit("}", 1)[-1] == "time"), None)
+        if when:
+            points.append((parse_time(when), float(element.get("lat")), float(element.get("lon"))))
+        element.clear()
+    return points
+
+
+def read_csv(path):
+    """Returns (track points, {filename: (lat, lon)}) — a CSV holds one or the other."""
+    points, by_file = [], {}
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        fields = {name.lower().strip(): name for name in reader.fieldnames or []}
+
+        def column(options):
+            return next((fields[o] for o in options if o in fields), None)
+
+        lat, lon, when, name = column(LAT_COLUMNS), column(LON_COLUMNS), column(TIME_COLUMNS), column(FILE_COLUMNS)
+        if not lat or not lon:
+            return points, by_file
+        for row in reader:
+            try:
+                position = float(row[lat]), float(row[lon])
+            except (TypeError, ValueError):
+                continue
+            if name and row.get(name):
+                by_file[os.path.basename(row[name])] = position
+            elif when and row.get(when):
+                points.append((parse_time(row[when]), *position))
+    return points, by_file
+
+
+# ============================================================
+# DECODE WORKERS (run in child processes)
+# ============================================================
+
+def exif_metadata(image, time_offset_hours):
+    """(UTC capture time or None, (lat, lon) or None) from a photo's EXIF."""
+    exif = image.getexif()
+    taken = exif.get_ifd(0x8769).get(36867) or exif.get(306)  # DateTimeOriginal, DateTime
+    when = None
+    if taken:
+        try:
+            when = datetime.datetime.strptime(str(taken).strip(), "%Y:%m:%d %H:%M:%S")
+            when -= datetime.timedelta(hours=time_offset_hours)
+        except ValueError:
+            pass
+
+    gps = exif.get_ifd(0x8825)
+    position = None
+    if gps.get(2) and gps.get(4):
+        def degrees(dms, ref):
+            value = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+            return -value if ref in ("S", "W") else value
+        position = degrees(gps[2], gps.get(1, "N")), degrees(gps[4], gps.get(3, "E"))
+    return when, position
+
+
+def decode_images(items, size, max_pixels, time_offset_hours, source_size=None):
+    """
+    [(key, path)] -> ([(key, 0, Frame, capture time, EXIF position)],
+    [(key, error)] for files that could not be read).
+    `source_size`: see preprocess.prepare().
+    """
+    from PIL import Image
+
+    import preprocess
+
+    frames, failed = [], []
+    for key, path in items:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            frame = preprocess.prepare(data, size, max_pixels, source_size)
+            frame.array = frame.array.copy()  # the letterbox buffer is reused per thread
+            with Image.open(path) as image:
+                when, position = exif_metadata(image, time_offset_hours)
+            if when is None:
+                when = datetime.datetime.utcfromtimestamp(os.path.getmtime(path))
+            frames.append((key, 0, frame, when, position))
+        except Exception as e:
+            failed.append((key, f"{type(e).__name__}: {e}"))
+    return frames, failed
+
+
+def decode_video(key, path, start_s, end_s, fps, size, source_size=None):
+    """
+    Sample `fps` frames per second from [start_s, end_s) ->
+    ([(key, index, Frame, offset seconds, None)], [(key, error)] if the file could not be read).
+    """
+    try:
+        return _decode_video(key, path, start_s, end_s, fps, size, source_size), []
+    except Exception as e:
+        return [], [(key, f"{type(e).__name__}: {e}")]
+
+
+def _decode_video(key, path, start_s, end_s, fps, size, source_size):
+    import cv2
+    from PIL import Image
+
+    import preprocess
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise OSError("cannot open video")
+    native_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, round(native_fps / fps))
+    capture.set(cv2.CAP_PROP_POS_FRAMES, round(start_s * native_fps))
+    position = round(start_s * native_fps)
+    end = round(end_s * native_fps)
+
+    frames, index = [], 0
+    while position < end:
+        if not capture.grab():  # grab() skips the colour conversion of frames we drop
+            break
+        if position % step == 0:
+            ok, bgr = capture.retrieve()
+            if ok:
+                image = Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+                if source_size is None:
+                    image.thumbnail((size, size), Image.BILINEAR)
+                elif source_size:
+                    image.thumbnail((source_size, source_size), Image.BILINEAR)
+                frame = preprocess.to_frame(image, image.width, image.height, size, keep_source=source_size is not None)
+                frame.array = frame.array.copy()
+                frames.append((key, index, frame, position / native_fps, None))
+                index += 1
+        position += 1
+    capture.release()
+    return frames
+
+
+# ============================================================
+# PLANNING AND CHECKPOINTS
+# ============================================================
+
+class Source:
+    """One checkpointed unit of work: an image, or a segment of a video."""
+
+    __slots__ = ("key", "path", "kind", "start", "end", "video_start", "track")
+
+    def __init__(self, key, path, kind, start=0.0, end=0.0, video_start=None, track=None):
+        self.key, self.path, self.kind = key, path, kind
+        self.start, self.end, self.video_start, self.track = start, end, video_start, track
+
+
+def plan(root, segment_seconds, max_gap_seconds):
+    """Walk `root`; returns (sources, survey track, {filename: (lat, lon)})."""
+    media, tracks = [], {}
+    survey_points, by_file = [], {}
+    for directory, _, names in os.walk(root):
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            stem, ext = os.path.splitext(path)
+            ext = ext.lower()
+            if ext in IMAGE_EXTENSIONS or ext in VIDEO_EXTENSIONS:
+                media.append(path)
+            elif ext == ".gpx":
+                tracks[stem] = read_gpx(path)
+            elif ext == ".csv":
+                points, files = read_csv(path)
+                by_file.update(files)
+                if points:
+                    tracks[stem] = points
+
+    media_stems = {os.path.splitext(p)[0] for p in media}
+    for stem, points in tracks.items():
+        if stem not in media_stems:
+            survey_points.extend(points)
+    survey = Track(survey_points, max_gap_seconds)
+
+    sources = []
+    for path in media:
+        key = os.path.relpath(path, root)
+        stem = os.path.splitext(path)[0]
+        track = Track(tracks[stem], max_gap_seconds) if stem in tracks else survey
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            sources.append(Source(key, path, "image", track=track))
+            continue
+        import cv2
+
+        capture = cv2.VideoCapture(path)
+        native_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / native_fps
+        capture.release()
+        # A clip's own track starts when recording starts; otherwise assume the
+        # file was last written when recording stopped
+        if stem in tracks and len(track):
+            video_start = track.start
+        else:
+            video_start = datetime.datetime.utcfromtimestamp(os.path.getmtime(path) - duration)
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + segment_seconds)
+            sources.append(Source(f"{key}@{start:.0f}", path, "video", start, end, video_start, track))
+            start = end
+    return sources, survey, by_file
+
+
+def load_checkpoint(path):
+    """Keys of finished sources (failed ones are not: they are tried again)."""
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line) if line.strip() else {}
+                if "done" in record:
+                    done.add(record["done"])
+    return done
+
+
+# ============================================================
+# MAIN LOOP
+# ============================================================
+
+class BulkProcessor:
+    """Consumes decoded frames, runs batched inference and commits detections."""
+
+    def __init__(self, server, sources, by_file, checkpoint_path, batch_size, save_images, slice_mode="off"):
+        self.server = server
+        self.slice_mode = slice_mode
+        self.backend = server.registry.load()
+        self.labels = server.get_labels()
+        self.sources = {s.key: s for s in sources}
+        self.by_file = by_file
+        self.batch_size = batch_size
+        self.save_images = save_images
+        self.checkpoint = open(checkpoint_path, "a")
+
+        self.buffer = []
+        self.remaining = {}
+        self.frames = 0
+        self.detections = 0
+        self.completed = 0
+        self.failed = {}  # key -> error
+        self.inference_seconds = 0.0
+        self.db_seconds = 0.0
+
+    def add(self, key, frames):
+        """Frames decoded for one source (possibly none)."""
+        self.remaining[key] = len(frames)
+        if not frames:
+            self._finish([key])
+        self.buffer.extend(frames)
+        while len(self.buffer) >= self.batch_size:
+            batch, self.buffer = self.buffer[:self.batch_size], self.buffer[self.batch_size:]
+            self._process(batch)
+
+    def fail(self, key, error):
+        """A source that could not be decoded: logged, not marked done, so a resumed run retries it."""
+        self.failed[key] = error
+        print(f"\n⚠️  Failed {key}: {error}", file=sys.stderr)
+        self.checkpoint.write(json.dumps({"failed": key, "error": error}) + "\n")
+        self.checkpoint.flush()
+
+    def drain(self):
+        if self.buffer:
+            batch, self.buffer = self.buffer, []
+            self._process(batch)
+
+    def _locate(self, source, when, exif_position):
+        by_name = self.by_file.get(os.path.basename(source.path))
+        if by_name:
+            return by_name
+        if exif_position:
+            return exif_position
+        return source.track.locate(when)
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        frames = [frame for _, _, frame, _, _ in batch]
+        if self.slice_mode == "tiles":
+            predictions = [None] * len(frames)
+        else:
+            predictions = [frame.restore(pred) for frame, pred in
+                           zip(frames, self.backend.predict([frame.array for frame in frames]))]
+        if self.slice_mode != "off":
+            predictions = [self._sliced(frame, full) for frame, full in zip(frames, predictions)]
+        self.inference_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        rows = []
+        for (key, index, frame, when, exif_position), pred in zip(batch, predictions):
+            source = self.sources[key]
+            if source.kind == "video":
+                when = source.video_start + datetime.timedelta(seconds=when)
+            if not len(pred):
+                continue
+            frame_id = uuid.uuid5(ID_NAMESPACE, f"{key}#{index}")
+            filename = self._save_image(source, frame) if self.save_images else f"{frame_id.hex[:12]}.jpg"
+            latitude, longitude = self._locate(source, when, exif_position)
+            _, frame_rows = postprocess(
+                pred, self.labels, timestamp=when, latitude=latitude, longitude=longitude, image_filename=filename,
+            )
+            for i, row in enumerate(frame_rows):
+                row["id"] = str(uuid.uuid5(frame_id, str(i)))
+            rows.extend(frame_rows)
+
+        rows = self._drop_existing(rows)
+        if rows:
+            self.server.insert_detections(rows)
+        self.db_seconds += time.perf_counter() - started
+
+        self.frames += len(batch)
+        self.detections += len(rows)
+        finished = []
+        for key, *_ in batch:
+            self.remaining[key] -= 1
+            if self.remaining[key] == 0:
+                finished.append(key)
+        self._finish(finished)
+
+    def _drop_existing(self, rows):
+        """Rows committed before a crash but not checkpointed (deterministic ids)."""
+        if not rows:
+            return rows
+        Detection = self.server.Detection
+        with self.server.app.app_context():
+            existing = {
+                row_id for (row_id,) in self.server.db.session.query(Detection.id)
+                .filter(Detection.id.in_([r["id"] for r in rows]))
+            }
+        return [r for r in rows if r["id"] not in existing]
+
+    def _sliced(self, frame, full):
+        """Tiles of one frame as one batch, merged with the whole-frame boxes (hybrid)."""
+        import slicing
+
+        server = self.server
+        return slicing.sliced_predict(frame.source, self.backend.predict, server.SLICE_TILE, server.SLICE_OVERLAP,
+                                      (frame.scale_x, frame.scale_y), full, server.SLICE_MERGE, self.backend.max_det)
+
+    def _save_image(self, source, frame):
+        """Store the frame in the API's image store; returns its (content-hash) filename."""
+        from persistence import encode_for_storage
+
+        if source.kind == "image":
+            with open(source.path, "rb") as f:
+                data = encode_for_storage(f.read())
+        else:
+            from PIL import Image
+            import io
+
+            if frame.source is not None:
+                pixels = frame.source  # sliced: boxes are in source pixels
+            else:
+                w, h = round(frame.width * frame.ratio), round(frame.height * frame.ratio)
+                pixels = frame.array[frame.pad_y:frame.pad_y + h, frame.pad_x:frame.pad_x + w]
+            buffer = io.BytesIO()
+            Image.fromarray(pixels).save(buffer, "JPEG", quality=85)
+            data = buffer.getvalue()
+        filename, is_new = self.server.upload_store.claim(data)
+        if is_new:
+            self.server.upload_store.write(filename, data)
+        return filename
+
+    def _finish(self, keys):
+        for key in keys:
+            self.checkpoint.write(json.dumps({"done": key}) + "\n")
+            self.completed += 1
+        if keys:
+            self.checkpoint.flush()
+            os.fsync(self.checkpoint.fileno())
+
+
+def progress_line(processor, total, started, done_before):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    completed = processor.completed
+    failed = len(processor.failed)
+    rate = (completed + failed) / elapsed
+    eta = (total - completed - failed) / rate if rate else 0
+    return (f"\r   {done_before + completed:,}/{done_before + total:,} sources"
+            f"{f' ({failed:,} failed)' if failed else ''} · {processor.frames:,} frames "
+            f"({processor.frames / elapsed:.1f}/s) · {processor.detections:,} detections · "
+            f"ETA {datetime.timedelta(seconds=int(eta))}   ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run detection over a folder of survey images and videos")
+    parser.add_argument("input", help="Folder with images/videos and GPX/CSV sidecars")
+    parser.add_argument("--fps", type=float, default=1.0, help="Video frames sampled per second")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="Decode processes")
+    parser.add_argument("--batch-size", type=int, default=16, help="Frames per forward pass")
+    parser.add_argument("--images-per-task", type=int, default=16, help="Images decoded per worker task")
+    parser.add_argument("--segment-seconds", type=float, default=60.0, help="Video split size (checkpoint unit)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <input>/.bulk_checkpoint.jsonl)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--no-images", action="store_true", help="Do not copy frames with detections to uploads/")
+    parser.add_argument("--time-offset-hours", type=float, default=0.0,
+                        help="UTC offset of the camera clock (EXIF times are local)")
+    parser.add_argument("--slice", choices=("off", "tiles", "hybrid"), default="off",
+                        help="Sliced inference for small damage (tile settings: SLICE_* variables)")
+    parser.add_argument("--max-gap-seconds", type=float, default=30.0,
+                        help="Max distance in time to the nearest GPS track point")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.input)
+    checkpoint_path = args.checkpoint or os.path.join(root, ".bulk_checkpoint.jsonl")
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    done = load_checkpoint(checkpoint_path)
+
+    print(f"📂 Scanning {root}")
+    sources, survey, by_file = plan(root, args.segment_seconds, args.max_gap_seconds)
+    todo = [s for s in sources if s.key not in done]
+    print(f"   {len(sources):,} sources ({len(done):,} already done), survey track: {len(survey):,} points, "
+          f"{len(by_file):,} geotagged filenames")
+    if not todo:
+        print("✅ Nothing to do")
+        return
+
+    # Importing the API server loads the model; the spawned decode workers
+    # import only this module, PIL, OpenCV and preprocess.py
+    import app as server
+
+    pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    with server.app.app_context():
+        server.init_db(server.db.engine)
+    size = server.MODEL_INPUT_SIZE
+    max_pixels = int(server.MAX_IMAGE_MP * 1e6)
+    source_size = server.SLICE_IMAGE_SIZE if args.slice != "off" else None
+    processor = BulkProcessor(server, todo, by_file, checkpoint_path, args.batch_size, not args.no_images, args.slice)
+    print(f"🧠 Model ready ({server.registry.status()['loader']}), {args.workers} decode workers\n")
+
+    def tasks():
+        images = [s for s in todo if s.kind == "image"]
+        for i in range(0, len(images), args.images_per_task):
+            chunk = images[i:i + args.images_per_task]
+            yield [s.key for s in chunk], pool.submit(
+                decode_images, [(s.key, s.path) for s in chunk], size, max_pixels, args.time_offset_hours, source_size)
+        for s in todo:
+            if s.kind == "video":
+                yield [s.key], pool.submit(decode_video, s.key, s.path, s.start, s.end, args.fps, size, source_size)
+
+    started = time.perf_counter()
+    last_report = 0.0
+    in_flight, submitted = {}, tasks()
+    max_in_flight = args.workers * 2  # bounds decoded frames held in memory
+    try:
+        while True:
+            for keys, future in submitted:
+                in_flight[future] = keys
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                keys = in_flight.pop(future)
+                try:
+                    frames, failed = future.result()
+                except Exception as e:  # the decode worker itself died (e.g. out of memory)
+                    frames, failed = [], [(key, f"{type(e).__name__}: {e}") for key in keys]
+                failed = dict(failed)
+                for key in keys:
+                    if key in failed:
+                        processor.fail(key, failed[key])
+                    else:
+                        processor.add(key, [f for f in frames if f[0] == key])
+            if time.perf_counter() - last_report > 2:
+                last_report = time.perf_counter()
+                print(progress_line(processor, len(todo), started, len(done)), end="", flush=True)
+        processor.drain()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    print(progress_line(processor, len(todo), started, len(done)))
+    print(f"\n✅ {processor.frames:,} frames in {elapsed:.1f}s ({processor.frames / elapsed:.1f} frames/s), "
+          f"{processor.detections:,} detections saved")
+    print(f"   inference {processor.inference_seconds:.1f}s · database {processor.db_seconds:.1f}s")
+    if processor.failed:
+        print(f"⚠️  {len(processor.failed):,} sources failed and were not marked done; re-run to retry them:")
+        for key, error in list(processor.failed.items())[:10]:
+            print(f"   {key}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Database Models
+SQLAlchemy models shared by the API server, CLI tools and benchmarks.
+Importing this module does not load the detection model.
+"""
+
+import uuid
+import datetime
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+from spatial import quadkey_default, backfill_quadkeys
+import rollups
+
+db = SQLAlchemy()
+
+
+class Detection(db.Model):
+    """Stores each detection record with location and damage info."""
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    image_filename = db.Column(db.String(255), nullable=True)
+    damage_type = db.Column(db.String(50), nullable=False)
+    damage_code = db.Column(db.String(10), nullable=False, index=True)
+    confidence = db.Column(db.Float, nullable=False)
+    bbox_x1 = db.Column(db.Float, nullable=False)
+    bbox_y1 = db.Column(db.Float, nullable=False)
+    bbox_x2 = db.Column(db.Float, nullable=False)
+    bbox_y2 = db.Column(db.Float, nullable=False)
+    notes = db.Column(db.Text, nullable=True)
+    # Zoom-24 Web-Mercator tile of (latitude, longitude), see spatial.py
+    quadkey = db.Column(db.BigInteger, nullable=True, default=quadkey_default)
+    # DamageSite this box was merged into (None without GPS), see sites.py
+    site_id = db.Column(db.String(36), nullable=True, index=True)
+
+    __table_args__ = (
+        # Keyset pagination walks this index backwards: ORDER BY timestamp DESC, id DESC
+        db.Index("ix_detection_timestamp_id", "timestamp", "id"),
+        db.Index("ix_detection_lat_lon", "latitude", "longitude"),
+        # Covers the map clustering query, so it never touches the table
+        db.Index("ix_detection_quadkey", "quadkey", "damage_code", "latitude", "longitude", "confidence"),
+        # Is an image still referenced? (deleting a detection, upload retention)
+        db.Index("ix_detection_image_filename", "image_filename"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "timestamp": self.timestamp.isoformat(),
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "image_filename": self.image_filename,
+            "damage_type": self.damage_type,
+            "damage_code": self.damage_code,
+            "confidence": round(self.confidence, 4),
+            "bbox": {
+                "x1": round(self.bbox_x1, 2),
+                "y1": round(self.bbox_y1, 2),
+                "x2": round(self.bbox_x2, 2),
+                "y2": round(self.bbox_y2, 2),
+            },
+            "notes": self.notes,
+            "site_id": self.site_id,
+        }
+
+
+class DamageSite(db.Model):
+    """One physical damage site: nearby detections of the same code merged over time (see sites.py)."""
+    __tablename__ = "damage_site"
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    damage_code = db.Column(db.String(10), nullable=False)
+    damage_type = db.Column(db.String(50), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)  # mean of the observations
+    longitude = db.Column(db.Float, nullable=False)
+    quadkey = db.Column(db.BigInteger, nullable=True, default=quadkey_default)
+    first_seen = db.Column(db.DateTime, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    observations = db.Column(db.Integer, nullable=False, default=1)
+    confidence = db.Column(db.Float, nullable=False)  # running mean over observations
+    max_confidence = db.Column(db.Float, nullable=False)
+    best_image_filename = db.Column(db.String(255), nullable=True)  # image of the max-confidence box
+
+    __table_args__ = (
+        # Neighbour lookup when merging: quadkey range + code + time window
+        db.Index("ix_damage_site_quadkey", "quadkey", "damage_code", "last_seen"),
+        db.Index("ix_damage_site_last_seen_id", "last_seen", "id"),
+        db.Index("ix_damage_site_best_image_filename", "best_image_filename"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "damage_code": self.damage_code,
+            "damage_type": self.damage_type,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "first_seen": self.first_seen.isoformat(),
+            "last_seen": self.last_seen.isoformat(),
+            "timestamp": self.last_seen.isoformat(),
+            "observations": self.observations,
+            "confidence": round(self.confidence, 4),
+            "max_confidence": round(self.max_confidence, 4),
+            "image_filename": self.best_image_filename,
+        }
+
+
+class DetectionRollup(db.Model):
+    """Per day x damage code x map cell counters, maintained by triggers (see rollups.py)."""
+    __tablename__ = "detection_rollup"
+    day = db.Column(db.String(10), primary_key=True)  # "YYYY-MM-DD" (UTC)
+    damage_code = db.Column(db.String(10), primary_key=True)
+    cell = db.Column(db.BigInteger, primary_key=True)  # quadkey >> 16, -1 without GPS
+    count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class DetectionTotal(db.Model):
+    """Per damage code counters, maintained by triggers (see rollups.py)."""
+    __tablename__ = "detection_totals"
+    damage_code = db.Column(db.String(10), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+
+def add_missing_columns(engine):
+    """ALTER TABLE ... ADD COLUMN for model columns an existing database lacks."""
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                    added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def init_db(engine):
+    """
+    Create missing tables, columns, indexes and rollup triggers.
+    `create_all` skips tables that already exist, so columns and indexes
+    added after a database was created are created here explicitly.
+    """
+    db.metadata.create_all(engine)
+    added = add_missing_columns(engine)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        if "detection.quadkey" in added:
+            backfill_quadkeys(conn, Detection.__table__)
+        rollups.install(conn)
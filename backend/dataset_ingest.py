@@ -0,0 +1,352 @@
+"""
+Dataset Ingestion
+Brings RDD2022 images and YOLO labels from a download (a directory, or a
+.zip read in place) into backend/data/{images,labels}/{train,val}.
+
+- Incremental: data/manifest.json records every file brought in (source
+  size, mtime and content hash). A rerun only stats the sources and
+  transfers files that are new or changed; files whose source is gone
+  are removed.
+- Files are copied, hardlinked or symlinked on a thread pool. Zip
+  members are always extracted, streamed straight to their destination
+  without unzipping to a temp directory first.
+- Deterministic split: an image (and its label) goes to val when the hash
+  of its name falls under --val, so the split is stable across reruns
+  and does not shuffle when images are added.
+
+Images are paired with labels by file name wherever they sit in the
+source; images without a label file are skipped unless --keep-unlabeled
+(they then train as background).
+
+Usage:
+    python backend/dataset_ingest.py ~/Downloads/RDD2022 --mode hardlink
+    python backend/dataset_ingest.py rdd-2022.zip --val 0.1 --workers 16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+MANIFEST_NAME = "manifest.json"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+MODES = ("copy", "hardlink", "symlink")
+SPLITS = ("train", "val")
+CHUNK_BYTES = 1 << 20
+
+
+# ============================================================
+# SOURCES
+# ============================================================
+
+def scan_directory(root):
+    """Yield (file name, entry) for every file under `root`, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            st = os.stat(path)
+            yield name, {"source": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def scan_zip(path):
+    """Yield (file name, entry) for every member of a zip; its CRC stands in for the mtime."""
+    path = os.path.abspath(path)
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename.rsplit("/", 1)[-1], \
+                    {"source": info.filename, "archive": path, "size": info.file_size, "crc": info.CRC}
+
+
+def scan(sources):
+    for source in sources:
+        if os.path.isdir(source):
+            yield from scan_directory(source)
+        elif zipfile.is_zipfile(source):
+            yield from scan_zip(source)
+        else:
+            raise ValueError(f"{source} is neither a directory nor a zip archive")
+
+
+def split_for(stem, val_fraction):
+    """'val' for a stable `val_fraction` share of image names, else 'train'."""
+    digest = hashlib.blake2b(stem.encode(), digest_size=8).digest()
+    return "val" if int.from_bytes(digest, "big") / 2 ** 64 < val_fraction else "train"
+
+
+def plan(files, val_fraction=0.1, keep_unlabeled=False):
+    """
+    Pair images with labels and place them in a split. Returns
+    ({destination relative to the data dir: entry}, counts).
+    """
+    images, labels, counts = {}, {}, Counter()
+    for name, entry in files:
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        target = images if ext in IMAGE_EXTENSIONS else labels if ext == ".txt" else None
+        if target is None:
+            continue
+        if stem in target:
+            counts["duplicates"] += 1  # same name in two places: the first one wins
+            continue
+        target[stem] = (name, entry)
+
+    targets = {}
+    for stem, (name, image) in images.items():
+        label = labels.get(stem)
+        if label is None and not keep_unlabeled:
+            counts["unlabeled"] += 1
+            continue
+        split = split_for(stem, val_fraction)
+        counts[split] += 1
+        targets[f"images/{split}/{name}"] = image
+        if label:
+            targets[f"labels/{split}/{stem}.txt"] = label[1]
+    return targets, counts
+
+
+# ============================================================
+# MANIFEST
+# ============================================================
+
+def load_manifest(data_dir):
+    try:
+        with open(os.path.join(data_dir, MANIFEST_NAME)) as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(data_dir, files, **info):
+    path = os.path.join(data_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"version": 1, **info, "files": dict(sorted(files.items()))}, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+
+def _signature(entry):
+    return entry.get("archive"), entry["source"], entry["size"], entry.get("mtime_ns"), entry.get("crc")
+
+
+def _reusable(record, mode):
+    """Copies and hardlinks serve any mode; a symlink is replaced when real files are asked for."""
+    return record.get("mode") != "symlink" or mode == "symlink"
+
+
+# ============================================================
+# TRANSFER
+# ============================================================
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stream(src, dest):
+    """Copy a file object to `dest` (atomically, via .part) while hashing it."""
+    digest = hashlib.sha256()
+    with open(dest + ".part", "wb") as out:
+        while chunk := src.read(CHUNK_BYTES):
+            digest.update(chunk)
+            out.write(chunk)
+    os.replace(dest + ".part", dest)
+    return digest.hexdigest()
+
+
+class _Archives(threading.local):
+    """One open ZipFile per thread and archive (a shared handle serializes reads)."""
+
+    def __init__(self, opened):
+        self.handles = {}
+        self.opened = opened
+
+    def open(self, path, member):
+        if path not in self.handles:
+            self.handles[path] = zipfile.ZipFile(path)
+            self.opened.append(self.handles[path])
+        return self.handles[path].open(member)
+
+
+class Ingester:
+    def __init__(self, data_dir=DATA_DIR, mode="copy", workers=8):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.data_dir = data_dir
+        self.mode = mode
+        self.workers = max(1, workers)
+        self._opened = []
+        self._archives = _Archives(self._opened)
+        self._link_fallback = False
+
+    def sync(self, key, entry, record):
+        """Bring one file up to date; returns (action, manifest record)."""
+        dest = os.path.join(self.data_dir, key)
+        archive = entry.get("archive")
+        # Touched but unchanged (same content hash): keep the file that is there
+        if record and not archive and _reusable(record, self.mode) and os.path.lexists(dest):
+            digest = file_digest(entry["source"])
+            if digest == record.get("hash"):
+                return "verified", {**entry, "hash": digest, "mode": record["mode"]}
+
+        if archive:
+            with self._archives.open(archive, entry["source"]) as src:
+                digest = _stream(src, dest)
+            mode = "copy"
+        else:
+            digest, mode = self._place(entry["source"], dest)
+        return ("updated" if record else "new"), {**entry, "hash": digest, "mode": mode}
+
+    def _place(self, source, dest):
+        if self.mode == "copy" or self._link_fallback:
+            with open(source, "rb") as src:
+                digest = _stream(src, dest)
+            shutil.copystat(source, dest)
+            return digest, "copy"
+        digest = file_digest(source)
+        if os.path.lexists(dest + ".part"):
+            os.remove(dest + ".part")
+        try:
+            if self.mode == "hardlink":
+                os.link(source, dest + ".part")
+            else:
+                os.symlink(source, dest + ".part")
+        except OSError:
+            # Hardlinks cannot cross filesystems (nor symlinks be made everywhere)
+            self._link_fallback = True
+            return self._place(source, dest)
+        os.replace(dest + ".part", dest)
+        return digest, self.mode
+
+    def close(self):
+        for handle in self._opened:
+            handle.close()
+        self._opened.clear()
+
+
+def untracked(data_dir, files):
+    """Files in the split directories that the manifest does not know about."""
+    found = []
+    for kind in ("images", "labels"):
+        for split in SPLITS:
+            folder = os.path.join(data_dir, kind, split)
+            if os.path.isdir(folder):
+                found += [f"{kind}/{split}/{name}" for name in os.listdir(folder) if f"{kind}/{split}/{name}" not in files]
+    return found
+
+
+def ingest(sources, data_dir=DATA_DIR, mode="copy", val_fraction=0.1, workers=8, keep_unlabeled=False,
+           clean=False, verbose=True):
+    """
+    Sync `sources` (directories and/or zip files) into `data_dir`.
+    Returns counts and timings.
+    """
+    started = time.perf_counter()
+    targets, counts = plan(scan(sources), val_fraction, keep_unlabeled)
+    old = load_manifest(data_dir)
+    scanned = time.perf_counter()
+
+    for kind in ("images", "labels"):
+        for split in SPLITS:
+            os.makedirs(os.path.join(data_dir, kind, split), exist_ok=True)
+
+    files, todo = {}, []
+    for key, entry in targets.items():
+        record = old.get(key)
+        if record and _signature(record) == _signature(entry) and _reusable(record, mode) and \
+                os.path.lexists(os.path.join(data_dir, key)):
+            files[key] = record
+            counts["unchanged"] += 1
+        else:
+            todo.append((key, entry, record))
+
+    # Sources that disappeared or moved to the other split
+    for key in old.keys() - targets.keys():
+        path = os.path.join(data_dir, key)
+        if os.path.lexists(path):
+            os.remove(path)
+        counts["removed"] += 1
+
+    ingester = Ingester(data_dir, mode, workers)
+    transferred = 0
+    try:
+        with ThreadPoolExecutor(ingester.workers, thread_name_prefix="ingest") as pool:
+            futures = {pool.submit(ingester.sync, *item): item for item in todo}
+            try:
+                for i, future in enumerate(as_completed(futures), 1):
+                    key, entry, _ = futures[future]
+                    action, files[key] = future.result()
+                    counts[action] += 1
+                    if action != "verified":
+                        transferred += entry["size"]
+                    if verbose and i % 5000 == 0:
+                        print(f"   {i:,}/{len(todo):,} files")
+            except BaseException:
+                pool.shutdown(cancel_futures=True)
+                raise
+    finally:
+        # Whatever finished is recorded, so an interrupted run resumes
+        save_manifest(data_dir, files, val_fraction=val_fraction)
+        ingester.close()
+
+    stray = untracked(data_dir, files)
+    if stray and clean:
+        for key in stray:
+            os.remove(os.path.join(data_dir, key))
+        counts["cleaned"] = len(stray)
+    elif stray and verbose:
+        print(f"⚠️  {len(stray):,} files in {data_dir} were not ingested (e.g. an earlier copy into train); "
+              "rerun with --clean to remove them")
+
+    finished = time.perf_counter()
+    if ingester._link_fallback and verbose:
+        print(f"⚠️  Could not {mode} (different filesystem?); copied instead")
+    return {
+        **counts,
+        "files": len(targets),
+        "transferred_mb": round(transferred / 1e6, 1),
+        "scan_seconds": round(scanned - started, 3),
+        "transfer_seconds": round(finished - scanned, 3),
+        "seconds": round(finished - started, 3),
+    }
+
+
+def report(stats):
+    print(f"✅ {stats['files']:,} files ({stats.get('train', 0):,} train / {stats.get('val', 0):,} val images) "
+          f"in {stats['seconds']:.2f}s (scan {stats['scan_seconds']:.2f}s, transfer {stats['transfer_seconds']:.2f}s)")
+    print(f"   new {stats.get('new', 0):,}, updated {stats.get('updated', 0):,}, "
+          f"unchanged {stats.get('unchanged', 0) + stats.get('verified', 0):,}, removed {stats.get('removed', 0):,}, "
+          f"{stats['transferred_mb']:,.1f} MB transferred")
+    if stats.get("unlabeled") or stats.get("duplicates"):
+        print(f"   skipped {stats.get('unlabeled', 0):,} unlabeled images, "
+              f"{stats.get('duplicates', 0):,} duplicate file names")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest RDD2022 images and labels into backend/data")
+    parser.add_argument("sources", nargs="+", help="Dataset directories and/or zip archives")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--mode", choices=MODES, default="copy",
+                        help="How directory sources are brought in (zip members are always extracted)")
+    parser.add_argument("--val", type=float, default=0.1, help="Share of images in the val split")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 4) * 2))
+    parser.add_argument("--keep-unlabeled", action="store_true", help="Also ingest images without a label file")
+    parser.add_argument("--clean", action="store_true", help="Remove files in the splits that were not ingested")
+    args = parser.parse_args()
+
+    report(ingest(args.sources, args.data_dir, args.mode, args.val, args.workers, args.keep_unlabeled, args.clean))
+
+
+if __name__ == "__main__":
+    main()
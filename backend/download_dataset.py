@@ -11,17 +11,24 @@ Recommended method (all platforms, requires Kaggle account):
 For Google Colab (simplest):
     !pip install kagglehub
     !python backend/download_dataset.py --kagglehub
+
+Files are brought into backend/data by dataset_ingest.py: incrementally
+(a rerun only transfers new or changed files), on a thread pool, with a
+deterministic train/val split. An already downloaded copy (directory or
+zip) can be ingested with --source; --mode hardlink avoids a second copy
+of ~47k images when the download sits on the same disk.
 """
 
 import os
 import requests
 import zipfile
-import shutil
 import yaml
 import argparse
 import sys
 from pathlib import Path
 
+import dataset_ingest
+
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
@@ -77,9 +84,11 @@ def download_from_kaggle_cli(dataset_name="chitholian/road-damage-detection-rdd2
         download_path = os.path.join(BASE_DIR, "temp_kaggle")
         os.makedirs(download_path, exist_ok=True)
         
+        # Kept zipped: the archive is ingested in place, and a rerun
+        # skips the download when the zip is up to date
         subprocess.run([
-            "kaggle", "datasets", "download", "-d", dataset_name, 
-            "-p", download_path, "--unzip"
+            "kaggle", "datasets", "download", "-d", dataset_name,
+            "-p", download_path,
         ], check=True)
         
         print("✅ Kaggle download completed!")
@@ -89,7 +98,7 @@ def download_from_kaggle_cli(dataset_name="chitholian/road-damage-detection-rdd2
         return None
 
 
-def download_from_kagglehub():
+def download_from_kagglehub(**ingest_options):
     """
     Download dataset using kagglehub (simplest method).
     Requires: pip install kagglehub
@@ -103,28 +112,15 @@ def download_from_kagglehub():
         dataset_path = kagglehub.dataset_download("aliabdelmenam/rdd-2022")
         print(f"✅ Dataset downloaded to: {dataset_path}")
         
-        # Organize into backend/data structure
-        for folder in ["images", "labels"]:
-            src = os.path.join(dataset_path, folder)
-            dst = os.path.join(DATA_DIR, folder, "train")
-            
-            if os.path.exists(src):
-                os.makedirs(os.path.dirname(dst), exist_ok=True)
-                # Copy files
-                for item in os.listdir(src):
-                    src_file = os.path.join(src, item)
-                    dst_file = os.path.join(dst, item)
-                    if os.path.isfile(src_file):
-                        os.makedirs(os.path.dirname(dst_file), exist_ok=True)
-                        shutil.copy2(src_file, dst_file)
-                print(f"✅ Organized {folder} to {dst}")
-        
-        return DATA_DIR
     except Exception as e:
         print(f"❌ kagglehub download failed: {e}")
         print("   Install with: pip install kagglehub")
         return None
 
+    # Organize into backend/data structure (kagglehub keeps its own cached copy)
+    extract_and_organize(dataset_path, **ingest_options)
+    return DATA_DIR
+
 
 def download_sample_dataset():
     """
@@ -167,36 +163,18 @@ def download_from_google_drive(drive_id, output_path):
         return None
 
 
-def extract_and_organize(dataset_path):
-    """Extract and organize downloaded dataset into YOLO format."""
+def extract_and_organize(dataset_path, mode="copy", val_fraction=0.1, workers=8, clean=False):
+    """Ingest a downloaded dataset (directory, zip, or a directory of zips) into YOLO format."""
     print(f"📦 Organizing dataset from {dataset_path}")
-    
-    # Implementation depends on the actual structure of the downloaded dataset
-    # This is a template - adjust based on your dataset structure
-    
-    if os.path.exists(os.path.join(dataset_path, "images")):
-        src_images = os.path.join(dataset_path, "images")
-        dst_images = os.path.join(DATA_DIR, "images", "train")
-        
-        if os.path.exists(src_images):
-            for img in os.listdir(src_images):
-                src_file = os.path.join(src_images, img)
-                dst_file = os.path.join(dst_images, img)
-                if os.path.isfile(src_file):
-                    shutil.copy2(src_file, dst_file)
-            print(f"✅ Images copied to {dst_images}")
-    
-    if os.path.exists(os.path.join(dataset_path, "labels")):
-        src_labels = os.path.join(dataset_path, "labels")
-        dst_labels = os.path.join(DATA_DIR, "labels", "train")
-        
-        if os.path.exists(src_labels):
-            for label in os.listdir(src_labels):
-                src_file = os.path.join(src_labels, label)
-                dst_file = os.path.join(dst_labels, label)
-                if os.path.isfile(src_file):
-                    shutil.copy2(src_file, dst_file)
-            print(f"✅ Labels copied to {dst_labels}")
+    sources = [dataset_path]
+    if os.path.isdir(dataset_path):
+        archives = sorted(os.path.join(dataset_path, name) for name in os.listdir(dataset_path)
+                          if name.lower().endswith(".zip"))
+        sources = archives or sources
+    stats = dataset_ingest.ingest(sources, DATA_DIR, mode=mode, val_fraction=val_fraction, workers=workers,
+                                  clean=clean)
+    dataset_ingest.report(stats)
+    return stats
 
 
 def main():
@@ -205,10 +183,18 @@ def main():
     parser.add_argument("--kaggle", action="store_true", help="Download using Kaggle CLI")
     parser.add_argument("--colab", action="store_true", help="Optimize for Google Colab")
     parser.add_argument("--sample", action="store_true", help="Create sample dataset structure")
+    parser.add_argument("--source", help="Ingest an already downloaded dataset (directory or zip)")
+    parser.add_argument("--mode", choices=dataset_ingest.MODES, default="copy",
+                        help="copy, hardlink or symlink files from the download (zips are always extracted)")
+    parser.add_argument("--val", type=float, default=0.1, help="Share of images in the val split")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 4) * 2),
+                        help="Parallel file transfers")
+    parser.add_argument("--clean", action="store_true", help="Remove files in data/ that were not ingested")
     parser.add_argument("--no-yaml", action="store_true", help="Skip YAML creation")
     
     args = parser.parse_args()
-    
+    ingest_options = {"mode": args.mode, "val_fraction": args.val, "workers": args.workers, "clean": args.clean}
+
     print("=" * 70)
     print("📦 RDD2022 Road Damage Detection Dataset Setup")
     print("=" * 70)
@@ -231,15 +217,19 @@ def main():
     # Handle different download methods
     if args.kagglehub:
         print("🔧 Using kagglehub (simplest method)...")
-        download_from_kagglehub()
+        download_from_kagglehub(**ingest_options)
     
     elif args.kaggle:
         print("🔧 Using Kaggle CLI...")
         dataset_path = download_from_kaggle_cli()
         if dataset_path:
-            extract_and_organize(dataset_path)
-            shutil.rmtree(os.path.join(BASE_DIR, "temp_kaggle"), ignore_errors=True)
-    
+            extract_and_organize(dataset_path, **ingest_options)
+            print(f"   (the zip stays in {dataset_path} so reruns skip the download; delete it to free space)")
+
+    elif args.source:
+        print(f"🔧 Ingesting {args.source}...")
+        extract_and_organize(args.source, **ingest_options)
+
     elif args.colab:
         print("🔧 Using Google Colab mode...")
         print("   • Run in Colab: !pip install kagglehub")
@@ -265,6 +255,8 @@ def main():
         print("      Option 2: Manual download from GitHub")
         print("         https://github.com/sekilab/RoadDamageDetector")
         print()
+        print("         python backend/download_dataset.py --source RoadDamageDetector/ --mode hardlink")
+        print()
         print("      Option 3: Sample structure (for testing)")
         print("         python backend/download_dataset.py --sample")
         print()
@@ -279,8 +271,8 @@ def main():
     print("=" * 70)
     print()
     print("📝 Next steps:")
-    print("   1. Ensure images are in: backend/data/images/train/")
-    print("   2. Ensure labels are in: backend/data/labels/train/")
+    print("   1. Ensure images are in: backend/data/images/{train,val}/")
+    print("   2. Ensure labels are in: backend/data/labels/{train,val}/")
     print("   3. Labels must be in YOLO format:")
     print("      <class_id> <x_center> <y_center> <width> <height>")
     print("      (all values normalized 0-1)")
@@ -290,15 +282,9 @@ def main():
     print("   2. Run all cells (GPU will autodetect)")
     print()
 
-
-
 if __name__ == "__main__":
     main()
     print()
     print("ALTERNATIVE: Use Google Colab for faster download + training.")
     print("Upload train.py and data.yaml to Colab and use their free GPU.")
     print()
-
-
-if __name__ == "__main__":
-    main()
@@ -0,0 +1,273 @@
+"""
+Detection Export
+Streams Detection rows to CSV, GeoJSON (FeatureCollection) or Parquet for
+GIS tools, in constant memory: rows come from a streaming cursor in
+fixed-size chunks and each chunk is encoded and handed on (to the HTTP
+response or a file) before the next one is fetched. CSV and GeoJSON can
+be gzip-compressed on the fly; Parquet is compressed per column.
+
+Served by GET /export (see app.py), or from the command line:
+    python export.py --format geojson --out survey.geojson.gz --gzip
+    python export.py --format csv --start 2026-01-01 --end 2026-01-31 \\
+        --bbox 120.90,14.20,121.15,14.80 --codes D20,D40 --out - > potholes.csv
+
+Parquet needs pyarrow (pip install pyarrow).
+"""
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import sys
+import time
+import zlib
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.expression import UnaryExpression
+
+import spatial
+
+DEFAULT_DB = os.path.join(os.path.abspath(os.path.dirname(__file__)), "database", "detections.db")
+FORMATS = ("csv", "geojson", "parquet")
+CONTENT_TYPES = {"csv": "text/csv", "geojson": "application/geo+json", "parquet": "application/vnd.apache.parquet"}
+EXTENSIONS = {"csv": "csv", "geojson": "geojson", "parquet": "parquet"}
+CHUNK_ROWS = 10000
+
+COLUMNS = ("id", "timestamp", "latitude", "longitude", "damage_code", "damage_type", "confidence",
+           "bbox_x1", "bbox_y1", "bbox_x2", "bbox_y2", "image_filename", "site_id", "notes")
+
+
+# ============================================================
+# QUERY
+# ============================================================
+
+def parse_time(value, end=False):
+    """
+    ISO date or datetime (UTC). A bare date as the end of a range means
+    the whole day. Raises ValueError.
+    """
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value)
+    if end and len(value) == 10:  # "YYYY-MM-DD"
+        parsed += datetime.timedelta(days=1) - datetime.timedelta(microseconds=1)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_codes(value):
+    return [code.strip() for code in value.split(",") if code.strip()] if value else None
+
+
+def _residual(column):
+    """`+column`: the same value, but SQLite will not use an index on it."""
+    return UnaryExpression(column, operator=operators.custom_op("+"), type_=column.type)
+
+
+def build_query(table, start=None, end=None, bbox=None, codes=None):
+    """
+    SELECT of the exported columns, oldest first, with the optional filters
+    applied. bbox and codes are residual filters on the (timestamp, id)
+    index scan: with an index on them SQLite would sort the whole filtered
+    result (a temp B-tree, in memory) before the first row comes out.
+    """
+    c = table.c
+    statement = select(*[c[name] for name in COLUMNS])
+    if start:
+        statement = statement.where(c.timestamp >= start)
+    if end:
+        statement = statement.where(c.timestamp <= end)
+    if bbox:
+        columns = SimpleNamespace(**{name: _residual(c[name]) for name in ("quadkey", "latitude", "longitude")})
+        statement = statement.where(spatial.bbox_filter(columns, bbox))
+    if codes:
+        statement = statement.where(_residual(c.damage_code).in_(codes))
+    return statement.order_by(c.timestamp, c.id)
+
+
+def iter_chunks(connection, statement, chunk=CHUNK_ROWS):
+    """Rows in lists of `chunk`, fetched from a streaming (server-side) cursor."""
+    result = connection.execution_options(stream_results=True, yield_per=chunk).execute(statement)
+    for rows in result.partitions(chunk):
+        yield rows
+
+
+# ============================================================
+# ENCODERS (each yields bytes, one piece per chunk of rows)
+# ============================================================
+
+def _rounded(value, digits):
+    return None if value is None else round(value, digits)
+
+
+def _text_row(r):
+    """Row as written to text formats: ISO timestamp, floats at to_dict() precision (~1 cm coordinates)."""
+    return (r[0], r[1].isoformat() if r[1] else None, _rounded(r[2], 7), _rounded(r[3], 7), r[4], r[5],
+            round(r[6], 4), round(r[7], 2), round(r[8], 2), round(r[9], 2), round(r[10], 2), *r[11:])
+
+
+def encode_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue().encode()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_text_row(r) for r in rows)
+        yield buffer.getvalue().encode()
+
+
+def encode_geojson(chunks):
+    """RFC 7946 FeatureCollection; detections without GPS get a null geometry."""
+    yield b'{"type":"FeatureCollection","features":['
+    first = True
+    for rows in chunks:
+        features = []
+        for r in rows:
+            properties = dict(zip(COLUMNS, _text_row(r)))
+            latitude, longitude = properties.pop("latitude"), properties.pop("longitude")
+            geometry = None if latitude is None or longitude is None else \
+                {"type": "Point", "coordinates": [longitude, latitude]}
+            features.append(json.dumps({"type": "Feature", "id": r[0], "geometry": geometry,
+                                        "properties": properties}, separators=(",", ":")))
+        if features:
+            yield (("" if first else ",") + ",".join(features)).encode()
+            first = False
+    yield b"]}"
+
+
+class _Sink:
+    """Write-only file object the Parquet writer fills; drained after each row group."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def encode_parquet(chunks, compression="zstd"):
+    """One Parquet row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"timestamp": pa.timestamp("us"), "latitude": pa.float64(), "longitude": pa.float64(),
+             "confidence": pa.float64(), "bbox_x1": pa.float64(), "bbox_y1": pa.float64(),
+             "bbox_x2": pa.float64(), "bbox_y2": pa.float64()}
+    schema = pa.schema([(name, types.get(name, pa.string())) for name in COLUMNS])
+    sink = _Sink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression=compression) as writer:
+        for rows in chunks:
+            if not rows:
+                continue
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    yield sink.drain()  # footer
+
+
+ENCODERS = {"csv": encode_csv, "geojson": encode_geojson, "parquet": encode_parquet}
+
+
+def gzip_stream(pieces, level=6):
+    """Compress a byte stream into a gzip stream as it goes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for piece in pieces:
+        data = compressor.compress(piece)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def check_format(fmt, compress=False):
+    """Raises ValueError for an unknown format or one that cannot be gzipped."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if compress and fmt == "parquet":
+        raise ValueError("Parquet is already compressed; gzip applies to csv and geojson")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+
+
+def export(connection, table, fmt="csv", compress=False, chunk=CHUNK_ROWS, **filters):
+    """Byte stream of the filtered detections in `fmt` (see build_query for the filters)."""
+    check_format(fmt, compress)
+    pieces = ENCODERS[fmt](iter_chunks(connection, build_query(table, **filters), chunk))
+    return gzip_stream(pieces) if compress else pieces
+
+
+def filename(fmt, compress=False):
+    return f"detections.{EXTENSIONS[fmt]}" + (".gz" if compress else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export detections for GIS tools")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", help="Output file, '-' for stdout (default: detections.<format>[.gz])")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress csv / geojson")
+    parser.add_argument("--start", help="First day or datetime (UTC, inclusive)")
+    parser.add_argument("--end", help="Last day or datetime (UTC, inclusive)")
+    parser.add_argument("--bbox", help="min_lon,min_lat,max_lon,max_lat")
+    parser.add_argument("--codes", help="Damage codes, e.g. D20,D40")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="Rows fetched and encoded at a time")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database file")
+    args = parser.parse_args()
+
+    try:
+        check_format(args.format, args.gzip)
+        filters = {
+            "start": parse_time(args.start), "end": parse_time(args.end, end=True),
+            "bbox": spatial.parse_bbox(args.bbox) if args.bbox else None, "codes": parse_codes(args.codes),
+        }
+    except ValueError as e:
+        parser.error(str(e))
+
+    from database import Detection
+
+    out_path = args.out or filename(args.format, args.gzip)
+    engine = create_engine(f"sqlite:///{args.db}")
+    started = time.perf_counter()
+    written = 0
+    out = sys.stdout.buffer if out_path == "-" else open(out_path, "wb")
+    try:
+        with engine.connect() as conn:
+            for piece in export(conn, Detection.__table__, args.format, args.gzip, args.chunk, **filters):
+                out.write(piece)
+                written += len(piece)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    if out_path != "-":
+        print(f"✅ {written / 1e6:.1f} MB written to {out_path} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
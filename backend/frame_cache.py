@@ -0,0 +1,138 @@
+"""
+Near-Duplicate Frame Cache
+Remembers the last few frames each device sent, so a repeat of a frame
+(a vehicle stopped at a light keeps posting the same view) returns the
+cached detections without running the model or storing them again.
+
+A frame matches a cached one if it has the same content hash (the exact
+same upload) or a perceptual hash (dHash) within `max_hamming` bits. A
+perceptual match is rejected when both frames carry GPS and they are more
+than `max_distance_m` apart, so a similar-looking stretch of road further
+on is still detected. Callers that cannot tell devices apart (a session
+keyed by a client address that many devices may share) look up exact
+repeats only.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from spatial import distance_m
+
+
+def dhash(image, size=8):
+    """64-bit difference hash: brightness gradients of a (size+1) x size greyscale thumbnail."""
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    small = image.resize((size + 1, size), Image.BILINEAR, reducing_gap=2.0).convert("L")
+    pixels = small.tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class FrameCache:
+    """
+    Per-session LRU of recent frames and their /detect results.
+
+    Sessions are evicted least-recently-used beyond `max_sessions`; each
+    session keeps its `per_session` most recent frames. Entries older than
+    `max_age_seconds` never match. Thread-safe.
+    """
+
+    def __init__(self, max_sessions=256, per_session=8, max_hamming=6, max_distance_m=15.0, max_age_seconds=120.0):
+        self.max_sessions = max_sessions
+        self.per_session = per_session
+        self.max_hamming = max_hamming
+        self.max_distance_m = max_distance_m
+        self.max_age_seconds = max_age_seconds
+
+        self._sessions = OrderedDict()  # session -> OrderedDict(sha1 -> entry)
+        self._lock = threading.Lock()
+        self._hits_exact = 0
+        self._hits_similar = 0
+        self._misses = 0
+        self._gps_rejects = 0
+        self._evictions = 0
+
+    @staticmethod
+    def keys(image_bytes, image):
+        """(content hash, perceptual hash) of a frame; computed once per request."""
+        return hashlib.sha1(image_bytes).hexdigest(), dhash(image)
+
+    def lookup(self, session, keys, latitude=None, longitude=None, similar=True):
+        """
+        Cached result for a matching frame, as (result, "exact" | "similar"),
+        or None. `similar=False` skips the perceptual match.
+        """
+        digest, phash = keys
+        now = time.monotonic()
+        with self._lock:
+            entries = self._sessions.get(session)
+            if entries is not None:
+                self._sessions.move_to_end(session)
+                entry = entries.get(digest)
+                if entry is not None and now - entry["stored_at"] <= self.max_age_seconds:
+                    entries.move_to_end(digest)
+                    self._hits_exact += 1
+                    return entry["result"], "exact"
+
+                # Newest first: consecutive frames are the most likely repeats
+                for key, entry in reversed(entries.items() if similar else ()):
+                    if now - entry["stored_at"] > self.max_age_seconds:
+                        continue
+                    if bin(phash ^ entry["phash"]).count("1") > self.max_hamming:
+                        continue
+                    if self._moved(entry, latitude, longitude):
+                        self._gps_rejects += 1
+                        continue
+                    entries.move_to_end(key)
+                    self._hits_similar += 1
+                    return entry["result"], "similar"
+            self._misses += 1
+        return None
+
+    def store(self, session, keys, result, latitude=None, longitude=None):
+        digest, phash = keys
+        entry = {"phash": phash, "result": result, "latitude": latitude, "longitude": longitude,
+                 "stored_at": time.monotonic()}
+        with self._lock:
+            entries = self._sessions.get(session)
+            if entries is None:
+                entries = self._sessions[session] = OrderedDict()
+                while len(self._sessions) > self.max_sessions:
+                    _, evicted = self._sessions.popitem(last=False)
+                    self._evictions += len(evicted)
+            self._sessions.move_to_end(session)
+            entries[digest] = entry
+            entries.move_to_end(digest)
+            while len(entries) > self.per_session:
+                entries.popitem(last=False)
+                self._evictions += 1
+
+    def _moved(self, entry, latitude, longitude):
+        if not self.max_distance_m or latitude is None or longitude is None or entry["latitude"] is None:
+            return False
+        return distance_m(entry["latitude"], entry["longitude"], latitude, longitude) > self.max_distance_m
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits_exact + self._hits_similar + self._misses
+            return {
+                "sessions": len(self._sessions),
+                "entries": sum(len(entries) for entries in self._sessions.values()),
+                "hits_exact": self._hits_exact,
+                "hits_similar": self._hits_similar,
+                "misses": self._misses,
+                "hit_rate": round((self._hits_exact + self._hits_similar) / lookups, 4) if lookups else 0.0,
+                "gps_rejects": self._gps_rejects,
+                "evictions": self._evictions,
+                "max_hamming": self.max_hamming,
+                "max_distance_m": self.max_distance_m,
+            }
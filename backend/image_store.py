@@ -0,0 +1,344 @@
+"""
+Content-Addressed Image Store
+Uploaded frames are named by the hash of their bytes and sharded into
+two levels of directories:
+
+    uploads/3f/a2/3fa2c94e...e1.jpg                  original
+    uploads/.derived/thumb/3f/a2/3fa2c94e...e1.jpg   derivative
+
+- An identical upload (a retried request, a phone resending a frame) maps
+  to the file that is already there and is not stored again.
+- 256 x 256 shard directories keep every directory small.
+- A stored file never changes, so its name is a strong ETag and clients
+  may cache it for a year.
+- Derivatives (thumb: 160 px, preview: 640 px on the longest side) are
+  made on the first request and kept in a cache bounded to
+  `derived_max_bytes`, least recently used evicted first.
+
+Files from before the store (random names in a flat uploads/) are still
+found at the top level.
+
+With layout="segments" originals are appended to large segment files
+instead (see segment_store.py); derivatives stay files. `remove()` and
+`maintain()` (retention, then segment compaction) reclaim space in both
+layouts.
+"""
+
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from persistence import write_atomic
+from segment_store import MIN_GARBAGE, SEGMENT_MAX_BYTES, SEGMENTS_DIR, SegmentStore, file_lock
+
+HASH_CHARS = 32  # 128 bits of SHA-256
+VARIANTS = {"thumb": 160, "preview": 640}
+DERIVED_DIR = ".derived"
+DERIVED_QUALITY = 80
+RESCAN_SECONDS = 300  # other worker processes add derivatives too
+TOUCH_SECONDS = 3600  # bump a cached derivative's mtime at most this often (shared LRU order)
+LAYOUTS = ("files", "segments")
+MAINTENANCE_LOCK = ".maintenance.lock"
+
+_CONTENT_NAME = re.compile(r"^[0-9a-f]{%d}\.jpg$" % HASH_CHARS)
+
+
+def content_name(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_CHARS] + ".jpg"
+
+
+def is_content_name(filename):
+    return bool(_CONTENT_NAME.match(filename))
+
+
+def render(data, variant):
+    """JPEG bytes of an image downscaled to the variant's longest side (never upscaled)."""
+    size = VARIANTS[variant]
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (size, size))  # DCT-domain downscale for JPEGs
+    image = image.convert("RGB")
+    image.thumbnail((size, size), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=DERIVED_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+class ImageStore:
+    def __init__(self, root, derived_max_bytes=256 * 1024 * 1024, layout="files", segment_max_bytes=SEGMENT_MAX_BYTES):
+        if layout not in LAYOUTS:
+            raise ValueError(f"layout must be one of {', '.join(LAYOUTS)}, got {layout!r}")
+        self.root = root
+        self.layout = layout
+        self.segments = SegmentStore(os.path.join(root, SEGMENTS_DIR), segment_max_bytes) if layout == "segments" else None
+        self.derived_root = os.path.join(root, DERIVED_DIR)
+        self.derived_max_bytes = derived_max_bytes
+
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # derivative path -> bytes
+        self._lru_bytes = 0
+        self._scanned = None  # (pid, time) of the last scan of the derived cache
+        self._deduplicated = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._removed = 0
+        self._expired = 0
+        self._maintenance = None  # (pid, thread)
+
+    # --------------------------------------------------------
+    # Originals
+    # --------------------------------------------------------
+
+    def path(self, filename, root=None):
+        """Where `filename` lives (sharded for content names), or None for a name that is not ours."""
+        root = root or self.root
+        if is_content_name(filename):
+            return os.path.join(root, filename[:2], filename[2:4], filename)
+        if not filename or filename.startswith(".") or "/" in filename or os.sep in filename:
+            return None
+        return os.path.join(root, filename)  # legacy flat layout
+
+    def exists(self, filename):
+        if self.segments and is_content_name(filename) and self.segments.contains(filename):
+            return True
+        path = self.path(filename)
+        return path is not None and os.path.exists(path)
+
+    def claim(self, data):
+        """
+        (filename, is_new) for uploaded bytes; is_new is False when the
+        same bytes are already stored and need not be written again.
+        """
+        filename = content_name(data)
+        if self.exists(filename):
+            with self._lock:
+                self._deduplicated += 1
+            return filename, False
+        return filename, True
+
+    def write(self, filename, data):
+        """Store an original (the ImageWriter's write function)."""
+        if self.segments and is_content_name(filename):
+            self.segments.put(filename, data)
+        else:
+            write_atomic(self.path(filename), data)
+
+    def source(self, filename):
+        """The original to serve: its bytes (from a segment), a file path, or None."""
+        packed = self.segments is not None and is_content_name(filename)
+        if packed:
+            data = self.segments.get(filename, refresh=False)
+            if data is not None:
+                return data
+        path = self.path(filename)
+        if path is not None and os.path.isfile(path):
+            return path  # legacy, or stored before the segment layout was enabled
+        return self.segments.get(filename) if packed else None  # maybe written by another process
+
+    def read(self, filename):
+        """Bytes of the original, or None."""
+        source = self.source(filename)
+        if not isinstance(source, str):
+            return source
+        try:
+            with open(source, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def remove(self, filenames):
+        """Delete originals and their derivatives (segment space is reclaimed by compaction)."""
+        filenames = [name for name in filenames if self.path(name) is not None]
+        if self.segments:
+            self.segments.delete([name for name in filenames if is_content_name(name)])
+        for filename in filenames:
+            paths = [self.path(filename)] + [self.path(filename, os.path.join(self.derived_root, v)) for v in VARIANTS]
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                with self._lock:
+                    if path in self._lru:
+                        self._lru_bytes -= self._lru.pop(path)
+        with self._lock:
+            self._removed += len(filenames)
+
+    def older_than(self, cutoff):
+        """Originals stored before `cutoff` (epoch seconds); the files layout walks every directory."""
+        if self.segments:
+            return self.segments.older_than(cutoff)
+        names = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != SEGMENTS_DIR]
+            for name in filenames:
+                if name.endswith(".jpg"):
+                    try:
+                        if os.path.getmtime(os.path.join(dirpath, name)) < cutoff:
+                            names.append(name)
+                    except FileNotFoundError:
+                        pass
+        return names
+
+    def etag(self, filename, variant=None):
+        """Strong ETag for content names (None for legacy files: let the server derive one)."""
+        if not is_content_name(filename):
+            return None
+        return filename[:HASH_CHARS] + (f"-{variant}" if variant else "")
+
+    # --------------------------------------------------------
+    # Derivatives
+    # --------------------------------------------------------
+
+    def derivative(self, filename, variant):
+        """Path of the variant, made from the original if it is not cached. None if there is no original."""
+        if self.path(filename) is None:
+            return None
+        path = self.path(filename, os.path.join(self.derived_root, variant))
+        self._ensure_scanned()
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            pass
+        else:
+            with self._lock:
+                self._hits += 1
+                if path in self._lru:
+                    self._lru.move_to_end(path)
+                else:
+                    self._add(path, st.st_size)
+            if time.time() - st.st_mtime > TOUCH_SECONDS:
+                os.utime(path)
+            return path
+
+        data = self.read(filename)
+        if data is None:
+            return None
+        data = render(data, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, data)
+        with self._lock:
+            self._misses += 1
+            self._add(path, len(data))
+            evicted = self._evict()
+        for old in evicted:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+        return path
+
+    def _add(self, path, size):
+        if path in self._lru:
+            self._lru_bytes -= self._lru.pop(path)
+        self._lru[path] = size
+        self._lru_bytes += size
+
+    def _evict(self):
+        """Paths to delete to get back under budget (called with the lock held)."""
+        evicted = []
+        while self._lru_bytes > self.derived_max_bytes and len(self._lru) > 1:
+            path, size = self._lru.popitem(last=False)
+            self._lru_bytes -= size
+            self._evictions += 1
+            evicted.append(path)
+        return evicted
+
+    def _ensure_scanned(self):
+        # Rebuild the LRU from disk (oldest mtime first) on first use, in
+        # forked children, and now and then to count other workers' files
+        pid, now = os.getpid(), time.monotonic()
+        scanned = self._scanned
+        if scanned and scanned[0] == pid and now - scanned[1] < RESCAN_SECONDS:
+            return
+        files = []
+        for dirpath, _, filenames in os.walk(self.derived_root):
+            for name in filenames:
+                if name.endswith(".jpg"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_mtime, path, st.st_size))
+        files.sort()
+        with self._lock:
+            self._lru = OrderedDict((path, size) for _, path, size in files)
+            self._lru_bytes = sum(size for _, _, size in files)
+            self._scanned = (pid, now)
+            evicted = self._evict()
+        for old in evicted:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+    # --------------------------------------------------------
+    # Maintenance
+    # --------------------------------------------------------
+
+    def maintain(self, expire=None, min_garbage=MIN_GARBAGE):
+        """
+        Remove the originals `expire(store)` returns, then compact the
+        segments. Runs in one process at a time: returns a summary, or
+        None while another process is at it.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with file_lock(os.path.join(self.root, MAINTENANCE_LOCK), blocking=False) as locked:
+            if not locked:
+                return None
+            expired = list(expire(self)) if expire else []
+            self.remove(expired)
+            with self._lock:
+                self._expired += len(expired)
+            return {"expired": len(expired), "compaction": self.segments.compact(min_garbage) if self.segments else None}
+
+    def start_maintenance(self, interval, expire=None, min_garbage=MIN_GARBAGE):
+        """Run `maintain()` every `interval` seconds on a daemon thread (once per process, restarted after fork)."""
+        pid = os.getpid()
+        if self._maintenance and self._maintenance[0] == pid:
+            return
+        with self._lock:
+            if self._maintenance and self._maintenance[0] == pid:
+                return
+            thread = threading.Thread(target=self._maintain_forever, args=(interval, expire, min_garbage),
+                                      name="image-store-maintenance", daemon=True)
+            self._maintenance = (pid, thread)
+        thread.start()
+
+    def _maintain_forever(self, interval, expire, min_garbage):
+        while True:
+            time.sleep(interval)
+            try:
+                summary = self.maintain(expire, min_garbage)
+            except Exception as e:
+                print(f"⚠️  Upload maintenance failed: {e}")
+                continue
+            compaction = (summary or {}).get("compaction") or {}
+            if summary and (summary["expired"] or compaction.get("segments")):
+                print(f"🧹 Uploads: {summary['expired']} expired, {compaction.get('segments', 0)} segments compacted, "
+                      f"{compaction.get('reclaimed_bytes', 0) / 1e6:.1f} MB reclaimed")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "layout": self.layout,
+                "removed_images": self._removed,
+                "expired_images": self._expired,
+                "deduplicated_uploads": self._deduplicated,
+                "derived_files": len(self._lru),
+                "derived_bytes": self._lru_bytes,
+                "derived_max_bytes": self.derived_max_bytes,
+                "derived_hits": self._hits,
+                "derived_misses": self._misses,
+                "derived_hit_rate": round(self._hits / lookups, 4) if lookups else 0,
+                "derived_evictions": self._evictions,
+                "segments": self.segments.stats() if self.segments else None,
+            }
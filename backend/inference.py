@@ -0,0 +1,346 @@
+"""
+Inference Backends
+Interchangeable detectors behind one interface, selected with
+INFERENCE_BACKEND:
+
+    torch       YOLOv5 AutoShape model (eager PyTorch)
+    onnx        exported ONNX graph on ONNX Runtime (CPU)
+    onnx-int8   the same graph statically quantized to INT8
+    stub        no model: a fixed number of deterministic boxes per image
+                after a fixed delay (benchmarks, offline development)
+
+Every backend exposes `names` (class id -> name), the thresholds `conf`,
+`iou` and `max_det`, and `predict(images, size=None, conf=None)`, which
+takes a list of RGB images (PIL or HxWx3 uint8 arrays) and returns one
+(n, 6) float array per image: x1, y1, x2, y2, confidence, class — in
+original image pixels. `size` and `conf` override the inference size and
+confidence threshold for one call (used by the low-resolution gate).
+
+Build the INT8 graph once (calibrated on backend/data/images/val) with:
+    python model_registry.py --export onnx
+    python inference.py --quantize
+"""
+
+import argparse
+import ast
+import glob
+import os
+import random
+import threading
+import time
+import zlib
+
+import numpy as np
+from PIL import Image
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+CALIBRATION_DIR = os.path.join(BASE_DIR, "data", "images", "val")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "stub")
+ONNX_ARTIFACTS = {"onnx": "best.onnx", "onnx-int8": "best.int8.onnx"}
+LETTERBOX_FILL = 114
+
+
+class TorchBackend:
+    """Wraps a YOLOv5 AutoShape model; thresholds are forwarded to it."""
+
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+        self.names = getattr(model, "names", None)
+        self._lock = threading.Lock()  # AutoShape reads its thresholds at call time
+
+    conf = property(lambda self: self.model.conf, lambda self, v: setattr(self.model, "conf", v))
+    iou = property(lambda self: self.model.iou, lambda self, v: setattr(self.model, "iou", v))
+    max_det = property(lambda self: self.model.max_det, lambda self, v: setattr(self.model, "max_det", v))
+
+    def set_num_threads(self, threads):
+        import torch
+
+        torch.set_num_threads(threads)
+
+    def predict(self, images, size=None, conf=None):
+        kwargs = {"size": size} if size else {}
+        with self._lock:
+            default_conf = self.model.conf
+            if conf is not None:
+                self.model.conf = conf
+            try:
+                results = self.model(images, **kwargs)
+            finally:
+                self.model.conf = default_conf
+        return [pred.cpu().numpy() for pred in results.xyxy]
+
+
+class StubBackend:
+    """
+    Stand-in detector with the cost profile of a model: each call sleeps
+    `batch_ms` + `image_ms` per image (releasing the GIL, as torch and
+    ONNX Runtime do) and returns `boxes` boxes per image, placed from a
+    hash of its pixels, so the same frame always gets the same boxes.
+    """
+
+    name = "stub"
+
+    def __init__(self, boxes=3, batch_ms=20.0, image_ms=10.0, classes=4):
+        self.boxes = boxes
+        self.batch_ms = batch_ms
+        self.image_ms = image_ms
+        self.names = {i: f"class{i}" for i in range(classes)}
+        self.conf = 0.25
+        self.iou = 0.45
+        self.max_det = 300
+
+    def set_num_threads(self, threads):
+        pass
+
+    def predict(self, images, size=None, conf=None):
+        arrays = [np.asarray(image.convert("RGB") if isinstance(image, Image.Image) else image) for image in images]
+        time.sleep((self.batch_ms + self.image_ms * len(arrays)) / 1000)
+        threshold = self.conf if conf is None else conf
+        return [self._boxes(array, threshold) for array in arrays]
+
+    def _boxes(self, array, threshold):
+        height, width = array.shape[:2]
+        rng = np.random.default_rng(zlib.crc32(np.ascontiguousarray(array[::16, ::16]).tobytes()))
+        count = min(self.boxes, self.max_det)
+        side = rng.uniform(0.05, 0.3, (count, 2)) * (width, height)
+        x1y1 = rng.uniform(0, 1, (count, 2)) * ((width, height) - side)
+        confidence = rng.uniform(max(threshold, 0.25), 1.0, count)
+        classes = rng.integers(0, len(self.names), count)
+        return np.column_stack([x1y1, x1y1 + side, confidence, classes]).astype(np.float32)
+
+
+class OnnxBackend:
+    """
+    YOLOv5 graph exported to ONNX, run with ONNX Runtime.
+
+    Pre- and post-processing (letterbox, confidence filter, NMS, rescale)
+    are done in numpy. The session is created per process on first use:
+    ONNX Runtime's thread pool does not survive fork(), so a session built
+    in serve.py's master must not be inherited by the workers.
+    """
+
+    def __init__(self, path, names=None, imgsz=640, threads=0, name="onnx"):
+        import onnxruntime  # noqa: F401 — fail at load time, not on the first request
+
+        self.path = path
+        self.name = name
+        self.imgsz = imgsz
+        self.threads = threads
+        self.conf = 0.25
+        self.iou = 0.45
+        self.max_det = 300
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+        # Read metadata from a throwaway session (see class docstring)
+        session = self._create_session()
+        self.input_name = session.get_inputs()[0].name
+        batch = session.get_inputs()[0].shape[0]
+        self.fixed_batch = batch if isinstance(batch, int) else None
+        self.names = names or read_onnx_names(session)
+        del session
+
+    def _create_session(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        return ort.InferenceSession(self.path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def session(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._session = self._create_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def set_num_threads(self, threads):
+        self.threads = threads
+        self._pid = None  # rebuild the session with the new pool size
+
+    def predict(self, images, size=None, conf=None):
+        """`size` other than the export size needs a graph exported with dynamic axes."""
+        arrays = [np.asarray(image.convert("RGB") if isinstance(image, Image.Image) else image) for image in images]
+        inputs, transforms = zip(*(letterbox(a, size or self.imgsz) for a in arrays))
+        batch = np.stack(inputs)
+
+        session = self.session()
+        if self.fixed_batch == 1 and len(batch) > 1:
+            outputs = np.concatenate([session.run(None, {self.input_name: batch[i:i + 1]})[0] for i in range(len(batch))])
+        else:
+            outputs = session.run(None, {self.input_name: batch})[0]
+
+        return [
+            scale_boxes(decode_yolov5(output, self.conf if conf is None else conf, self.iou, self.max_det),
+                        transform, array.shape)
+            for output, transform, array in zip(outputs, transforms, arrays)
+        ]
+
+
+# ============================================================
+# PRE / POST-PROCESSING (numpy)
+# ============================================================
+
+def letterbox(array, size=640):
+    """Resize keeping aspect ratio and pad to size x size; returns (CHW float32 input, (ratio, pad_x, pad_y))."""
+    height, width = array.shape[:2]
+    ratio = min(size / height, size / width)
+    new_w, new_h = round(width * ratio), round(height * ratio)
+    if (new_w, new_h) != (width, height):
+        array = np.asarray(Image.fromarray(array).resize((new_w, new_h), Image.BILINEAR))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+
+    canvas = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = array
+    return canvas.transpose(2, 0, 1).astype(np.float32) / 255.0, (ratio, pad_x, pad_y)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression. Returns kept indices, highest score first."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        overlap = w * h
+        iou = overlap / (areas[i] + areas[rest] - overlap + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, classes, iou_threshold):
+    """Per-class NMS in one pass (boxes of different classes are offset apart)."""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = classes[:, None] * (boxes.max() + 1)
+    return nms(boxes + offsets, scores, iou_threshold)
+
+
+def decode_yolov5(output, conf=0.25, iou=0.45, max_det=300):
+    """Raw YOLOv5 head output (N, 5 + classes) -> (n, 6) detections in letterbox pixels."""
+    class_scores = output[:, 5:] * output[:, 4:5]
+    classes = class_scores.argmax(1)
+    scores = class_scores[np.arange(len(classes)), classes]
+    mask = scores > conf
+    if not mask.any():
+        return np.zeros((0, 6), dtype=np.float32)
+
+    xywh, scores, classes = output[mask, :4], scores[mask], classes[mask]
+    boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+    keep = batched_nms(boxes, scores, classes, iou)[:max_det]
+    return np.column_stack([boxes[keep], scores[keep], classes[keep]]).astype(np.float32)
+
+
+def scale_boxes(pred, transform, shape):
+    """Map letterbox-pixel boxes back to the original image and clip to it."""
+    ratio, pad_x, pad_y = transform
+    pred[:, [0, 2]] = ((pred[:, [0, 2]] - pad_x) / ratio).clip(0, shape[1])
+    pred[:, [1, 3]] = ((pred[:, [1, 3]] - pad_y) / ratio).clip(0, shape[0])
+    return pred
+
+
+def read_onnx_names(session):
+    """Class names stored by YOLOv5's export.py in the ONNX metadata, or None."""
+    names = session.get_modelmeta().custom_metadata_map.get("names")
+    return ast.literal_eval(names) if names else None
+
+
+def onnx_path(backend, models_dir=MODELS_DIR):
+    """Graph for an ONNX backend: $ONNX_MODEL_PATH, else models/best.onnx or models/best.int8.onnx."""
+    return os.environ.get("ONNX_MODEL_PATH") or os.path.join(models_dir, ONNX_ARTIFACTS[backend])
+
+
+# ============================================================
+# STATIC INT8 QUANTIZATION
+# ============================================================
+
+def calibration_images(directory=CALIBRATION_DIR, limit=128, seed=0):
+    paths = sorted(p for p in glob.glob(os.path.join(directory, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+    random.Random(seed).shuffle(paths)
+    return paths[:limit]
+
+
+def quantize(source, target, calibration_dir=CALIBRATION_DIR, limit=128, imgsz=640):
+    """
+    Statically quantize an exported YOLOv5 graph to INT8 (QDQ format).
+
+    Activation ranges are calibrated on up to `limit` validation images.
+    Only Conv/MatMul are quantized: the detection head's Mul/Add/Concat
+    decode stays in float, which keeps box coordinates accurate.
+    """
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    paths = calibration_images(calibration_dir, limit)
+    if not paths:
+        raise SystemExit(f"❌ No calibration images in {calibration_dir}")
+
+    class ValImages(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.paths = iter(paths)
+
+        def get_next(self):
+            path = next(self.paths, None)
+            if path is None:
+                return None
+            array, _ = letterbox(np.asarray(Image.open(path).convert("RGB")), imgsz)
+            return {self.input_name: array[None]}
+
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    prepared = target + ".prep.onnx"
+    quant_pre_process(source, prepared)
+    try:
+        quantize_static(
+            prepared, target, ValImages(input_name),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            op_types_to_quantize=["Conv", "MatMul"],
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+    finally:
+        os.remove(prepared)
+    print(f"✅ INT8 graph written to {target} (calibrated on {len(paths)} images)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX Runtime backend tools")
+    parser.add_argument("--quantize", action="store_true", help="Write models/best.int8.onnx from models/best.onnx")
+    parser.add_argument("--source", default=os.path.join(MODELS_DIR, ONNX_ARTIFACTS["onnx"]))
+    parser.add_argument("--target", default=os.path.join(MODELS_DIR, ONNX_ARTIFACTS["onnx-int8"]))
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR)
+    parser.add_argument("--calibration-images", type=int, default=128)
+    parser.add_argument("--imgsz", type=int, default=640)
+    args = parser.parse_args()
+
+    if args.quantize:
+        if not os.path.exists(args.source):
+            raise SystemExit(f"❌ {args.source} not found — run: python model_registry.py --export onnx")
+        quantize(args.source, args.target, args.calibration_dir, args.calibration_images, args.imgsz)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
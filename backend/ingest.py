@@ -0,0 +1,194 @@
+"""
+Write-Behind Detection Ingestion
+Collects Detection rows from many requests and flushes them to SQLite in
+bulk, plus the SQLite pragmas (WAL, synchronous, cache) the server runs with.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+
+
+def enable_sqlite_wal(engine, cache_mb=64, mmap_mb=256, busy_timeout_ms=5000):
+    """
+    Run every SQLite connection of `engine` in WAL mode with tuned pragmas.
+
+    WAL lets readers (/history, /history/map) proceed while a flush is
+    writing; synchronous=NORMAL only fsyncs at checkpoints, which is safe
+    against corruption in WAL mode and much faster than FULL.
+    """
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{int(cache_mb) * 1024}")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_mb) * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.close()
+
+    return _set_sqlite_pragmas
+
+
+class DetectionWriter:
+    """
+    Buffers rows and hands them to `flush_fn(rows)` from a background thread.
+
+    A flush is triggered when `max_rows` rows are buffered or `max_delay_ms`
+    after the oldest buffered row arrived. If the buffer reaches
+    `max_pending` rows (the database is falling behind), `add()` blocks
+    until a flush makes room. A failed flush is retried `max_retries`
+    times before the batch is dropped and counted as lost.
+    """
+
+    def __init__(self, flush_fn, max_rows=500, max_delay_ms=200.0, max_pending=50000, max_retries=3):
+        self.flush_fn = flush_fn
+        self.max_rows = max(1, int(max_rows))
+        self.max_delay = max(0.0, float(max_delay_ms)) / 1000.0
+        self.max_pending = max(self.max_rows, int(max_pending))
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._oldest = None
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+        self._flushes = 0
+        self._rows_written = 0
+        self._rows_lost = 0
+        self._errors = 0
+        self._total_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._last_flush_rows = 0
+
+    # --------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------
+
+    def add(self, rows):
+        """Buffer rows for the next bulk insert."""
+        if not rows:
+            return
+        self._ensure_worker()
+        with self._cond:
+            while len(self._buffer) >= self.max_pending and not self._stopping:
+                self._cond.wait(timeout=1.0)
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.max_rows:
+                self._cond.notify_all()
+
+    def flush(self):
+        """Write everything buffered so far, on the calling thread."""
+        with self._cond:
+            rows = self._take()
+        self._write(rows)
+
+    def shutdown(self):
+        """Flush the buffer and stop the worker (registered with atexit)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self.flush()
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_rows": self.max_rows,
+                "max_delay_ms": round(self.max_delay * 1000, 2),
+                "pending_rows": len(self._buffer),
+                "flushes": self._flushes,
+                "rows_written": self._rows_written,
+                "rows_lost": self._rows_lost,
+                "errors": self._errors,
+                "avg_flush_rows": round(self._rows_written / self._flushes, 1) if self._flushes else 0,
+                "last_flush_rows": self._last_flush_rows,
+                "avg_flush_ms": round(self._total_flush_ms / self._flushes, 2) if self._flushes else 0,
+                "max_flush_ms": round(self._max_flush_ms, 2),
+            }
+
+    # --------------------------------------------------------
+    # Worker
+    # --------------------------------------------------------
+
+    def _ensure_worker(self):
+        # Restart the flusher in forked children (threads do not survive fork).
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != pid:
+                self._buffer = []
+                self._oldest = None
+            self._pid = pid
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="detection-writer", daemon=True)
+            self._thread.start()
+
+    def _take(self):
+        rows, self._buffer, self._oldest = self._buffer, [], None
+        self._cond.notify_all()  # wake writers blocked on max_pending
+        return rows
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if len(self._buffer) >= self.max_rows:
+                        break
+                    if self._buffer:
+                        remaining = self._oldest + self.max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(timeout=remaining)
+                    else:
+                        self._cond.wait(timeout=0.5)
+                if self._stopping:
+                    return
+                rows = self._take()
+            self._write(rows)
+
+    def _write(self, rows):
+        if not rows:
+            return
+        with self._flush_lock:
+            for attempt in range(1, self.max_retries + 1):
+                started = time.perf_counter()
+                try:
+                    self.flush_fn(rows)
+                    break
+                except Exception as e:
+                    with self._cond:
+                        self._errors += 1
+                    print(f"❌ Detection flush failed (attempt {attempt}/{self.max_retries}): {e}")
+                    if attempt == self.max_retries:
+                        with self._cond:
+                            self._rows_lost += len(rows)
+                        return
+                    time.sleep(0.1 * attempt)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._cond:
+            self._flushes += 1
+            self._rows_written += len(rows)
+            self._last_flush_rows = len(rows)
+            self._total_flush_ms += elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
@@ -0,0 +1,422 @@
+"""
+Label Statistics & Validation
+Class histograms, box-size distributions and malformed-label checks over
+the YOLO label files in backend/data/labels/{train,val}, for a look at
+the dataset before each training run.
+
+Labels are parsed once (in parallel) into a columnar cache under
+data/labels/.cache/<split>/: one .npy per column, memory-mapped on load.
+
+    image_idx  int32   (boxes,)     index into names
+    cls        int16   (boxes,)
+    xywh       float32 (boxes, 4)   normalized cx, cy, w, h
+    names, mtime_ns, size           one entry per label file
+    offsets    int64   (files + 1)  boxes of file i: offsets[i]:offsets[i + 1]
+
+Later runs stat the label files and reparse only those whose mtime or
+size changed (--no-refresh skips even that), so queries take
+milliseconds instead of minutes.
+
+Usage:
+    python backend/label_stats.py stats                 # both splits
+    python backend/label_stats.py validate --split train  # exit status 1 on problems
+    python backend/label_stats.py images D40 --min-boxes 2
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+CACHE_VERSION = 1
+SPLITS = ("train", "val")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+PARALLEL_MIN_FILES = 2000  # below this, a process pool costs more than it saves
+BATCH_FILES = 500
+EDGE_TOLERANCE = 1e-3  # boxes may poke this far past the image edge (rounding in converters)
+
+
+# ============================================================
+# PARSING
+# ============================================================
+
+def parse_label_file(path):
+    """(n, 5) float32 rows of class, cx, cy, w, h and a list of (line, problem)."""
+    rows, issues = [], []
+    with open(path, errors="replace") as f:
+        lines = f.read().splitlines()
+    for number, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) != 5:
+            issues.append((number, f"expected 5 values, got {len(parts)}"))
+            continue
+        try:
+            row = [float(p) for p in parts]
+        except ValueError:
+            issues.append((number, "not a number"))
+            continue
+        if not row[0].is_integer():
+            issues.append((number, f"class {parts[0]} is not an integer"))
+            continue
+        rows.append(row)
+    return np.array(rows, dtype=np.float32).reshape(-1, 5), issues
+
+
+def _parse_batch(paths):
+    return [parse_label_file(path) for path in paths]
+
+
+def parse_files(paths, workers=None):
+    """parse_label_file() over many files, on a process pool when there are enough of them."""
+    if len(paths) < PARALLEL_MIN_FILES or workers == 1:
+        return _parse_batch(paths)
+    batches = [paths[i:i + BATCH_FILES] for i in range(0, len(paths), BATCH_FILES)]
+    with ProcessPoolExecutor(workers) as pool:
+        return [parsed for batch in pool.map(_parse_batch, batches) for parsed in batch]
+
+
+def scan_labels(labels_dir):
+    """Sorted label file names with their mtime_ns and size."""
+    entries = []
+    with os.scandir(labels_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".txt") and entry.is_file():
+                st = entry.stat()
+                entries.append((entry.name, st.st_mtime_ns, st.st_size))
+    entries.sort()
+    names = np.array([e[0] for e in entries], dtype=str)
+    return names, np.array([e[1] for e in entries], dtype=np.int64), np.array([e[2] for e in entries], dtype=np.int64)
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class LabelCache:
+    """Parsed labels of one split (see the module docstring for the columns)."""
+
+    COLUMNS = ("names", "mtime_ns", "size", "offsets", "image_idx", "cls", "xywh")
+
+    def __init__(self, labels_dir, columns, issues):
+        self.labels_dir = labels_dir
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.issues = issues  # {file name: [[line, problem], ...]}
+        self.refreshed = {}
+
+    @property
+    def boxes_per_file(self):
+        return np.diff(self.offsets)
+
+    # ---------- stats ----------
+
+    def stats(self, class_names=None, input_size=640):
+        """Per-class box/image counts, box sizes (normalized, and in model-input pixels) and boxes per image."""
+        nc = max(len(class_names or ()), int(self.cls.max()) + 1 if len(self.cls) else 0)
+        cls = np.asarray(self.cls, dtype=np.int64)
+        valid = (cls >= 0) & (cls < nc)
+        boxes = np.bincount(cls[valid], minlength=nc)
+        pairs = np.unique(np.asarray(self.image_idx, dtype=np.int64)[valid] * nc + cls[valid])
+        images = np.bincount(pairs % nc, minlength=nc) if nc else np.zeros(0, dtype=np.int64)
+
+        w, h = self.xywh[:, 2], self.xywh[:, 3]
+        side = np.sqrt(np.clip(w * h, 0, None)) * input_size  # COCO-style size at the model input
+        size_class = np.digitize(side, (32, 96))  # 0 small, 1 medium, 2 large
+        per_file = self.boxes_per_file
+
+        def percentiles(values):
+            if not len(values):
+                return {}
+            p = np.percentile(values, (5, 50, 95))
+            return {"p5": round(float(p[0]), 4), "p50": round(float(p[1]), 4), "p95": round(float(p[2]), 4)}
+
+        classes = []
+        for c in range(nc):
+            mask = cls == c
+            classes.append({
+                "id": c,
+                "name": class_names[c] if class_names and c < len(class_names) else str(c),
+                "boxes": int(boxes[c]),
+                "images": int(images[c]),
+                "small": int(np.count_nonzero(size_class[mask] == 0)),
+                "medium": int(np.count_nonzero(size_class[mask] == 1)),
+                "large": int(np.count_nonzero(size_class[mask] == 2)),
+                "width": percentiles(w[mask]),
+                "height": percentiles(h[mask]),
+            })
+        return {
+            "files": len(self.names),
+            "boxes": len(self.cls),
+            "empty_files": int(np.count_nonzero(per_file == 0)),
+            "boxes_per_image": {"mean": round(float(per_file.mean()), 2) if len(per_file) else 0,
+                                "p95": float(np.percentile(per_file, 95)) if len(per_file) else 0,
+                                "max": int(per_file.max()) if len(per_file) else 0},
+            "aspect_ratio": percentiles(w / np.clip(h, 1e-9, None)),
+            "classes": classes,
+        }
+
+    # ---------- validation ----------
+
+    def validate(self, nc, images_dir=None):
+        """{file name: [problem, ...]} for malformed labels, plus images/labels without a partner."""
+        problems = defaultdict(list)
+        for name, issues in self.issues.items():
+            problems[name] += [f"line {line}: {problem}" for line, problem in issues]
+
+        def flag(mask, problem):
+            idx, counts = np.unique(self.image_idx[mask], return_counts=True)
+            for i, n in zip(idx, counts):
+                problems[str(self.names[i])].append(f"{n} box{'es' if n > 1 else ''} {problem}")
+
+        cx, cy, w, h = (self.xywh[:, i] for i in range(4))
+        t = EDGE_TOLERANCE
+        flag((self.cls < 0) | (self.cls >= nc), f"with a class outside 0..{nc - 1} (data.yaml nc={nc})")
+        flag((w <= 0) | (h <= 0), "with zero or negative size")
+        flag((cx < 0) | (cx > 1) | (cy < 0) | (cy > 1) | (w > 1 + t) | (h > 1 + t), "not normalized to 0..1")
+        flag((cx - w / 2 < -t) | (cx + w / 2 > 1 + t) | (cy - h / 2 < -t) | (cy + h / 2 > 1 + t),
+             "extending past the image edge")
+        if len(self.cls):
+            rows = np.column_stack([self.image_idx, self.cls, self.xywh]).astype(np.float32)
+            _, first, counts = np.unique(rows, axis=0, return_index=True, return_counts=True)
+            duplicated = np.zeros(len(rows), dtype=bool)
+            duplicated[first[counts > 1]] = True
+            flag(duplicated, "duplicated within the file")
+
+        if images_dir and os.path.isdir(images_dir):
+            images = {os.path.splitext(n)[0] for n in os.listdir(images_dir) if n.lower().endswith(IMAGE_EXTENSIONS)}
+            labels = {n[:-4] for n in self.names}
+            for stem in sorted(labels - images):
+                problems[stem + ".txt"].append("no matching image")
+            for stem in sorted(images - labels):
+                problems[stem + ".txt"].append("missing (image has no label file)")
+        return dict(sorted(problems.items()))
+
+    # ---------- queries ----------
+
+    def images_with(self, class_id, min_boxes=1):
+        """Label file stems containing at least `min_boxes` boxes of `class_id`."""
+        idx, counts = np.unique(self.image_idx[self.cls == class_id], return_counts=True)
+        return [str(self.names[i])[:-4] for i in idx[counts >= min_boxes]]
+
+
+def cache_dir_for(labels_dir):
+    return os.path.join(os.path.dirname(labels_dir), ".cache", os.path.basename(labels_dir))
+
+
+def _read_cache(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != CACHE_VERSION:
+            return None
+        columns = {name: np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="r")
+                   for name in LabelCache.COLUMNS}
+    except (OSError, ValueError):
+        return None
+    if len(columns["offsets"]) != len(columns["names"]) + 1 or int(columns["offsets"][-1]) != len(columns["cls"]):
+        return None  # torn write
+    return columns, meta.get("issues", {})
+
+
+def _write_cache(cache_dir, columns, issues):
+    """Write the columns to a fresh directory and swap it in."""
+    tmp, old = cache_dir + ".tmp", cache_dir + ".old"
+    for path in (tmp, old):
+        shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(tmp)
+    for name in LabelCache.COLUMNS:
+        np.save(os.path.join(tmp, name + ".npy"), columns[name])
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"version": CACHE_VERSION, "files": len(columns["names"]), "boxes": len(columns["cls"]),
+                   "issues": issues}, f)
+    if os.path.exists(cache_dir):
+        os.replace(cache_dir, old)
+    os.replace(tmp, cache_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def load(labels_dir, refresh=True, workers=None):
+    """
+    LabelCache for a labels directory, bringing the on-disk cache up to
+    date first unless refresh=False (and a cache exists). `.refreshed`
+    reports what was reparsed.
+    """
+    started = time.perf_counter()
+    cache_dir = cache_dir_for(labels_dir)
+    cached = _read_cache(cache_dir)
+    if cached and not refresh:
+        cache = LabelCache(labels_dir, *cached)
+        cache.refreshed = {"parsed": 0, "reused": len(cache.names), "removed": 0,
+                           "ms": round((time.perf_counter() - started) * 1000, 1), "checked": False}
+        return cache
+
+    names, mtimes, sizes = scan_labels(labels_dir)
+    keep = np.zeros(len(names), dtype=bool)
+    source = np.zeros(len(names), dtype=np.int64)
+    old_issues = {}
+    if cached:
+        old, old_issues = cached
+        old_names = np.asarray(old["names"])
+        if len(old_names):
+            pos = np.clip(np.searchsorted(old_names, names), 0, len(old_names) - 1)
+            keep = (old_names[pos] == names) & (np.asarray(old["mtime_ns"])[pos] == mtimes) & \
+                (np.asarray(old["size"])[pos] == sizes)
+            source = pos
+    removed = int(np.count_nonzero(~np.isin(np.asarray(cached[0]["names"]), names))) if cached else 0
+
+    if cached and keep.all() and not removed:
+        cache = LabelCache(labels_dir, *cached)
+    else:
+        parse = np.flatnonzero(~keep)
+        parsed = dict(zip(parse.tolist(), parse_files([os.path.join(labels_dir, names[i]) for i in parse], workers)))
+        counts = np.zeros(len(names), dtype=np.int64)
+        if cached:
+            old_offsets = np.asarray(old["offsets"])
+            counts[keep] = np.diff(old_offsets)[source[keep]]
+        for i, (rows, _) in parsed.items():
+            counts[i] = len(rows)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        cls = np.zeros(offsets[-1], dtype=np.int16)
+        xywh = np.zeros((offsets[-1], 4), dtype=np.float32)
+
+        # Rows of unchanged files are copied over from the old columns in one gather
+        if cached and keep.any():
+            lengths = counts[keep]
+            within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            src = np.repeat(old_offsets[source[keep]], lengths) + within
+            dst = np.repeat(offsets[:-1][keep], lengths) + within
+            cls[dst] = old["cls"][src]
+            xywh[dst] = old["xywh"][src]
+        issues = {}
+        for name, problems in old_issues.items():
+            i = np.searchsorted(names, name)
+            if i < len(names) and names[i] == name and keep[i]:
+                issues[name] = problems
+        for i, (rows, problems) in parsed.items():
+            cls[offsets[i]:offsets[i + 1]] = rows[:, 0]
+            xywh[offsets[i]:offsets[i + 1]] = rows[:, 1:]
+            if problems:
+                issues[str(names[i])] = problems
+        columns = {
+            "names": names, "mtime_ns": mtimes, "size": sizes, "offsets": offsets,
+            "image_idx": np.repeat(np.arange(len(names), dtype=np.int32), counts), "cls": cls, "xywh": xywh,
+        }
+        _write_cache(cache_dir, columns, issues)
+        cache = LabelCache(labels_dir, columns, issues)
+    cache.refreshed = {"parsed": int((~keep).sum()), "reused": int(keep.sum()), "removed": removed,
+                       "ms": round((time.perf_counter() - started) * 1000, 1), "checked": True}
+    return cache
+
+
+def load_classes(data_yaml):
+    """(nc, names) from a YOLOv5 data.yaml; names may be a list or an {id: name} mapping."""
+    import yaml
+
+    with open(data_yaml) as f:
+        config = yaml.safe_load(f)
+    names = config.get("names") or []
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names)]
+    return int(config.get("nc", len(names))), list(names)
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def print_stats(split, stats):
+    print(f"\n📊 {split}: {stats['files']:,} label files, {stats['boxes']:,} boxes, "
+          f"{stats['empty_files']:,} empty (background)")
+    per_image = stats["boxes_per_image"]
+    print(f"   boxes/image: mean {per_image['mean']}, p95 {per_image['p95']:.0f}, max {per_image['max']}; "
+          f"aspect w/h p50 {stats['aspect_ratio'].get('p50', '-')}")
+    print(f"   {'class':>10} | {'boxes':>7} | {'images':>7} | {'small':>6} | {'medium':>6} | {'large':>6} | "
+          f"{'w p5/p50/p95':>18} | {'h p5/p50/p95':>18}")
+    for c in stats["classes"]:
+        w, h = c["width"], c["height"]
+        widths = f"{w['p5']:.3f}/{w['p50']:.3f}/{w['p95']:.3f}" if w else "-"
+        heights = f"{h['p5']:.3f}/{h['p50']:.3f}/{h['p95']:.3f}" if h else "-"
+        print(f"   {c['name']:>10} | {c['boxes']:>7,} | {c['images']:>7,} | {c['small']:>6,} | {c['medium']:>6,} | "
+              f"{c['large']:>6,} | {widths:>18} | {heights:>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Label statistics and validation (cached)")
+    parser.add_argument("command", choices=("stats", "validate", "images", "build"))
+    parser.add_argument("damage_class", nargs="?", help="For `images`: class name (e.g. D40) or id")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--data-yaml", help="Default: <data-dir>/data.yaml")
+    parser.add_argument("--split", default=",".join(SPLITS), help="Comma-separated splits")
+    parser.add_argument("--min-boxes", type=int, default=1, help="For `images`: boxes of the class per image")
+    parser.add_argument("--input-size", type=int, default=640, help="Model input size for small/medium/large")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--no-refresh", action="store_true", help="Trust the cache without checking mtimes")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of tables")
+    args = parser.parse_args()
+
+    data_yaml = args.data_yaml or os.path.join(args.data_dir, "data.yaml")
+    nc, class_names = load_classes(data_yaml) if os.path.exists(data_yaml) else (None, [])
+    output, failed = {}, False
+
+    for split in args.split.split(","):
+        labels_dir = os.path.join(args.data_dir, "labels", split)
+        if not os.path.isdir(labels_dir):
+            print(f"⚠️  No labels in {labels_dir}", file=sys.stderr)
+            continue
+        cache = load(labels_dir, refresh=not args.no_refresh, workers=args.workers)
+        started = time.perf_counter()
+        r = cache.refreshed
+        if not args.json:
+            print(f"📂 {split}: cache {'checked' if r['checked'] else 'trusted'} in {r['ms']:.0f} ms "
+                  f"({r['parsed']:,} parsed, {r['reused']:,} reused, {r['removed']:,} removed)")
+
+        if args.command == "stats":
+            result = cache.stats(class_names, args.input_size)
+            if not args.json:
+                print_stats(split, result)
+        elif args.command == "validate":
+            if nc is None:
+                parser.error(f"{data_yaml} not found (needed for nc)")
+            result = cache.validate(nc, os.path.join(args.data_dir, "images", split))
+            failed |= bool(result)
+            if not args.json:
+                print(f"{'❌' if result else '✅'} {split}: {len(result):,} files with problems")
+                for name, problems in list(result.items())[:50]:
+                    print(f"   {name}: {'; '.join(problems)}")
+                if len(result) > 50:
+                    print(f"   ... and {len(result) - 50:,} more (--json for all)")
+        elif args.command == "images":
+            if not args.damage_class:
+                parser.error("images needs a class name or id")
+            if args.damage_class in class_names:
+                class_id = class_names.index(args.damage_class)
+            elif args.damage_class.isdigit():
+                class_id = int(args.damage_class)
+            else:
+                parser.error(f"unknown class {args.damage_class} (data.yaml names: {', '.join(class_names)})")
+            result = cache.images_with(class_id, args.min_boxes)
+            if not args.json:
+                print("\n".join(result))
+        else:
+            result = r
+        output[split] = result
+        if not args.json:
+            print(f"   ({(time.perf_counter() - started) * 1000:.1f} ms)", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(output, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
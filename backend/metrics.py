@@ -0,0 +1,442 @@
+"""
+Metrics and Sampling Profiler
+Minimal Prometheus instrumentation (counters, gauges, histograms rendered
+in the text exposition format) and an opt-in sampling profiler that
+records folded stacks for flame graphs.
+
+serve.py runs several worker processes behind one port, so a scrape of
+/metrics reaches only one of them. With a shared directory (METRICS_DIR,
+set up by serve.py), every process writes a snapshot of its metrics there
+every few seconds and the process answering the scrape merges the
+snapshots of all live processes: counters and histograms are summed;
+gauges are merged as each one declares (a `pid` label per process, or the
+max/min over processes for levels and flags). Without a directory
+(python app.py) only the own process is reported.
+
+The profiler samples every thread's stack with sys._current_frames() at a
+fixed interval. Started through the shared directory, it runs in every
+worker at once; the folded output (`thread;frame;frame count` per line)
+feeds flamegraph.pl or speedscope directly.
+"""
+
+import bisect
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ============================================================
+# METRICS
+# ============================================================
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def state(self):
+        with self._lock:
+            return [[list(key), value if not isinstance(value, list) else list(value)]
+                    for key, value in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """Mirror a total counted elsewhere (from a collector)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Metric):
+    """
+    `merge` says how the processes' values combine in a scrape: "pid" keeps
+    one series per process (a `pid` label is added unless there is one),
+    "max" / "min" report the highest / lowest value.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), merge="pid"):
+        if merge not in ("pid", "max", "min"):
+            raise ValueError(f"Unknown gauge merge {merge!r}")
+        super().__init__(name, help, labelnames)
+        self.merge = merge
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Per label set: [count per bucket..., count above the last bucket, sum, count]."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 3)
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+
+class Registry:
+    """The process's metrics, plus collectors that refresh gauges before each snapshot."""
+
+    def __init__(self, directory=None, interval=5.0):
+        self.directory = directory
+        self.interval = interval
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.profiler = SamplingProfiler()
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), merge="pid"):
+        return self._add(Gauge(name, help, labelnames, merge))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn):
+        """Register `fn()` to be called before each snapshot (usable as a decorator)."""
+        self._collectors.append(fn)
+        return fn
+
+    def snapshot(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"⚠️  Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+        return {
+            name: {"kind": m.kind, "help": m.help, "labelnames": list(m.labelnames),
+                   "buckets": list(getattr(m, "buckets", ())), "merge": getattr(m, "merge", None),
+                   "values": m.state()}
+            for name, m in self._metrics.items()
+        }
+
+    # --------------------------------------------------------
+    # Shared directory (one snapshot file per process)
+    # --------------------------------------------------------
+
+    def ensure_started(self):
+        """Start the snapshot / profiler-control thread in this process (restarted after fork)."""
+        if not self.directory:
+            return
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != pid:
+                for metric in self._metrics.values():
+                    metric.reset()  # counts inherited through fork() are not this process's
+                self.profiler = SamplingProfiler()
+            self._pid = pid
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+            self._thread.start()
+
+    def _write(self, suffix, text):
+        path = os.path.join(self.directory, f"{os.getpid()}.{suffix}")
+        with open(f"{path}.tmp", "w") as f:
+            f.write(text)
+        os.replace(f"{path}.tmp", path)
+
+    def _run(self):
+        last_snapshot = 0.0
+        while True:
+            try:
+                self._sync_profiler()
+                if time.monotonic() - last_snapshot >= self.interval:
+                    self._write("json", json.dumps(self.snapshot()))
+                    last_snapshot = time.monotonic()
+            except Exception as e:
+                print(f"⚠️  Metrics snapshot failed: {e}")
+            time.sleep(min(1.0, self.interval))
+
+    def _live_files(self, suffix):
+        """Files of live processes; those of exited workers are removed."""
+        paths = []
+        for path in glob.glob(os.path.join(self.directory, f"*.{suffix}")):
+            try:
+                pid = int(os.path.basename(path).split(".")[0])
+                os.kill(pid, 0)
+            except (ValueError, ProcessLookupError):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            paths.append(path)
+        return paths
+
+    def gather(self):
+        """[(pid, snapshot)] of every live process (this one freshly taken)."""
+        own = (os.getpid(), self.snapshot())
+        if not self.directory:
+            return [own]
+        self.ensure_started()
+        snapshots = [own]
+        own_name = f"{os.getpid()}.json"
+        for path in self._live_files("json"):
+            if os.path.basename(path) == own_name:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append((int(os.path.basename(path).split(".")[0]), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Prometheus text exposition of the merged snapshots."""
+        merged = {}
+        for pid, snapshot in self.gather():
+            for name, metric in snapshot.items():
+                merge = (metric.get("merge") or "pid") if metric["kind"] == "gauge" else None
+                add_pid = merge == "pid" and "pid" not in metric["labelnames"]
+                target = merged.setdefault(name, {**metric, "values": {}})
+                if add_pid:
+                    target["labelnames"] = [*metric["labelnames"], "pid"]
+                for key, value in metric["values"]:
+                    key = (*key, str(pid)) if add_pid else tuple(key)
+                    current = target["values"].get(key)
+                    if current is None:
+                        target["values"][key] = value
+                    elif isinstance(value, list):
+                        target["values"][key] = [a + b for a, b in zip(current, value)]
+                    elif merge == "max":
+                        target["values"][key] = max(current, value)
+                    elif merge == "min":
+                        target["values"][key] = min(current, value)
+                    else:
+                        target["values"][key] = current + value  # counters (pid gauges never collide)
+
+        lines = []
+        for name, metric in merged.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            names = metric["labelnames"]
+            for key, value in sorted(metric["values"].items()):
+                if metric["kind"] != "histogram":
+                    lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip([*metric["buckets"], float("inf")], value[:-2]):
+                    cumulative += count
+                    le = 'le="%s"' % _number(bound)
+                    lines.append(f"{name}_bucket{_labels(names, key, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, key)} {_number(float(value[-2]))}")
+                lines.append(f"{name}_count{_labels(names, key)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+    # --------------------------------------------------------
+    # Profiler control
+    # --------------------------------------------------------
+
+    def start_profiler(self, seconds=30.0, interval=0.01):
+        """Profile for `seconds` (in every process sharing the directory)."""
+        control = {"started": time.time(), "until": time.time() + seconds, "interval": interval}
+        if not self.directory:
+            self.profiler.start(interval, seconds)
+            return control
+        self.ensure_started()
+        with open(os.path.join(self.directory, "profiler.tmp"), "w") as f:
+            json.dump(control, f)
+        os.replace(os.path.join(self.directory, "profiler.tmp"), os.path.join(self.directory, "profiler.control"))
+        self._sync_profiler()
+        return control
+
+    def stop_profiler(self):
+        if self.directory:
+            try:
+                os.remove(os.path.join(self.directory, "profiler.control"))
+            except FileNotFoundError:
+                pass
+            self._sync_profiler()
+        else:
+            self.profiler.stop()
+
+    def _sync_profiler(self):
+        """Follow the control file: start, stop, and publish this process's samples."""
+        try:
+            with open(os.path.join(self.directory, "profiler.control")) as f:
+                control = json.load(f)
+        except (OSError, ValueError):
+            control = None
+        profiler = self.profiler
+        if control and time.time() < control["until"]:
+            if profiler.session != control["started"]:
+                profiler.start(control["interval"], control["until"] - time.time(), session=control["started"])
+        elif profiler.running:
+            profiler.stop()
+        if profiler.running or profiler.dirty:
+            self._write("folded", profiler.folded())
+            profiler.dirty = profiler.running
+
+    def profile(self):
+        """{"running", "samples", "folded"} merged over every live process."""
+        if not self.directory:
+            return {"running": self.profiler.running, "samples": self.profiler.samples,
+                    "folded": self.profiler.folded()}
+        self._sync_profiler()
+        tally = _Tally()
+        for path in self._live_files("folded"):
+            try:
+                with open(path) as f:
+                    for line in f:
+                        stack, _, count = line.rstrip("\n").rpartition(" ")
+                        if stack:
+                            tally[stack] += int(count)
+            except (OSError, ValueError):
+                continue
+        return {"running": self.profiler.running, "samples": sum(tally.values()),
+                "folded": "".join(f"{stack} {count}\n" for stack, count in tally.most_common())}
+
+
+# ============================================================
+# SAMPLING PROFILER
+# ============================================================
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all other threads every `interval` seconds on a
+    background thread and counts identical stacks. Overhead is roughly
+    one stack walk per thread per sample; 10 ms is fine under load.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stacks = _Tally()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.session = None
+        self.dirty = False
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.01, seconds=None, session=None):
+        """(Re)start with empty counts; stops by itself after `seconds`."""
+        self.stop()
+        with self._lock:
+            self._stacks = _Tally()
+            self.samples = 0
+        self.session = session
+        self._stop = threading.Event()
+        deadline = time.monotonic() + seconds if seconds else None
+        self._thread = threading.Thread(target=self._run, args=(interval, deadline, self._stop),
+                                        name="sampling-profiler", daemon=True)
+        self._thread.start()
+        self.dirty = True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+    def folded(self):
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def _run(self, interval, deadline, stop):
+        own = threading.get_ident()
+        while not stop.wait(interval):
+            if deadline and time.monotonic() > deadline:
+                return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                parts.append(names.get(ident, f"thread-{ident}"))
+                stacks.append(";".join(reversed(parts)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+
+def process_memory():
+    """(resident set size, peak RSS) of this process in bytes."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        rss = peak  # no /proc (macOS): peak is the best available figure
+    return rss, peak
@@ -0,0 +1,250 @@
+"""
+Local Model Registry
+Resolves detector weights from backend/models/ and builds the YOLOv5
+network from a local YOLOv5 source tree instead of torch.hub, so the
+server starts offline and without fetching the hub repo. Loading runs on
+a background thread, so the HTTP port is up before the model is ready.
+
+Weights are resolved in this order (first match wins):
+    $MODEL_PATH
+    models/best.torchscript   pre-traced TorchScript (fastest cold start)
+    models/best.onnx          exported ONNX graph (needs onnxruntime)
+    models/best.pt            trained PyTorch checkpoint
+    models/yolov5s.pt         stock YOLOv5s fallback
+
+The YOLOv5 source is looked up in $YOLOV5_DIR, backend/yolov5 (a git
+clone) and the torch.hub cache. Without one, torch.hub is used as a last
+resort (needs network on first start).
+
+With INFERENCE_BACKEND=onnx or onnx-int8 the registry serves an ONNX
+Runtime session over models/best.onnx / models/best.int8.onnx instead
+(see inference.py); torch is then not imported at all. INFERENCE_BACKEND=stub
+serves a stand-in detector instead of a model (STUB_BOXES boxes per image
+after STUB_BATCH_MS + STUB_IMAGE_MS per image), for benchmarks.
+
+Export a pre-traced artifact once with:
+    python model_registry.py --export torchscript
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import inference
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+
+ARTIFACTS = ["best.torchscript", "best.onnx", "best.pt", "yolov5s.pt"]
+IMPORTED_AT = time.perf_counter()
+
+
+def find_yolov5_source():
+    """Directory containing YOLOv5's models/common.py, or None."""
+    candidates = [
+        os.environ.get("YOLOV5_DIR"),
+        os.path.join(BASE_DIR, "yolov5"),
+        os.path.join(os.environ.get("TORCH_HOME", os.path.expanduser("~/.cache/torch")), "hub", "ultralytics_yolov5_master"),
+    ]
+    for path in candidates:
+        if path and os.path.isfile(os.path.join(path, "models", "common.py")):
+            return path
+    return None
+
+
+def resolve_weights(models_dir=MODELS_DIR):
+    """Path of the weights to load, or None when nothing is available locally."""
+    explicit = os.environ.get("MODEL_PATH")
+    if explicit:
+        return explicit
+    for name in ARTIFACTS:
+        path = os.path.join(models_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class ModelRegistry:
+    """
+    Loads the detector once and hands it out to request handlers.
+
+    `load_async()` starts loading in the background; `get()` blocks until
+    the backend is ready; `status()` reports progress for the health check.
+    `get()` returns an inference backend (see inference.py), and
+    `configure(backend)` is applied once after loading (thresholds etc.).
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, configure=None, source=None, backend=None):
+        self.models_dir = models_dir
+        self.configure = configure
+        self.source = source or os.environ.get("MODEL_SOURCE", "auto")  # auto | local | hub
+        self.backend = backend or os.environ.get("INFERENCE_BACKEND", "torch")
+        if self.backend not in inference.BACKENDS:
+            raise ValueError(f"INFERENCE_BACKEND must be one of {', '.join(inference.BACKENDS)}")
+        if self.backend == "torch":
+            self.weights = resolve_weights(models_dir)
+        elif self.backend == "stub":
+            self.weights = None
+        else:
+            self.weights = inference.onnx_path(self.backend, models_dir)
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._model = None
+        self._error = None
+        self._state = "idle"
+        self._loader = None
+        self._load_seconds = None
+        self._ready_after_import = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set() and self._model is not None
+
+    def load_async(self):
+        """Start loading on a background thread (no-op if already started)."""
+        with self._lock:
+            if self._state != "idle":
+                return
+            self._state = "loading"
+            self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+            self._thread.start()
+
+    def load(self):
+        """Load synchronously (or wait for the background load) and return the model."""
+        with self._lock:
+            start_here = self._state == "idle"
+            if start_here:
+                self._state = "loading"
+        if start_here:
+            self._load()
+        return self.get()
+
+    def get(self, timeout=None):
+        """The loaded model. Raises RuntimeError if loading failed or timed out."""
+        if not self._ready.wait(timeout):
+            raise RuntimeError("Model is still loading")
+        if self._model is None:
+            raise RuntimeError(f"Model failed to load: {self._error}")
+        return self._model
+
+    def status(self):
+        return {
+            "state": self._state,
+            "backend": self.backend,
+            "weights": os.path.basename(self.weights) if self.weights else None,
+            "loader": self._loader,
+            "load_seconds": self._load_seconds,
+            "ready_after_import_seconds": self._ready_after_import,
+            "error": self._error,
+        }
+
+    # --------------------------------------------------------
+    # Loading
+    # --------------------------------------------------------
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            model = self._build()
+            if self.configure:
+                self.configure(model)
+            self._model = model
+            self._state = "ready"
+            print(f"✅ Model loaded in {time.perf_counter() - started:.1f}s ({self._loader})")
+        except Exception as e:
+            self._error = str(e)
+            self._state = "failed"
+            print(f"❌ Model failed to load: {e}")
+        finally:
+            finished = time.perf_counter()
+            self._load_seconds = round(finished - started, 3)
+            self._ready_after_import = round(finished - IMPORTED_AT, 3)
+            self._ready.set()
+
+    def _build(self):
+        if self.backend == "stub":
+            self._loader = "stub"
+            return inference.StubBackend(boxes=int(os.environ.get("STUB_BOXES", 3)),
+                                         batch_ms=float(os.environ.get("STUB_BATCH_MS", 20)),
+                                         image_ms=float(os.environ.get("STUB_IMAGE_MS", 10)))
+        if self.backend != "torch":
+            if not os.path.exists(self.weights):
+                raise RuntimeError(f"{self.weights} not found (see: python inference.py --help)")
+            self._loader = f"onnxruntime:{os.path.basename(self.weights)}"
+            return inference.OnnxBackend(self.weights, name=self.backend)
+        return inference.TorchBackend(self._build_torch())
+
+    def _build_torch(self):
+        source = find_yolov5_source() if self.source != "hub" else None
+        if source is None and self.source == "local":
+            raise RuntimeError("No local YOLOv5 source found (set YOLOV5_DIR or clone it into backend/yolov5)")
+        if source is not None and self.weights is not None:
+            return self._build_local(source)
+        return self._build_hub()
+
+    def _build_local(self, source):
+        """AutoShape(DetectMultiBackend(weights)) — what torch.hub's hubconf does, minus the hub."""
+        if source not in sys.path:
+            sys.path.insert(0, source)
+        from models.common import AutoShape, DetectMultiBackend
+        from utils.torch_utils import select_device
+
+        device = select_device(os.environ.get("MODEL_DEVICE", ""))
+        backend = DetectMultiBackend(self.weights, device=device, fuse=True)
+        self._loader = f"local:{os.path.basename(self.weights)}"
+        return AutoShape(backend)
+
+    def _build_hub(self):
+        import torch
+
+        if self.weights and os.path.basename(self.weights) != "yolov5s.pt":
+            print(f"⚠️  No local YOLOv5 source; loading {self.weights} through torch.hub")
+            self._loader = "hub:custom"
+            return torch.hub.load("ultralytics/yolov5", "custom", path=self.weights, force_reload=False)
+        print("⚠️  No custom model found at models/best.pt")
+        print("   Using default YOLOv5s. Train your model first for road damage detection.")
+        self._loader = "hub:yolov5s"
+        return torch.hub.load("ultralytics/yolov5", "yolov5s", force_reload=False)
+
+
+# ============================================================
+# EXPORT CLI
+# ============================================================
+
+def export(fmt, weights=None, imgsz=640):
+    """Export best.pt to a pre-traced artifact next to it, using YOLOv5's export.py."""
+    source = find_yolov5_source()
+    if source is None:
+        raise SystemExit("❌ No local YOLOv5 source found (set YOLOV5_DIR or clone it into backend/yolov5)")
+    weights = weights or os.path.join(MODELS_DIR, "best.pt")
+    if not os.path.exists(weights):
+        raise SystemExit(f"❌ Weights not found: {weights}")
+    sys.path.insert(0, source)
+    import export as yolov5_export
+
+    # ONNX gets a dynamic batch axis so micro-batches run as one call
+    yolov5_export.run(weights=weights, include=(fmt,), imgsz=(imgsz, imgsz), device="cpu", dynamic=fmt == "onnx")
+    print(f"✅ Exported {fmt} artifact next to {weights}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local model registry")
+    parser.add_argument("--export", choices=["torchscript", "onnx"], help="Export best.pt to this format")
+    parser.add_argument("--weights", help="Weights to export (default: models/best.pt)")
+    parser.add_argument("--imgsz", type=int, default=640, help="Export input size")
+    args = parser.parse_args()
+
+    if args.export:
+        export(args.export, args.weights, args.imgsz)
+    else:
+        print(f"📂 Models dir: {MODELS_DIR}")
+        print(f"🧠 Weights:    {resolve_weights() or 'none (torch.hub yolov5s fallback)'}")
+        print(f"📦 YOLOv5 src: {find_yolov5_source() or 'none (torch.hub fallback)'}")
+
+
+if __name__ == "__main__":
+    main()
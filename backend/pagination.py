@@ -0,0 +1,25 @@
+"""
+History Pagination Helpers
+Opaque keyset cursors over (timestamp, id), so fetching page N costs the
+same as page 1.
+"""
+
+import base64
+import datetime
+
+
+def encode_cursor(timestamp, record_id):
+    """Opaque cursor pointing just past the record (timestamp, id)."""
+    raw = f"{timestamp.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(). Raises ValueError on malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, record_id = raw.split("|", 1)
+        return datetime.datetime.fromisoformat(timestamp), record_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
@@ -0,0 +1,188 @@
+"""
+Asynchronous Image Persistence
+Bounded background writer pool that stores uploaded frames on disk off
+the /detect request path.
+"""
+
+import io
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from PIL import Image
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+JPEG_QUALITY = 85
+
+
+def is_jpeg(data):
+    return data[:3] == JPEG_MAGIC
+
+
+def encode_for_storage(data):
+    """Return bytes to store: the original JPEG as-is, anything else re-encoded to JPEG."""
+    if is_jpeg(data):
+        return data
+    buffer = io.BytesIO()
+    Image.open(io.BytesIO(data)).convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+def write_atomic(path, data):
+    """Write via a temp file + rename so readers never see a partial image."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ImageWriter:
+    """
+    Writes uploads to disk on a pool of worker threads.
+
+    The queue is bounded: when it is full, `submit()` waits up to
+    `put_timeout` seconds for space (backpressure) and then falls back to
+    writing inline, so frames are never dropped. Queued images can be
+    read back with `pending()` until they reach the disk. `write(path,
+    data)` stores one image (a file by default; ImageStore.write for the
+    image store). `on_write`, if given, is called with the seconds each
+    stored image took.
+    """
+
+    def __init__(self, workers=2, max_queue=256, put_timeout=1.0, latency_window=1024, on_write=None,
+                 write=write_atomic):
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.put_timeout = put_timeout
+        self.on_write = on_write
+        self.write = write
+
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._stopping = False
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._pending = {}
+        self._latencies = deque(maxlen=latency_window)
+        self._written = 0
+        self._bytes = 0
+        self._inline = 0
+        self._errors = 0
+
+    # --------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------
+
+    def submit(self, path, data):
+        """Queue `data` to be stored at `path`. Blocks briefly if the queue is full."""
+        self._ensure_workers()
+        with self._lock:
+            self._pending[os.path.basename(path)] = data
+        try:
+            self._queue.put((path, data), timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._inline += 1
+            self._write(path, data)
+
+    def pending(self, filename):
+        """Bytes of an image that is still queued, or None once it is on disk."""
+        with self._lock:
+            return self._pending.get(filename)
+
+    def flush(self):
+        """Block until every queued image has been written."""
+        if self._threads:
+            self._queue.join()
+
+    def shutdown(self):
+        """Flush the queue and stop the workers (registered with atexit)."""
+        self.flush()
+        self._stopping = True
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            written, written_bytes, inline, errors = self._written, self._bytes, self._inline, self._errors
+
+        def percentile(p):
+            if not latencies:
+                return 0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self.max_queue,
+            "written": written,
+            "bytes_written": written_bytes,
+            "inline_writes": inline,
+            "errors": errors,
+            "write_ms_avg": round(sum(latencies) / len(latencies), 2) if latencies else 0,
+            "write_ms_p50": percentile(0.50),
+            "write_ms_p99": percentile(0.99),
+            "write_ms_max": round(latencies[-1], 2) if latencies else 0,
+        }
+
+    # --------------------------------------------------------
+    # Workers
+    # --------------------------------------------------------
+
+    def _ensure_workers(self):
+        # Restart the pool in forked children (threads do not survive fork).
+        pid = os.getpid()
+        if self._pid == pid and self._threads:
+            return
+        with self._lock:
+            if self._pid == pid and self._threads:
+                return
+            if self._pid is not None and self._pid != pid:
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._pending = {}
+            self._pid = pid
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._run, name=f"image-writer-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                path, data = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping:
+                    return
+                continue
+            try:
+                self._write(path, data)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path, data):
+        started = time.perf_counter()
+        try:
+            payload = encode_for_storage(data)
+            self.write(path, payload)
+        except Exception as e:
+            print(f"❌ Failed to store {path}: {e}")
+            with self._lock:
+                self._errors += 1
+            return
+        finally:
+            with self._lock:
+                self._pending.pop(os.path.basename(path), None)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._written += 1
+            self._bytes += len(payload)
+            self._latencies.append(elapsed * 1000)
+        if self.on_write:
+            self.on_write(elapsed)
@@ -0,0 +1,107 @@
+"""
+Vectorized Detection Post-Processing
+Turns the raw YOLOv5 prediction array (x1, y1, x2, y2, confidence, class)
+into the /detect JSON payload and Detection rows in bulk, without pandas.
+"""
+
+import numpy as np
+
+UNKNOWN_COLOR = "#999999"
+UNKNOWN_SEVERITY = "unknown"
+
+
+class LabelTable:
+    """
+    Precomputed class-id -> label lookup built from DAMAGE_LABELS.
+    Class ids the model knows but DAMAGE_LABELS does not get the same
+    fallback entry the per-row code used ("D<id>", grey, unknown severity).
+    """
+
+    def __init__(self, damage_labels, model_names=None):
+        if isinstance(model_names, (list, tuple)):
+            model_names = dict(enumerate(model_names))
+        model_names = dict(model_names or {})
+        size = max([*damage_labels.keys(), *model_names.keys(), -1]) + 1
+        self.model_names = model_names
+        self.entries = [self._entry(i, damage_labels, model_names) for i in range(size)]
+
+    @staticmethod
+    def _entry(class_id, damage_labels, model_names):
+        info = damage_labels.get(class_id, {
+            "code": f"D{class_id}",
+            "name": model_names.get(class_id, f"Class {class_id}"),
+            "color": UNKNOWN_COLOR,
+            "severity": UNKNOWN_SEVERITY,
+        })
+        return {
+            "damage_type": info["name"],
+            "damage_code": info["code"],
+            "color": info["color"],
+            "severity": info["severity"],
+        }
+
+    def get(self, class_id):
+        if 0 <= class_id < len(self.entries):
+            return self.entries[class_id]
+        return self._entry(class_id, {}, self.model_names)
+
+
+def as_prediction_array(pred):
+    """Accept a torch tensor or array-like of shape (n, 6) and return a float64 view."""
+    if hasattr(pred, "cpu"):
+        pred = pred.cpu().numpy()  # no copy for CPU tensors
+    pred = np.asarray(pred)
+    if pred.size == 0:
+        return np.empty((0, 6), dtype=np.float64)
+    return pred.reshape(-1, pred.shape[-1])[:, :6].astype(np.float64, copy=False)
+
+
+def postprocess(pred, labels, **row_fields):
+    """
+    Build the JSON detections and Detection row dicts for one image.
+
+    Args:
+        pred: (n, 6) array of x1, y1, x2, y2, confidence, class
+        labels: LabelTable
+        **row_fields: extra columns copied onto every row
+                      (latitude, longitude, image_filename, ...)
+
+    Returns:
+        (detections, rows) — `detections` matches the /detect response
+        format; `rows` are ready for a bulk INSERT into Detection.
+    """
+    pred = as_prediction_array(pred)
+    if len(pred) == 0:
+        return [], []
+
+    raw_boxes = pred[:, :4].tolist()
+    raw_conf = pred[:, 4].tolist()
+    boxes = np.round(pred[:, :4], 2).tolist()
+    conf = np.round(pred[:, 4], 4).tolist()
+    info = [labels.get(c) for c in pred[:, 5].astype(np.int64).tolist()]
+
+    detections = [
+        {
+            "damage_type": i["damage_type"],
+            "damage_code": i["damage_code"],
+            "confidence": c,
+            "color": i["color"],
+            "severity": i["severity"],
+            "bbox": {"x1": b[0], "y1": b[1], "x2": b[2], "y2": b[3]},
+        }
+        for i, c, b in zip(info, conf, boxes)
+    ]
+    rows = [
+        {
+            **row_fields,
+            "damage_type": i["damage_type"],
+            "damage_code": i["damage_code"],
+            "confidence": c,
+            "bbox_x1": b[0],
+            "bbox_y1": b[1],
+            "bbox_x2": b[2],
+            "bbox_y2": b[3],
+        }
+        for i, c, b in zip(info, raw_conf, raw_boxes)
+    ]
+    return detections, rows
@@ -0,0 +1,113 @@
+"""
+Frame Preprocessing
+Decodes uploads close to the model's input size and letterboxes them into
+a reusable buffer, instead of decoding every phone photo at full
+resolution and letting the model shrink it.
+
+JPEGs are decoded with libjpeg's DCT scaling (PIL's draft mode), which
+produces a 1/2, 1/4 or 1/8 size image directly — a 12 MP photo decodes
+to ~0.75 MP for a 640 px model, in a fraction of the time and memory.
+Boxes predicted on the letterboxed frame are mapped back to the
+coordinates of the original upload with `Frame.restore()`. For sliced
+inference (slicing.py) the frame also keeps the decoded image itself.
+"""
+
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+LETTERBOX_FILL = 114
+
+_local = threading.local()
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeds the configured pixel limit."""
+
+
+class Frame:
+    """A decoded, letterboxed upload and the transform back to original pixels."""
+
+    __slots__ = ("array", "width", "height", "ratio", "pad_x", "pad_y", "scale_x", "scale_y", "source")
+
+    def __init__(self, array, width, height, ratio, pad_x, pad_y, scale_x, scale_y, source=None):
+        self.array = array  # size x size x 3 RGB uint8 (a per-thread buffer, see letterbox())
+        self.width = width  # original upload size
+        self.height = height
+        self.ratio = ratio  # decoded -> letterbox scale
+        self.pad_x = pad_x
+        self.pad_y = pad_y
+        self.scale_x = scale_x  # original / decoded size
+        self.scale_y = scale_y
+        self.source = source  # decoded RGB array the tiles are cut from (sliced inference), else None
+
+    def restore(self, pred):
+        """Map (n, 6) boxes from letterbox pixels to original-image pixels (in place)."""
+        pred[:, [0, 2]] = ((pred[:, [0, 2]] - self.pad_x) * (self.scale_x / self.ratio)).clip(0, self.width)
+        pred[:, [1, 3]] = ((pred[:, [1, 3]] - self.pad_y) * (self.scale_y / self.ratio)).clip(0, self.height)
+        return pred
+
+
+def decode(image_bytes, size=640, max_pixels=None):
+    """
+    Decode an upload to RGB at no less than `size` on its longest side
+    (using reduced-size JPEG decoding when possible; size None decodes
+    at full resolution). Returns
+    (image, original (width, height)). Raises UploadTooLarge if the image
+    has more than `max_pixels` pixels.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise UploadTooLarge(f"Image is {width}x{height}; the limit is {max_pixels / 1e6:g} MP")
+
+    # draft() picks the smallest DCT scale that still covers the requested
+    # box, so both sides stay >= size * side / longest side
+    longest = max(width, height)
+    if image.format == "JPEG" and size and longest > size:
+        image.draft("RGB", (width * size // longest, height * size // longest))
+    return image.convert("RGB"), (width, height)
+
+
+def letterbox(image, size=640):
+    """
+    Resize keeping aspect ratio into a size x size canvas padded with grey.
+    The canvas is a per-thread buffer reused across calls: the returned
+    array is only valid until the same thread calls letterbox() again.
+    Returns (array, ratio, pad_x, pad_y).
+    """
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or buffer.shape[0] != size:
+        buffer = _local.buffer = np.empty((size, size, 3), dtype=np.uint8)
+
+    ratio = min(size / image.width, size / image.height)
+    new_w, new_h = max(1, round(image.width * ratio)), max(1, round(image.height * ratio))
+    if (new_w, new_h) != image.size:
+        image = image.resize((new_w, new_h), Image.BILINEAR, reducing_gap=3.0)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+
+    buffer.fill(LETTERBOX_FILL)
+    buffer[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = np.asarray(image)
+    return buffer, ratio, pad_x, pad_y
+
+
+def to_frame(image, width, height, size=640, keep_source=False):
+    """Letterbox a decoded image of a width x height upload into a Frame."""
+    array, ratio, pad_x, pad_y = letterbox(image, size)
+    return Frame(array, width, height, ratio, pad_x, pad_y, width / image.width, height / image.height,
+                 np.asarray(image) if keep_source else None)
+
+
+def prepare(image_bytes, size=640, max_pixels=None, source_size=None):
+    """
+    decode() + letterbox(): the Frame the detector runs on. With
+    `source_size` (sliced inference) the image is decoded at that size
+    instead (0: full resolution) and kept as `Frame.source`.
+    """
+    if source_size is None:
+        image, (width, height) = decode(image_bytes, size, max_pixels)
+        return to_frame(image, width, height, size)
+    image, (width, height) = decode(image_bytes, source_size or None, max_pixels)
+    return to_frame(image, width, height, size, keep_source=True)
@@ -0,0 +1,135 @@
+"""
+Detection Rollups
+Summary tables kept up to date by SQLite triggers on every insert, update
+and delete of a Detection, so /history/stats never scans the detection
+table:
+
+    detection_totals   one row per damage code (count, confidence sum)
+    detection_rollup   per day x damage code x map cell, for time-window
+                       and bounding-box filtered stats
+
+A map cell is the zoom-16 Web-Mercator tile (~600 m) of the detection,
+i.e. `quadkey >> 16`; detections without GPS use cell -1.
+"""
+
+from sqlalchemy import and_, func, or_, select, text
+
+import spatial
+
+ROLLUP_ZOOM = 16
+ROLLUP_SHIFT = 2 * (spatial.MAX_ZOOM - ROLLUP_ZOOM)
+NO_CELL = -1
+
+_DAY = "COALESCE(substr({row}.timestamp, 1, 10), '')"
+_CELL = f"COALESCE({{row}}.quadkey >> {ROLLUP_SHIFT}, {NO_CELL})"
+
+
+def _add(row):
+    day, cell = _DAY.format(row=row), _CELL.format(row=row)
+    return f"""
+    INSERT INTO detection_rollup (day, damage_code, cell, count, confidence_sum)
+    VALUES ({day}, {row}.damage_code, {cell}, 1, {row}.confidence)
+    ON CONFLICT (day, damage_code, cell) DO UPDATE
+        SET count = count + 1, confidence_sum = confidence_sum + excluded.confidence_sum;
+    INSERT INTO detection_totals (damage_code, count, confidence_sum)
+    VALUES ({row}.damage_code, 1, {row}.confidence)
+    ON CONFLICT (damage_code) DO UPDATE
+        SET count = count + 1, confidence_sum = confidence_sum + excluded.confidence_sum;"""
+
+
+def _remove(row):
+    day, cell = _DAY.format(row=row), _CELL.format(row=row)
+    key = f"day = {day} AND damage_code = {row}.damage_code AND cell = {cell}"
+    return f"""
+    UPDATE detection_rollup SET count = count - 1, confidence_sum = confidence_sum - {row}.confidence
+    WHERE {key};
+    DELETE FROM detection_rollup WHERE {key} AND count <= 0;
+    UPDATE detection_totals SET count = count - 1, confidence_sum = confidence_sum - {row}.confidence
+    WHERE damage_code = {row}.damage_code;"""
+
+
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS detection_rollup_insert AFTER INSERT ON detection
+    BEGIN {_add("new")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS detection_rollup_delete AFTER DELETE ON detection
+    BEGIN {_remove("old")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS detection_rollup_update
+    AFTER UPDATE OF timestamp, damage_code, confidence, quadkey ON detection
+    BEGIN {_remove("old")} {_add("new")}
+    END""",
+]
+
+REBUILD = [
+    "DELETE FROM detection_rollup",
+    "DELETE FROM detection_totals",
+    f"""INSERT INTO detection_rollup (day, damage_code, cell, count, confidence_sum)
+    SELECT {_DAY.format(row="detection")} AS day, damage_code, {_CELL.format(row="detection")} AS cell,
+           COUNT(*), SUM(confidence)
+    FROM detection GROUP BY day, damage_code, cell""",
+    """INSERT INTO detection_totals (damage_code, count, confidence_sum)
+    SELECT damage_code, COUNT(*), SUM(confidence) FROM detection GROUP BY damage_code""",
+]
+
+
+def install(connection):
+    """Create the maintenance triggers and rebuild the rollups if they are out of sync."""
+    for ddl in TRIGGERS:
+        connection.execute(text(ddl))
+    rolled_up = connection.execute(text("SELECT COALESCE(SUM(count), 0) FROM detection_totals")).scalar()
+    actual = connection.execute(text("SELECT COUNT(*) FROM detection")).scalar()
+    if rolled_up != actual:
+        rebuild(connection)
+
+
+def rebuild(connection):
+    """Recompute both summary tables from the detection table (one grouped scan)."""
+    for statement in REBUILD:
+        connection.execute(text(statement))
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+
+def totals(connection, totals_table):
+    """{damage_code: (count, confidence_sum)} — O(number of damage codes)."""
+    rows = connection.execute(
+        select(totals_table.c.damage_code, totals_table.c.count, totals_table.c.confidence_sum)
+        .where(totals_table.c.count > 0)
+    )
+    return {r.damage_code: (r.count, r.confidence_sum) for r in rows}
+
+
+def summarize(connection, rollup_table, start_day=None, end_day=None, bbox=None, by_day=False):
+    """
+    Counts and confidence sums from the per-day rollups, filtered by an
+    inclusive day window ("YYYY-MM-DD") and/or a bounding box. The bbox
+    is resolved at rollup-cell granularity: cells touching it count fully.
+
+    Returns {damage_code: (count, confidence_sum)}, or
+    {(day, damage_code): (count, confidence_sum)} when `by_day` is set.
+    """
+    t = rollup_table.c
+    conditions = []
+    if start_day:
+        conditions.append(t.day >= start_day)
+    if end_day:
+        conditions.append(t.day <= end_day)
+    if bbox is not None:
+        conditions.append(or_(*[t.cell.between(low, high) for low, high in spatial.tile_ranges(bbox, ROLLUP_ZOOM)]))
+
+    keys = [t.day, t.damage_code] if by_day else [t.damage_code]
+    statement = (
+        select(*keys, func.sum(t.count).label("count"), func.sum(t.confidence_sum).label("confidence_sum"))
+        .where(and_(True, *conditions))
+        .group_by(*keys)
+        .order_by(*keys)
+    )
+    result = {}
+    for row in connection.execute(statement):
+        key = (row.day, row.damage_code) if by_day else row.damage_code
+        if row.count:
+            result[key] = (row.count, row.confidence_sum)
+    return result
@@ -0,0 +1,571 @@
+"""
+Segment-Packed Image Archive
+Append-only storage for uploads (UPLOAD_LAYOUT=segments) that replaces
+one file per frame with a few large files:
+
+    uploads/segments/00000007.seg   image bytes, back to back
+    uploads/segments/00000007.idx   one 36-byte entry per image or tombstone
+
+- Every process (gunicorn worker, bulk_process) appends to a segment of
+  its own, locked with flock() while it is open, so writers never
+  contend. A segment is sealed when it reaches `segment_max_bytes` or
+  its process exits.
+- Reads memory-map the segment: no open()/close() per image, and the
+  pages are shared through the page cache by every process.
+- The index of all segments is held as a key-sorted numpy array (about
+  40 bytes per image); entries other processes append are read from the
+  index tails on a lookup miss.
+- Deleting appends a tombstone (an entry of length 0 naming the record's
+  segment and offset). `compact()` copies the live images of sealed
+  segments that are mostly garbage into the active segment and unlinks
+  the old files.
+
+Keys are the 128-bit hash prefix of a content name (see image_store.py).
+Without fcntl (Windows) segments are not locked, and compaction assumes
+a single writing process.
+
+Usage:
+    python segment_store.py stats   [--uploads backend/uploads]
+    python segment_store.py compact [--uploads backend/uploads] [--min-garbage 0.3]
+    python segment_store.py pack    [--uploads backend/uploads]   # move per-file uploads into segments
+"""
+
+import argparse
+import contextlib
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl  # segment ownership and the compaction lock (POSIX only)
+except ImportError:
+    fcntl = None
+
+SEGMENTS_DIR = "segments"
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+MIN_GARBAGE = 0.3  # compact a sealed segment once this fraction of it is deleted images
+MERGE_ENTRIES = 4096  # entries kept in a dict before they are merged into the sorted index
+ORPHAN_SECONDS = 3600  # a .seg without .idx older than this is a compaction interrupted by a crash
+
+INDEX_DTYPE = np.dtype([
+    ("key", "S16"),
+    ("segment", "<u4"),
+    ("offset", "<u8"),
+    ("length", "<u4"),  # 0: tombstone for the record at (segment, offset)
+    ("time", "<u4"),  # when the image was first stored (epoch seconds)
+])
+
+STORE_LOCK = ".lock"  # shared: delete(), exclusive: compaction of one segment
+COMPACT_LOCK = ".compact.lock"  # held for a whole compaction pass
+
+
+def key_for(name):
+    return bytes.fromhex(name[:32])
+
+
+def name_for(key):
+    return bytes(key).ljust(16, b"\0").hex() + ".jpg"  # "S16" drops trailing NUL bytes
+
+
+def location(segment, offset):
+    return (int(segment) << 40) | int(offset)  # offsets stay far below 1 TiB
+
+
+@contextlib.contextmanager
+def file_lock(path, exclusive=True, blocking=True):
+    """flock() on `path`; yields False if `blocking` is off and another holder has it."""
+    if fcntl is None:
+        yield True
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(fd, flags if blocking else flags | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class _ActiveSegment:
+    """The segment this process appends to."""
+
+    def __init__(self, segment, data_fd, index_fd, size):
+        self.segment = segment
+        self.data_fd = data_fd
+        self.index_fd = index_fd
+        self.size = size
+
+    def close(self):
+        os.close(self.index_fd)
+        os.close(self.data_fd)  # releases the flock: the segment is sealed
+
+
+class SegmentStore:
+    def __init__(self, root, segment_max_bytes=SEGMENT_MAX_BYTES):
+        self.root = root
+        self.segment_max_bytes = segment_max_bytes
+
+        self._lock = threading.RLock()
+        self._pid = None
+        self._active = None
+        self._loaded = {}  # segment -> bytes of its index read so far
+        self._maps = {}  # segment -> mmap of its data
+        self._base = np.zeros(0, INDEX_DTYPE)  # live images, sorted by key
+        self._keys = self._base["key"]
+        self._recent = {}  # key -> [(segment, offset, length, time)] since the last merge
+        self._recent_count = 0
+        self._dead = np.zeros(0, np.uint64)  # sorted tombstoned locations
+        self._recent_dead = set()
+        self._compactions = 0
+        self._compacted_segments = 0
+        self._reclaimed = 0
+        self._last_compaction_ms = None
+
+    def _path(self, segment, suffix):
+        return os.path.join(self.root, f"{segment:08d}{suffix}")
+
+    # --------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------
+
+    def put(self, name, data, created=None):
+        """Append an image; `created` (epoch seconds) is kept through compaction."""
+        with self._lock:
+            self._ensure_loaded()
+            active = self._writable(len(data))
+            entry = (key_for(name), active.segment, active.size, len(data), int(created or time.time()))
+            _write_all(active.data_fd, data)
+            active.size += len(data)
+            self._append_index(active, [entry])  # after the data: readers never see a partial image
+            self._add([entry])
+
+    def get(self, name, refresh=True):
+        """Bytes of the image, or None. A miss re-reads the index of other processes unless `refresh` is off."""
+        key = key_for(name)
+        for attempt in range(2):
+            with self._lock:
+                self._ensure_loaded()
+                found = self._find(key)
+                if not found and refresh:
+                    self.refresh()
+                    found = self._find(key)
+                if not found:
+                    return None
+                segment, offset, length, _ = found[0]
+                try:
+                    view = self._map(segment, offset + length)
+                except FileNotFoundError:  # compacted away by another process since
+                    self.refresh()
+                    continue
+            return view[offset:offset + length]
+        return None
+
+    def contains(self, name):
+        """Known to this process (no refresh: a miss only costs a duplicate that compaction drops)."""
+        with self._lock:
+            self._ensure_loaded()
+            return bool(self._find(key_for(name)))
+
+    def delete(self, names):
+        """Tombstone every stored copy of `names`; returns the bytes compaction can reclaim."""
+        keys = [key_for(name) for name in names]
+        if not keys:
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        # Shared lock: a segment being compacted is not unlinked between lookup and tombstone
+        with file_lock(os.path.join(self.root, STORE_LOCK), exclusive=False), self._lock:
+            self._ensure_loaded()
+            self.refresh()
+            now = int(time.time())
+            tombstones = [(key, segment, offset, 0, now) for key in keys for segment, offset, _, _ in self._find(key)]
+            if not tombstones:
+                return 0
+            released = sum(length for key in set(keys) for _, _, length, _ in self._find(key))
+            self._append_index(self._writable(0), tombstones)
+            self._add(tombstones)
+            return released
+
+    def older_than(self, cutoff):
+        """Names of images first stored before `cutoff` (epoch seconds)."""
+        with self._lock:
+            self._ensure_loaded()
+            self.refresh()
+            self._merge()
+            old = self._base["time"] < cutoff
+            keys = np.setdiff1d(self._base["key"][old], self._base["key"][~old])
+        return [name_for(key) for key in keys]
+
+    def refresh(self):
+        """Read what other processes appended to their indexes, and forget compacted segments."""
+        with self._lock:
+            self._check_pid()
+            present = set(self._segment_ids(INDEX_SUFFIX))
+            if self._active:
+                present.add(self._active.segment)
+            gone = set(self._loaded) - present
+            for segment in gone:
+                del self._loaded[segment]
+                self._maps.pop(segment, None)
+            chunks = []
+            for segment in sorted(present):
+                if self._active and segment == self._active.segment:
+                    continue  # our own entries are added as they are written
+                chunk = self._read_index(segment)
+                if chunk is not None and len(chunk):
+                    chunks.append(chunk)
+            if chunks:
+                self._add(np.concatenate(chunks))
+            if gone:
+                self._merge()
+
+    def seal(self):
+        """Close the active segment (making it eligible for compaction); the next write starts a new one."""
+        with self._lock:
+            self._check_pid()
+            if self._active:
+                self._active.close()
+                self._active = None
+
+    def sync(self):
+        """fsync() the active segment and its index."""
+        with self._lock:
+            if self._active and self._pid == os.getpid():
+                os.fsync(self._active.data_fd)
+                os.fsync(self._active.index_fd)
+
+    def stats(self):
+        with self._lock:
+            self._ensure_loaded()
+            if self._recent or self._recent_dead:
+                self._merge()
+            sizes = {}
+            for segment in self._loaded:
+                try:
+                    sizes[segment] = os.path.getsize(self._path(segment, SEGMENT_SUFFIX))
+                except FileNotFoundError:
+                    pass
+            total, live = sum(sizes.values()), int(self._base["length"].sum())
+            return {
+                "segments": len(sizes),
+                "images": len(self._base),
+                "bytes": total,
+                "live_bytes": live,
+                "garbage_ratio": round(1 - live / total, 4) if total else 0,
+                "tombstones": len(self._dead),
+                "compactions": self._compactions,
+                "compacted_segments": self._compacted_segments,
+                "reclaimed_bytes": self._reclaimed,
+                "last_compaction_ms": self._last_compaction_ms,
+            }
+
+    # --------------------------------------------------------
+    # Compaction
+    # --------------------------------------------------------
+
+    def compact(self, min_garbage=MIN_GARBAGE):
+        """
+        Rewrite sealed segments with at least `min_garbage` of their bytes
+        deleted, oldest first. Returns a summary, or None when another
+        process is compacting.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        started = time.perf_counter()
+        summary = {"segments": 0, "copied": 0, "reclaimed_bytes": 0}
+        with file_lock(os.path.join(self.root, COMPACT_LOCK), blocking=False) as locked:
+            if not locked:
+                return None
+            self._remove_orphans()
+            with self._lock:
+                self._ensure_loaded()
+                self.refresh()
+                self._merge()
+                live = np.bincount(self._base["segment"].astype(np.int64), weights=self._base["length"],
+                                   minlength=max(self._loaded, default=0) + 1)
+                candidates = []
+                for segment in sorted(self._loaded):
+                    if self._active and segment == self._active.segment:
+                        continue
+                    try:
+                        size = os.path.getsize(self._path(segment, SEGMENT_SUFFIX))
+                    except FileNotFoundError:
+                        continue
+                    if (size > live[segment] and 1 - live[segment] / size >= min_garbage) or not size:
+                        candidates.append(segment)
+            for segment in candidates:
+                # Exclusive per segment: deletes wait while its images move
+                with file_lock(os.path.join(self.root, STORE_LOCK)):
+                    result = self._compact_segment(segment)
+                if result:
+                    summary["segments"] += 1
+                    summary["copied"] += result[0]
+                    summary["reclaimed_bytes"] += result[1]
+        with self._lock:
+            self._compactions += 1
+            self._compacted_segments += summary["segments"]
+            self._reclaimed += summary["reclaimed_bytes"]
+            self._last_compaction_ms = round((time.perf_counter() - started) * 1000, 1)
+        return summary
+
+    def _compact_segment(self, segment):
+        """(images copied, bytes reclaimed), or None if the segment is still being written."""
+        data_path, index_path = self._path(segment, SEGMENT_SUFFIX), self._path(segment, INDEX_SUFFIX)
+        if not self._sealed(segment):
+            return None
+        with self._lock:
+            self.refresh()
+            try:
+                entries = np.fromfile(index_path, INDEX_DTYPE)
+                size = os.path.getsize(data_path)
+            except FileNotFoundError:
+                return None
+            tombstones = entries[entries["length"] == 0].tolist()
+            keep = [t for t in tombstones if t[1] != segment and t[1] in self._loaded]
+            if not size and keep and len(keep) == len(tombstones):
+                return None  # only tombstones, all still needed: moving them reclaims nothing
+            view = self._map(segment, size) if size else None
+        copied = moved = 0
+        for key, _, offset, length, created in entries[entries["length"] > 0].tolist():
+            with self._lock:
+                copies = self._find(key)
+                if (segment, offset, length, created) not in copies:
+                    continue  # deleted
+                if any(other != segment for other, *_ in copies):
+                    continue  # stored again elsewhere
+                self.put(name_for(key), view[offset:offset + length], created=created)
+            copied += 1
+            moved += length
+        with self._lock:
+            if keep:
+                self._append_index(self._writable(0), keep)
+            self.sync()  # the copies are durable before the original goes
+            os.remove(index_path)  # index first: a leftover .seg is an orphan, not live data
+            os.remove(data_path)
+            del self._loaded[segment]
+            self._maps.pop(segment, None)
+            self._merge()
+        return copied, size - moved
+
+    def _sealed(self, segment):
+        if self._active and segment == self._active.segment:
+            return False
+        if fcntl is None:
+            return True
+        try:
+            fd = os.open(self._path(segment, SEGMENT_SUFFIX), os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False  # its writer is alive
+        finally:
+            os.close(fd)
+        return True
+
+    def _remove_orphans(self):
+        indexed = set(self._segment_ids(INDEX_SUFFIX))
+        for segment in set(self._segment_ids(SEGMENT_SUFFIX)) - indexed:
+            path = self._path(segment, SEGMENT_SUFFIX)
+            try:
+                if time.time() - os.path.getmtime(path) > ORPHAN_SECONDS and self._sealed(segment):
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # --------------------------------------------------------
+    # Index
+    # --------------------------------------------------------
+
+    def _segment_ids(self, suffix):
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return [int(n[:-len(suffix)]) for n in names if n.endswith(suffix) and n[:-len(suffix)].isdigit()]
+
+    def _check_pid(self):
+        # The active segment (and its lock) belongs to the process that opened it
+        pid = os.getpid()
+        if self._pid != pid:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+            self._pid = pid
+
+    def _ensure_loaded(self):
+        if self._pid is None:
+            self.refresh()
+        else:
+            self._check_pid()
+
+    def _read_index(self, segment):
+        start = self._loaded.get(segment, 0)
+        try:
+            with open(self._path(segment, INDEX_SUFFIX), "rb") as f:
+                f.seek(start)
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        usable = len(raw) - len(raw) % INDEX_DTYPE.itemsize  # an entry being written is read next time
+        self._loaded[segment] = start + usable
+        return np.frombuffer(raw[:usable], INDEX_DTYPE)
+
+    def _add(self, entries):
+        """Record entries (images and tombstones) that were just written or read."""
+        if not isinstance(entries, np.ndarray):
+            entries = np.array(entries, INDEX_DTYPE)
+        images, tombstones = entries[entries["length"] > 0], entries[entries["length"] == 0]
+        self._recent_dead.update(location(s, o) for s, o in zip(tombstones["segment"], tombstones["offset"]))
+        if len(images) > MERGE_ENTRIES:
+            self._merge(images)
+            return
+        for key, segment, offset, length, created in images.tolist():
+            self._recent.setdefault(key, []).append((segment, offset, length, created))
+        self._recent_count += len(images)
+        if self._recent_count > MERGE_ENTRIES or len(self._recent_dead) > MERGE_ENTRIES:
+            self._merge()
+
+    def _merge(self, images=None):
+        """Fold recent entries into the sorted arrays, dropping deleted and compacted images."""
+        parts = [self._base]
+        if self._recent:
+            parts.append(np.array([(key, *loc) for key, locs in self._recent.items() for loc in locs], INDEX_DTYPE))
+        if images is not None:
+            parts.append(images)
+        base = np.concatenate(parts) if len(parts) > 1 else self._base
+        present = np.fromiter(self._loaded, np.uint64, len(self._loaded))
+        dead = self._dead
+        if self._recent_dead:
+            dead = np.union1d(dead, np.fromiter(self._recent_dead, np.uint64, len(self._recent_dead)))
+        dead = dead[np.isin(dead >> np.uint64(40), present)]  # tombstones of unlinked segments are moot
+        locations = (base["segment"].astype(np.uint64) << np.uint64(40)) | base["offset"].astype(np.uint64)
+        base = base[np.isin(base["segment"], present) & ~np.isin(locations, dead)]
+        self._base = base[np.argsort(base["key"], kind="stable")]
+        self._keys = self._base["key"]
+        self._dead = dead
+        self._recent = {}
+        self._recent_count = 0
+        self._recent_dead = set()
+
+    def _find(self, key):
+        """Live (segment, offset, length, time) copies of `key`."""
+        found = []
+        lo, hi = np.searchsorted(self._keys, key, "left"), np.searchsorted(self._keys, key, "right")
+        for segment, offset, length, created in self._base[["segment", "offset", "length", "time"]][lo:hi].tolist():
+            found.append((segment, offset, length, created))
+        found.extend(self._recent.get(bytes(key).rstrip(b"\0"), ()))  # stored as "S16" gives it back
+        return [loc for loc in found
+                if loc[0] in self._loaded and location(loc[0], loc[1]) not in self._recent_dead]
+
+    # --------------------------------------------------------
+    # Files
+    # --------------------------------------------------------
+
+    def _writable(self, incoming):
+        """This process's active segment, rolled over when `incoming` bytes would overflow it."""
+        self._check_pid()
+        active = self._active
+        if active and active.size and active.size + incoming > self.segment_max_bytes:
+            active.close()
+            self._active = active = None
+        if active:
+            return active
+        os.makedirs(self.root, exist_ok=True)
+        segment = max(self._segment_ids(SEGMENT_SUFFIX) + self._segment_ids(INDEX_SUFFIX), default=0) + 1
+        while True:
+            try:
+                # .seg first (claims the number) and locked before its .idx makes it visible
+                data_fd = os.open(self._path(segment, SEGMENT_SUFFIX), os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+                break
+            except FileExistsError:
+                segment += 1
+        if fcntl is not None:
+            fcntl.flock(data_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        index_fd = os.open(self._path(segment, INDEX_SUFFIX), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._active = _ActiveSegment(segment, data_fd, index_fd, 0)
+        self._loaded[segment] = 0
+        return self._active
+
+    def _append_index(self, active, entries):
+        raw = np.array(entries, INDEX_DTYPE).tobytes()
+        _write_all(active.index_fd, raw)
+        self._loaded[active.segment] += len(raw)
+
+    def _map(self, segment, end):
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            # Replaced, not closed: a reader may still be slicing the old map
+            with open(self._path(segment, SEGMENT_SUFFIX), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def pack(uploads, store, remove=True):
+    """Move per-file content-named uploads (uploads/ab/cd/<hash>.jpg) into segments. Returns the count."""
+    import image_store
+
+    packed = []
+    for dirpath, dirnames, filenames in os.walk(uploads):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != SEGMENTS_DIR]
+        for filename in filenames:
+            if not image_store.is_content_name(filename):
+                continue
+            path = os.path.join(dirpath, filename)
+            if not store.contains(filename):
+                with open(path, "rb") as f:
+                    store.put(filename, f.read(), created=os.path.getmtime(path))
+            packed.append(path)
+    store.sync()
+    if remove:
+        for path in packed:
+            os.remove(path)
+    return len(packed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, compact or fill the segment image archive")
+    parser.add_argument("command", choices=["stats", "compact", "pack"])
+    parser.add_argument("--uploads", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"))
+    parser.add_argument("--min-garbage", type=float, default=MIN_GARBAGE, help="compact: deleted fraction that triggers a rewrite")
+    parser.add_argument("--keep", action="store_true", help="pack: keep the original files")
+    args = parser.parse_args()
+
+    store = SegmentStore(os.path.join(args.uploads, SEGMENTS_DIR))
+    if args.command == "compact":
+        summary = store.compact(args.min_garbage)
+        if summary is None:
+            print("⚠️  Another process is compacting")
+            return
+        print(f"🧹 Rewrote {summary['segments']} segments ({summary['copied']:,} images copied), "
+              f"reclaimed {summary['reclaimed_bytes'] / 1e6:,.1f} MB")
+    elif args.command == "pack":
+        started = time.perf_counter()
+        count = pack(args.uploads, store, remove=not args.keep)
+        print(f"📦 Packed {count:,} images in {time.perf_counter() - started:.1f}s")
+    stats = store.stats()
+    print(f"📊 {stats['images']:,} images in {stats['segments']} segments, "
+          f"{stats['bytes'] / 1e6:,.1f} MB ({stats['garbage_ratio']:.0%} garbage)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Production Server
+Runs the API with N pre-forked gunicorn worker processes (Linux/macOS).
+
+The app and the YOLOv5 weights are loaded once in the master process
+(synchronously, unlike `python app.py`) before forking, so every worker
+shares the model's memory pages copy-on-write instead of loading its own
+copy. Each worker pins the inference backend's intra-op thread pool so
+N workers do not oversubscribe the CPU.
+
+Usage:
+    python serve.py                          # workers = CPU cores / 2
+    python serve.py --workers 4 --threads 8 --torch-threads 2
+    WEB_WORKERS=4 TORCH_THREADS=2 python serve.py
+
+For development with auto-reload, use `python app.py` instead.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Road Damage Detection API in production mode")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_WORKERS", default_workers())),
+                        help="Worker processes (default: CPU cores / 2)")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", 8)),
+                        help="Request threads per worker; concurrent frames are micro-batched")
+    parser.add_argument("--torch-threads", type=int, default=int(os.environ.get("TORCH_THREADS", 0)),
+                        help="torch / ONNX Runtime intra-op threads per worker (default: CPU cores / workers)")
+    parser.add_argument("--timeout", type=int, default=int(os.environ.get("WEB_TIMEOUT", 60)),
+                        help="Seconds before a silent worker is restarted")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ gunicorn is not installed (it does not run on Windows).")
+        print("   Install with: pip install gunicorn   — or use: python app.py")
+        sys.exit(1)
+
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    # Workers publish metric snapshots here so /metrics on any of them covers all
+    if not os.environ.get("METRICS_DIR"):
+        os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="rdd-metrics-")
+
+    def post_fork(server, worker):
+        from app import app, db, registry
+
+        if registry.ready:
+            registry.get().set_num_threads(torch_threads)
+        # Connections opened by the master must not be shared with children
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", args.timeout)
+            self.cfg.set("preload_app", True)
+            self.cfg.set("post_fork", post_fork)
+
+        def load(self):
+            # Runs once in the master, before any worker is forked
+            from app import app, db, init_db, registry, UPLOAD_FOLDER
+
+            registry.load()  # workers inherit the loaded model instead of loading their own
+            with app.app_context():
+                init_db(db.engine)
+                db.engine.dispose()
+            print("✅ Database initialized")
+
+            print("\n" + "=" * 50)
+            print("🚀 Road Damage Detection API (production)")
+            print("=" * 50)
+            print(f"📡 Server: http://{args.host}:{args.port}")
+            print(f"👷 Workers: {args.workers} x {args.threads} threads, {torch_threads} inference threads each")
+            print(f"📂 Uploads: {UPLOAD_FOLDER}")
+            print("=" * 50 + "\n")
+
+            # Move everything loaded so far (model included) out of the GC's
+            # reach, so collections in workers do not touch and copy those pages
+            gc.freeze()
+            return app
+
+    ProductionServer().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Damage Sites
+Merges detections into unique damage sites as they are written, so the
+same pothole seen in five consecutive frames is one site with five
+observations instead of five unrelated rows.
+
+A new geotagged detection joins the nearest site with the same damage
+code that lies within `radius_m` and was last seen within `window` of the
+detection's timestamp; otherwise it starts a new site. Candidates are
+found through the site quadkey index (a few range scans around the
+point), so merging costs the same however many sites exist.
+
+Rebuild sites for detections stored before sites existed with:
+    python sites.py --rebuild
+"""
+
+import argparse
+import datetime
+import os
+import uuid
+
+from sqlalchemy import bindparam, create_engine, delete, func, insert, or_, select, tuple_, update
+
+import spatial
+
+DEFAULT_DB = os.path.join(os.path.abspath(os.path.dirname(__file__)), "database", "detections.db")
+SITE_RADIUS_M = 8.0
+SITE_WINDOW = datetime.timedelta(days=30)
+
+_UPDATED_COLUMNS = ("latitude", "longitude", "quadkey", "first_seen", "last_seen", "observations",
+                    "confidence", "max_confidence", "best_image_filename")
+
+
+_statements = {}
+
+
+def _neighbour_statement(table):
+    """
+    Candidate lookup with a fixed shape (4 quadkey ranges, unused ones
+    repeated), built once per table so SQLAlchemy compiles it only once.
+    """
+    if table.name not in _statements:
+        c = table.c
+        _statements[table.name] = select(table).where(
+            or_(*[c.quadkey.between(bindparam(f"low{i}"), bindparam(f"high{i}")) for i in range(4)]),
+            c.damage_code == bindparam("code"),
+            c.last_seen >= bindparam("since"),
+            c.latitude.between(bindparam("min_lat"), bindparam("max_lat")),
+            c.longitude.between(bindparam("min_lon"), bindparam("max_lon")),
+        )
+    return _statements[table.name]
+
+
+def _candidates(connection, table, row, radius_m, window):
+    """Sites of the row's code near the row and seen recently (index range scans)."""
+    ranges = spatial.radius_ranges(row["latitude"], row["longitude"], radius_m)
+    ranges += ranges[-1:] * (4 - len(ranges))
+    min_lon, min_lat, max_lon, max_lat = spatial.around(row["latitude"], row["longitude"], radius_m)
+    params = {"code": row["damage_code"], "since": row["timestamp"] - window,
+              "min_lat": min_lat, "max_lat": max_lat, "min_lon": min_lon, "max_lon": max_lon}
+    for i, (low, high) in enumerate(ranges):
+        params[f"low{i}"], params[f"high{i}"] = low, high
+    return [dict(site._mapping) for site in connection.execute(_neighbour_statement(table), params)]
+
+
+def _observe(site, row):
+    """Fold one detection into a site (in place)."""
+    n = site["observations"] + 1
+    site["latitude"] += (row["latitude"] - site["latitude"]) / n
+    site["longitude"] += (row["longitude"] - site["longitude"]) / n
+    site["quadkey"] = spatial.quadkey(site["latitude"], site["longitude"])
+    site["confidence"] += (row["confidence"] - site["confidence"]) / n
+    site["observations"] = n
+    site["first_seen"] = min(site["first_seen"], row["timestamp"])
+    site["last_seen"] = max(site["last_seen"], row["timestamp"])
+    if row["confidence"] > site["max_confidence"]:
+        site["max_confidence"] = row["confidence"]
+        site["best_image_filename"] = row.get("image_filename")
+
+
+def _new_site(row):
+    return {
+        "id": str(uuid.uuid4()),
+        "damage_code": row["damage_code"],
+        "damage_type": row["damage_type"],
+        "latitude": row["latitude"],
+        "longitude": row["longitude"],
+        "quadkey": spatial.quadkey(row["latitude"], row["longitude"]),
+        "first_seen": row["timestamp"],
+        "last_seen": row["timestamp"],
+        "observations": 1,
+        "confidence": row["confidence"],
+        "max_confidence": row["confidence"],
+        "best_image_filename": row.get("image_filename"),
+    }
+
+
+def assign_sites(connection, table, rows, radius_m=SITE_RADIUS_M, window=SITE_WINDOW):
+    """
+    Set row["site_id"] on Detection insert rows and create or update the
+    matching sites, inside the caller's transaction. Rows without GPS get
+    site_id None. Sites touched by the batch are kept in memory and
+    written with one executemany per statement type.
+    """
+    created, changed = {}, {}
+    created_by_code = {}
+    for row in rows:
+        row["site_id"] = None
+        if row.get("latitude") is None or row.get("longitude") is None:
+            continue
+        row.setdefault("timestamp", datetime.datetime.utcnow())
+
+        # Database candidates, with this batch's pending changes applied
+        candidates = {site["id"]: site for site in _candidates(connection, table, row, radius_m, window)}
+        candidates.update((i, s) for i, s in changed.items() if i in candidates)
+        candidates.update((s["id"], s) for s in created_by_code.get(row["damage_code"], ()))
+
+        best, best_distance = None, radius_m
+        for site in candidates.values():
+            if site["last_seen"] < row["timestamp"] - window:
+                continue
+            d = spatial.distance_m(site["latitude"], site["longitude"], row["latitude"], row["longitude"])
+            if d <= best_distance:
+                best, best_distance = site, d
+
+        if best is None:
+            best = _new_site(row)
+            created[best["id"]] = best
+            created_by_code.setdefault(best["damage_code"], []).append(best)
+        else:
+            _observe(best, row)
+            if best["id"] not in created:
+                changed[best["id"]] = best
+        row["site_id"] = best["id"]
+
+    if created:
+        connection.execute(insert(table), list(created.values()))
+    if changed:
+        connection.execute(
+            update(table).where(table.c.id == bindparam("site_id")),
+            [{"site_id": i, **{c: s[c] for c in _UPDATED_COLUMNS}} for i, s in changed.items()],
+        )
+    return len(created), len(changed)
+
+
+def remove_observation(connection, table, detection_table, site_id):
+    """
+    A detection of the site was deleted (call after deleting it): recompute
+    the site from its remaining detections, or delete it with its last one.
+    """
+    if site_id is None:
+        return
+    d = detection_table.c
+    remaining = connection.execute(
+        select(func.count(), func.avg(d.latitude), func.avg(d.longitude), func.avg(d.confidence),
+               func.max(d.confidence), func.min(d.timestamp), func.max(d.timestamp))
+        .where(d.site_id == site_id)
+    ).one()
+    count, latitude, longitude, confidence, max_confidence, first_seen, last_seen = remaining
+    if not count:
+        connection.execute(delete(table).where(table.c.id == site_id))
+        return
+    best_image = connection.execute(
+        select(d.image_filename).where(d.site_id == site_id).order_by(d.confidence.desc(), d.timestamp).limit(1)
+    ).scalar()
+    connection.execute(update(table).where(table.c.id == site_id).values(
+        latitude=latitude, longitude=longitude, quadkey=spatial.quadkey(latitude, longitude),
+        first_seen=first_seen, last_seen=last_seen, observations=count,
+        confidence=confidence, max_confidence=max_confidence, best_image_filename=best_image,
+    ))
+
+
+def rebuild(connection, site_table, detection_table, radius_m=SITE_RADIUS_M, window=SITE_WINDOW, chunk=5000):
+    """Recreate all sites from the stored detections, oldest first. Returns (detections, sites)."""
+    connection.execute(delete(site_table))
+    connection.execute(update(detection_table).values(site_id=None))
+    d = detection_table.c
+    columns = [d.id, d.timestamp, d.latitude, d.longitude, d.damage_code, d.damage_type, d.confidence, d.image_filename]
+    processed, created_total, after = 0, 0, None
+    while True:
+        statement = select(*columns).where(d.latitude.isnot(None), d.longitude.isnot(None))
+        if after is not None:
+            statement = statement.where(tuple_(d.timestamp, d.id) > tuple_(*after))
+        rows = [dict(r._mapping) for r in connection.execute(statement.order_by(d.timestamp, d.id).limit(chunk))]
+        if not rows:
+            return processed, created_total
+        created, _ = assign_sites(connection, site_table, rows, radius_m, window)
+        connection.execute(
+            update(detection_table).where(d.id == bindparam("row_id")),
+            [{"row_id": r["id"], "site_id": r["site_id"]} for r in rows],
+        )
+        processed += len(rows)
+        created_total += created
+        after = (rows[-1]["timestamp"], rows[-1]["id"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Damage site maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="Recreate all sites from stored detections")
+    parser.add_argument("--radius", type=float, default=SITE_RADIUS_M, help="Merge radius in metres")
+    parser.add_argument("--window-days", type=float, default=SITE_WINDOW.days, help="Merge time window")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database file")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    from database import DamageSite, Detection, init_db
+    from ingest import enable_sqlite_wal
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    enable_sqlite_wal(engine)
+    init_db(engine)
+    with engine.begin() as conn:
+        processed, created = rebuild(conn, DamageSite.__table__, Detection.__table__,
+                                     args.radius, datetime.timedelta(days=args.window_days))
+    print(f"✅ {processed} geotagged detections merged into {created} sites")
+
+
+if __name__ == "__main__":
+    main()
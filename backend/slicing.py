@@ -0,0 +1,107 @@
+"""
+Sliced (Tiled) Inference
+Hairline cracks a few pixels wide disappear when a 4000x3000 photo is
+shrunk to the model's 640 px input. Sliced inference cuts the image into
+overlapping tiles at (close to) native resolution, runs the tiles as one
+batch, and merges the boxes back into full-image coordinates.
+
+Modes:
+    off      the whole frame at the model input size (default)
+    tiles    tiles only
+    hybrid   the whole frame plus the tiles, so damage larger than a tile
+             (a pothole filling the frame) is still found in one piece
+
+A crack crossing a tile border is detected as two partial boxes (and
+twice in the overlap); the merge joins boxes of the same class that
+overlap by more than `merge_threshold` of the smaller box's area into
+their union, keeping the highest confidence.
+"""
+
+import math
+
+import numpy as np
+
+MODES = ("off", "tiles", "hybrid")
+
+
+def tile_windows(width, height, tile=640, overlap=0.2):
+    """
+    (x0, y0, x1, y1) windows of `tile` px covering the image with at
+    least `overlap` (fraction of a tile) between neighbours; the last
+    row/column is aligned to the image edge.
+    """
+    stride = max(1, int(tile * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile:
+            return [0]
+        count = math.ceil((length - tile) / stride) + 1
+        return [min(i * stride, length - tile) for i in range(count)]
+
+    return [(x, y, min(x + tile, width), min(y + tile, height)) for y in starts(height) for x in starts(width)]
+
+
+def crop(array, windows):
+    """Contiguous HxWx3 copies of the windows (the backends expect whole arrays)."""
+    return [np.ascontiguousarray(array[y0:y1, x0:x1]) for x0, y0, x1, y1 in windows]
+
+
+def merge_boxes(pred, threshold=0.5):
+    """
+    Greedy per-class merging of (n, 6) boxes: every box overlapping a
+    higher-scoring one by more than `threshold` of the smaller box's area
+    is folded into it (union of extents, the higher confidence).
+    """
+    if len(pred) < 2:
+        return pred
+    boxes = pred[:, :4]
+    # Boxes of different classes are offset apart, as in inference.batched_nms
+    shifted = boxes + pred[:, 5:6] * (boxes.max() + 1)
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = pred[:, 4].argsort()[::-1]
+    merged = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        overlap = w * h / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        group = np.concatenate([[i], rest[overlap > threshold]])
+        row = pred[i].copy()
+        row[:2] = boxes[group, :2].min(0)
+        row[2:4] = boxes[group, 2:4].max(0)
+        merged.append(row)
+        order = rest[overlap <= threshold]
+    return np.array(merged, dtype=pred.dtype)
+
+
+def merge(tile_predictions, windows, scale=(1.0, 1.0), full=None, merge_threshold=0.5, max_det=None):
+    """
+    Tile predictions (tile pixels) -> one (n, 6) array in original-image
+    pixels. `scale` maps the sliced image to the original (original /
+    sliced size); `full`, if given, is the whole-frame prediction already
+    in original pixels (hybrid mode).
+    """
+    parts = [] if full is None else [full]
+    for pred, (x0, y0, _, _) in zip(tile_predictions, windows):
+        if len(pred):
+            pred = pred.astype(np.float32, copy=True)
+            pred[:, [0, 2]] = (pred[:, [0, 2]] + x0) * scale[0]
+            pred[:, [1, 3]] = (pred[:, [1, 3]] + y0) * scale[1]
+            parts.append(pred)
+    if not parts:
+        return np.zeros((0, 6), dtype=np.float32)
+    merged = merge_boxes(np.concatenate(parts), merge_threshold)
+    if max_det:
+        merged = merged[merged[:, 4].argsort()[::-1][:max_det]]
+    return merged
+
+
+def sliced_predict(array, predict, tile=640, overlap=0.2, scale=(1.0, 1.0), full=None,
+                   merge_threshold=0.5, max_det=None):
+    """
+    Tile `array`, run `predict` (list of arrays -> list of (n, 6) arrays)
+    over all tiles at once, and merge() the results.
+    """
+    windows = tile_windows(array.shape[1], array.shape[0], tile, overlap)
+    return merge(predict(crop(array, windows)), windows, scale, full, merge_threshold, max_det)
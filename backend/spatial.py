@@ -0,0 +1,257 @@
+"""
+Spatial Tile Index
+Web-Mercator quadkeys for detections, bounding-box lookups through the
+quadkey index, and server-side clustering for /history/map.
+
+Each geotagged detection stores the quadkey of the zoom-24 tile (~2 m)
+it falls in, as a 48-bit integer with x/y bits interleaved. A tile at
+any lower zoom is then one contiguous quadkey range, so a bounding box
+is a handful of index range scans, and `quadkey >> 2*(24 - z)` is the
+zoom-z tile, which makes clustering a GROUP BY on the index.
+"""
+
+import math
+
+from sqlalchemy import and_, bindparam, func, or_, select
+
+MAX_ZOOM = 24
+MAX_LATITUDE = 85.05112878  # Web-Mercator limit
+EARTH_RADIUS_M = 6371008.8
+SEVERITY_RANK = {"unknown": 0, "moderate": 1, "severe": 2}
+
+
+# ============================================================
+# QUADKEYS
+# ============================================================
+
+def tile_xy(latitude, longitude, zoom):
+    """Web-Mercator tile (x, y) containing the point at `zoom`."""
+    latitude = min(max(latitude, -MAX_LATITUDE), MAX_LATITUDE)
+    n = 1 << zoom
+    sin_lat = math.sin(math.radians(latitude))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _spread_bits(v):
+    """Insert a zero bit between each of the low 32 bits of v."""
+    v &= 0xFFFFFFFF
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+
+def tile_quadkey(x, y):
+    return _spread_bits(x) | (_spread_bits(y) << 1)
+
+
+def quadkey(latitude, longitude):
+    """Zoom-24 quadkey of a point, or None when the point has no GPS fix."""
+    if latitude is None or longitude is None:
+        return None
+    return tile_quadkey(*tile_xy(latitude, longitude, MAX_ZOOM))
+
+
+def quadkey_default(context):
+    """Column default: derive the quadkey from the row's latitude/longitude."""
+    params = context.get_current_parameters()
+    return quadkey(params.get("latitude"), params.get("longitude"))
+
+
+# ============================================================
+# BOUNDING BOXES
+# ============================================================
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres (haversine)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def around(latitude, longitude, radius_m):
+    """Bounding box (min_lon, min_lat, max_lon, max_lat) of a circle around a point."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = dlat / max(math.cos(math.radians(latitude)), 1e-6)
+    return longitude - dlon, latitude - dlat, longitude + dlon, latitude + dlat
+
+
+def parse_bbox(value):
+    """Parse "min_lon,min_lat,max_lon,max_lat". Raises ValueError."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(","))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be 'min_lon,min_lat,max_lon,max_lat'")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox minimums must not exceed maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def covering_ranges(bbox, max_tiles=16):
+    """
+    Quadkey ranges covering `bbox`, using the deepest zoom at which the
+    box spans at most `max_tiles` tiles. Adjacent ranges are merged.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    tiles = [(0, 0, 0)]
+    for zoom in range(MAX_ZOOM + 1):
+        x0, y0 = tile_xy(max_lat, min_lon, zoom)
+        x1, y1 = tile_xy(min_lat, max_lon, zoom)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > max_tiles:
+            break
+        tiles = [(x, y, zoom) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    ranges = []
+    for x, y, zoom in tiles:
+        shift = 2 * (MAX_ZOOM - zoom)
+        low = tile_quadkey(x, y) << shift
+        ranges.append((low, low + (1 << shift) - 1))
+    return _merge_ranges(ranges)
+
+
+def tile_ranges(bbox, zoom):
+    """
+    Exact ranges of zoom-`zoom` quadkeys (i.e. `quadkey >> 2*(24 - zoom)`)
+    for the tiles intersecting `bbox`, found by quadtree decomposition.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    x0, y0 = tile_xy(max_lat, min_lon, zoom)
+    x1, y1 = tile_xy(min_lat, max_lon, zoom)
+    ranges = []
+
+    def visit(x, y, level):
+        shift = zoom - level
+        tx0, ty0 = x << shift, y << shift
+        tx1, ty1 = tx0 + (1 << shift) - 1, ty0 + (1 << shift) - 1
+        if tx1 < x0 or tx0 > x1 or ty1 < y0 or ty0 > y1:
+            return
+        if tx0 >= x0 and tx1 <= x1 and ty0 >= y0 and ty1 <= y1:
+            low = tile_quadkey(x, y) << (2 * shift)
+            ranges.append((low, low + (1 << (2 * shift)) - 1))
+            return
+        for dy in (0, 1):
+            for dx in (0, 1):
+                visit(2 * x + dx, 2 * y + dy, level + 1)
+
+    visit(0, 0, 0)
+    return _merge_ranges(ranges)
+
+
+def radius_ranges(latitude, longitude, radius_m):
+    """
+    At most 4 quadkey ranges covering a circle: tiles at the deepest zoom
+    whose tiles are at least 2 * radius wide, so the circle spans <= 2x2.
+    Cheaper than covering_ranges() for the many small lookups of a merge.
+    """
+    tile_m = 2 * math.pi * EARTH_RADIUS_M * math.cos(math.radians(min(abs(latitude), MAX_LATITUDE)))
+    zoom = int(min(MAX_ZOOM, max(0, math.floor(math.log2(tile_m / (2 * radius_m))))))
+    min_lon, min_lat, max_lon, max_lat = around(latitude, longitude, radius_m)
+    x0, y0 = tile_xy(max_lat, min_lon, zoom)
+    x1, y1 = tile_xy(min_lat, max_lon, zoom)
+    shift = 2 * (MAX_ZOOM - zoom)
+    ranges = []
+    for x in {x0, x1}:
+        for y in {y0, y1}:
+            low = tile_quadkey(x, y) << shift
+            ranges.append((low, low + (1 << shift) - 1))
+    return _merge_ranges(ranges)
+
+
+def _merge_ranges(ranges):
+    ranges = sorted(ranges)
+    merged = [ranges[0]] if ranges else []
+    for low, high in ranges[1:]:
+        if low == merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], high)
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def bbox_filter(columns, bbox, max_tiles=16):
+    """WHERE clause for detections inside `bbox` (quadkey ranges + exact bounds)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return and_(
+        or_(*[columns.quadkey.between(low, high) for low, high in covering_ranges(bbox, max_tiles)]),
+        columns.latitude.between(min_lat, max_lat),
+        columns.longitude.between(min_lon, max_lon),
+    )
+
+
+# ============================================================
+# CLUSTERING
+# ============================================================
+
+def cluster(connection, table, bbox, zoom, severity_by_code, cell_offset=3):
+    """
+    Aggregate detections in `bbox` into grid cells for map zoom `zoom`.
+
+    Cells are tiles at zoom + `cell_offset` (3 gives an 8x8 grid per map
+    tile, ~32 px on screen). Each cluster reports its count, centroid,
+    dominant damage code, max severity and per-code counts.
+    """
+    cell_zoom = min(MAX_ZOOM, max(0, int(zoom)) + cell_offset)
+    cell = table.c.quadkey.op(">>")(2 * (MAX_ZOOM - cell_zoom)).label("cell")
+    statement = (
+        select(
+            cell,
+            table.c.damage_code,
+            func.count().label("count"),
+            func.sum(table.c.latitude).label("lat_sum"),
+            func.sum(table.c.longitude).label("lon_sum"),
+            func.max(table.c.confidence).label("max_confidence"),
+        )
+        .where(bbox_filter(table.c, bbox))
+        .group_by(cell, table.c.damage_code)
+    )
+
+    cells = {}
+    for row in connection.execute(statement):
+        entry = cells.setdefault(row.cell, {
+            "count": 0, "lat_sum": 0.0, "lon_sum": 0.0, "max_confidence": 0.0, "by_code": {},
+        })
+        entry["count"] += row.count
+        entry["lat_sum"] += row.lat_sum
+        entry["lon_sum"] += row.lon_sum
+        entry["max_confidence"] = max(entry["max_confidence"], row.max_confidence)
+        entry["by_code"][row.damage_code] = row.count
+
+    clusters = []
+    for key, entry in cells.items():
+        severities = [severity_by_code.get(code, "unknown") for code in entry["by_code"]]
+        clusters.append({
+            "cell": key,
+            "latitude": round(entry["lat_sum"] / entry["count"], 6),
+            "longitude": round(entry["lon_sum"] / entry["count"], 6),
+            "count": entry["count"],
+            "dominant_code": max(entry["by_code"], key=entry["by_code"].get),
+            "max_severity": max(severities, key=lambda s: SEVERITY_RANK.get(s, 0)),
+            "max_confidence": round(entry["max_confidence"], 4),
+            "by_code": entry["by_code"],
+        })
+    clusters.sort(key=lambda c: c["count"], reverse=True)
+    return clusters
+
+
+def backfill_quadkeys(connection, table, chunk=10000):
+    """Fill quadkeys for geotagged rows inserted before the column existed."""
+    updated = 0
+    while True:
+        rows = connection.execute(
+            select(table.c.id, table.c.latitude, table.c.longitude)
+            .where(table.c.quadkey.is_(None), table.c.latitude.isnot(None), table.c.longitude.isnot(None))
+            .limit(chunk)
+        ).all()
+        if not rows:
+            return updated
+        connection.execute(
+            table.update().where(table.c.id == bindparam("row_id")),
+            [{"row_id": r.id, "quadkey": quadkey(r.latitude, r.longitude)} for r in rows],
+        )
+        updated += len(rows)
+
@@ -0,0 +1,198 @@
+"""
+Streaming Detection Sessions
+One WebSocket per device instead of one POST per frame. The client sends
+frames as binary messages (each optionally preceded by a JSON text
+message with its GPS fix), and detections are sent back as they complete.
+
+Each session holds at most one unprocessed frame: a frame that arrives
+while the previous one is still waiting replaces it (latest frame wins),
+so a client that outpaces the server gets fresh results instead of a
+growing backlog of stale ones. Superseded frames are counted as dropped.
+
+Protocol (all server messages are JSON text):
+    client  {"seq": 7, "latitude": .., "longitude": .., "sent_at": <ms>,
+             "last_latency_ms": <ms>}                (text, optional)
+    client  <JPEG bytes>                             (binary)
+    server  {"type": "result", "seq": 7, "sent_at": .., "server_ms": ..,
+             "dropped": 3, ...same fields as /detect}
+    client  {"type": "stats"}  ->  server {"type": "stats", ...}
+
+"sent_at" is echoed unchanged so the client can measure end-to-end
+latency on its own clock; reporting it back as "last_latency_ms" adds it
+to the session and server-wide metrics.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": 0, "p95": 0, "max": 0}
+    ordered = sorted(values)
+    return {
+        "p50": round(ordered[len(ordered) // 2], 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class StreamMetrics:
+    """Counters shared by every session of a process (see StreamSession)."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.sessions = 0
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self._server_ms = deque(maxlen=window)  # frame received -> result sent
+        self._client_ms = deque(maxlen=window)  # reported by clients (sent_at -> result received)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def latency(self, server_ms=None, client_ms=None):
+        with self._lock:
+            if server_ms is not None:
+                self._server_ms.append(server_ms)
+            if client_ms is not None:
+                self._client_ms.append(client_ms)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active_sessions": self.active,
+                "sessions": self.sessions,
+                "frames_received": self.received,
+                "frames_processed": self.processed,
+                "frames_dropped": self.dropped,
+                "errors": self.errors,
+                "drop_rate": round(self.dropped / self.received, 4) if self.received else 0,
+                "server_latency_ms": _percentiles(self._server_ms),
+                "client_latency_ms": _percentiles(self._client_ms),
+            }
+
+
+class StreamSession:
+    """
+    Latest-frame-wins slot plus the worker thread that drains it.
+
+    `process(image_bytes, meta)` returns the result dict for one frame;
+    `send(text)` writes a message to the client. The socket's receive loop
+    calls offer() for each frame and close() when the connection ends.
+    """
+
+    def __init__(self, process, send, metrics, window=200):
+        self.process = process
+        self._send = send
+        self._send_lock = threading.Lock()
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        self._pending = None  # (image_bytes, meta, received_at)
+        self._closed = False
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self._server_ms = deque(maxlen=window)
+        self._client_ms = deque(maxlen=window)
+        self._thread = threading.Thread(target=self._run, name="stream-session", daemon=True)
+        metrics.add(active=1, sessions=1)
+        self._thread.start()
+
+    # --------------------------------------------------------
+    # Receive side
+    # --------------------------------------------------------
+
+    def offer(self, image_bytes, meta=None):
+        """Queue a frame, replacing (dropping) one that has not started processing."""
+        meta = meta or {}
+        client_ms = meta.get("last_latency_ms")
+        if isinstance(client_ms, (int, float)) and client_ms >= 0:
+            self._client_ms.append(client_ms)
+            self.metrics.latency(client_ms=client_ms)
+        with self._cond:
+            superseded = self._pending is not None
+            self._pending = (image_bytes, meta, time.perf_counter())
+            self.received += 1
+            if superseded:
+                self.dropped += 1
+            self._cond.notify()
+        self.metrics.add(received=1, dropped=int(superseded))
+
+    def close(self, timeout=None):
+        """Stop after the frame in progress; a frame still waiting is dropped."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            if self._pending is not None:
+                self._pending = None
+                self.dropped += 1
+                self.metrics.add(dropped=1)
+            self._cond.notify()
+        self._thread.join(timeout)
+        self.metrics.add(active=-1)
+
+    def send(self, message):
+        with self._send_lock:
+            self._send(json.dumps(message))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "frames_received": self.received,
+                "frames_processed": self.processed,
+                "frames_dropped": self.dropped,
+                "errors": self.errors,
+                "pending": self._pending is not None,
+                "server_latency_ms": _percentiles(self._server_ms),
+                "client_latency_ms": _percentiles(self._client_ms),
+            }
+
+    # --------------------------------------------------------
+    # Worker
+    # --------------------------------------------------------
+
+    def _take(self):
+        with self._cond:
+            while self._pending is None and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            item, self._pending = self._pending, None
+            return item
+
+    def _run(self):
+        while True:
+            item = self._take()
+            if item is None:
+                return
+            image_bytes, meta, received_at = item
+            try:
+                result = self.process(image_bytes, meta)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            server_ms = (time.perf_counter() - received_at) * 1000
+            ok = result.get("success", False)
+            with self._cond:
+                self.processed += 1
+                self.errors += not ok
+                self._server_ms.append(server_ms)
+                dropped = self.dropped
+            self.metrics.add(processed=1, errors=int(not ok))
+            self.metrics.latency(server_ms=server_ms)
+            try:
+                self.send({
+                    "type": "result", "seq": meta.get("seq"), "sent_at": meta.get("sent_at"),
+                    "server_ms": round(server_ms, 2), "dropped": dropped, **result,
+                })
+            except Exception:
+                return  # connection gone; the receive loop closes the session
@@ -21,7 +21,7 @@ export default function DetectionCard({ detection, onPress, onDelete }) {
       {/* Thumbnail */}
       {detection.image_filename && (
         <Image
-          source={{ uri: getImageUrl(detection.image_filename) }}
+          source={{ uri: getImageUrl(detection.image_filename, "thumb") }}
           style={styles.thumbnail}
           resizeMode="cover"
         />
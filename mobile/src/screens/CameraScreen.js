@@ -128,8 +128,13 @@ export default function CameraScreen({ navigation }) {
       }
     } catch (err) {
       if (isMountedRef.current) {
-        console.warn("Detection error:", err.message);
-        setStatusText("Error — check connection");
+        if (err.response && err.response.status === 503) {
+          // Overloaded (or model loading): the next capture tries again
+          setStatusText("Server busy — skipping frame");
+        } else {
+          console.warn("Detection error:", err.message);
+          setStatusText("Error — check connection");
+        }
       }
     }
   };
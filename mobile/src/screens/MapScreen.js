@@ -1,9 +1,10 @@
 /**
  * MapScreen
- * Displays all GPS-tagged detections on a map with color-coded markers.
+ * Displays GPS-tagged detections in the visible region: server-side
+ * clusters when zoomed out, color-coded markers when zoomed in.
  */
 
-import React, { useState, useCallback } from "react";
+import React, { useState, useCallback, useRef } from "react";
 import {
   View,
   Text,
@@ -29,22 +30,18 @@ const DEFAULT_REGION = {
 
 export default function MapScreen() {
   const [markers, setMarkers] = useState([]);
+  const [clusters, setClusters] = useState([]);
+  const [total, setTotal] = useState(0);
   const [loading, setLoading] = useState(true);
-  const [region, setRegion] = useState(DEFAULT_REGION);
+  const regionRef = useRef(DEFAULT_REGION);
 
-  const loadMarkers = async () => {
+  const loadMarkers = async (visibleRegion) => {
     try {
-      const data = await getMapData();
-      if (data.success && data.markers && data.markers.length > 0) {
-        setMarkers(data.markers);
-
-        // Center map on first marker
-        setRegion({
-          latitude: data.markers[0].lat,
-          longitude: data.markers[0].lng,
-          latitudeDelta: 0.02,
-          longitudeDelta: 0.02,
-        });
+      const data = await getMapData(visibleRegion);
+      if (data.success) {
+        setMarkers(data.markers || []);
+        setClusters(data.clusters || []);
+        setTotal(data.total || 0);
       }
     } catch (err) {
       console.warn("Failed to load map markers:", err.message);
@@ -56,10 +53,15 @@ export default function MapScreen() {
   useFocusEffect(
     useCallback(() => {
       setLoading(true);
-      loadMarkers();
+      loadMarkers(regionRef.current);
     }, [])
   );
 
+  const onRegionChangeComplete = (newRegion) => {
+    regionRef.current = newRegion;
+    loadMarkers(newRegion);
+  };
+
   if (loading) {
     return (
       <View style={styles.centered}>
@@ -74,7 +76,7 @@ export default function MapScreen() {
       {/* Header */}
       <View style={styles.header}>
         <Text style={styles.title}>Damage Map</Text>
-        <Text style={styles.count}>{markers.length} locations</Text>
+        <Text style={styles.count}>{total} detections</Text>
       </View>
 
       {/* Legend */}
@@ -90,11 +92,42 @@ export default function MapScreen() {
       {/* Map */}
       <MapView
         style={styles.map}
-        initialRegion={region}
+        initialRegion={regionRef.current}
         showsUserLocation={true}
         showsMyLocationButton={true}
+        onRegionChangeComplete={onRegionChangeComplete}
       >
-        {markers.map((marker, idx) => {
+        {clusters.map((cluster) => {
+          const info = DAMAGE_COLORS[cluster.dominant_code] || { color: "#888" };
+          return (
+            <Marker
+              key={`c${cluster.cell}`}
+              coordinate={{
+                latitude: cluster.latitude,
+                longitude: cluster.longitude,
+              }}
+            >
+              <View style={[styles.cluster, { backgroundColor: info.color }]}>
+                <Text style={styles.clusterText}>{cluster.count}</Text>
+              </View>
+              <Callout>
+                <View style={styles.callout}>
+                  <Text style={styles.calloutTitle}>
+                    {cluster.count} detections
+                  </Text>
+                  <Text style={styles.calloutText}>
+                    Mostly: {info.name || cluster.dominant_code}
+                  </Text>
+                  <Text style={styles.calloutText}>
+                    Max severity: {cluster.max_severity}
+                  </Text>
+                </View>
+              </Callout>
+            </Marker>
+          );
+        })}
+
+        {markers.map((marker) => {
           const info = DAMAGE_COLORS[marker.damage_code] || {
             name: marker.damage_code,
             color: "#888",
@@ -102,10 +135,10 @@ export default function MapScreen() {
 
           return (
             <Marker
-              key={idx}
+              key={marker.id}
               coordinate={{
-                latitude: marker.lat,
-                longitude: marker.lng,
+                latitude: marker.latitude,
+                longitude: marker.longitude,
               }}
               pinColor={info.color}
             >
@@ -127,9 +160,9 @@ export default function MapScreen() {
         })}
       </MapView>
 
-      {markers.length === 0 && (
+      {total === 0 && (
         <View style={styles.emptyOverlay}>
-          <Text style={styles.emptyText}>No GPS-tagged detections yet.</Text>
+          <Text style={styles.emptyText}>No GPS-tagged detections in this area.</Text>
           <Text style={styles.emptyHint}>
             Detections with GPS coordinates will appear here as map markers.
           </Text>
@@ -197,6 +230,21 @@ const styles = StyleSheet.create({
     borderTopRightRadius: 16,
     overflow: "hidden",
   },
+  cluster: {
+    minWidth: 30,
+    height: 30,
+    borderRadius: 15,
+    paddingHorizontal: 6,
+    justifyContent: "center",
+    alignItems: "center",
+    borderWidth: 2,
+    borderColor: "#fff",
+  },
+  clusterText: {
+    color: "#fff",
+    fontWeight: "700",
+    fontSize: 12,
+  },
   callout: {
     padding: 8,
     minWidth: 150,
@@ -6,11 +6,17 @@
 import axios from "axios";
 import { API_URL } from "../config";
 
+const TIMEOUT_MS = 15000;
+
 const api = axios.create({
   baseURL: API_URL,
-  timeout: 15000, // 15 second timeout
+  timeout: TIMEOUT_MS, // 15 second timeout
 });
 
+// Identifies this app run, so the backend can recognise repeated frames
+// (e.g. while stopped at a light) and return its cached result
+const SESSION_ID = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+
 /**
  * Send an image to the backend for YOLOv5 detection.
  * @param {string} imageUri - Local URI of the captured image
@@ -34,31 +40,104 @@ export async function detectDamage(imageUri, location = null) {
   }
 
   formData.append("save", "true");
+  formData.append("session_id", SESSION_ID);
 
+  // The server sheds frames it cannot answer before we would give up
+  // (HTTP 503 + Retry-After) instead of working on them anyway
   const response = await api.post("/detect", formData, {
-    headers: { "Content-Type": "multipart/form-data" },
+    headers: {
+      "Content-Type": "multipart/form-data",
+      "X-Deadline-Ms": String(TIMEOUT_MS - 2000), // leave time for the upload and reply
+    },
   });
 
   return response.data;
 }
 
+/**
+ * Open a streaming detection session (WebSocket /stream).
+ * Frames go over one connection and results arrive as they complete; if
+ * frames are sent faster than the server can process them, the server
+ * keeps only the newest waiting frame, so results never lag behind.
+ * @param {function} onMessage - Called with each server message
+ *   ({ type: "result", seq, detections, dropped, ... } | { type: "ready" | "stats" | "error", ... })
+ * @param {function} onClose - Called when the connection closes (optional)
+ * @returns {object} - { sendFrame(imageUri, location), requestStats(), close() }
+ */
+export function openDetectionStream(onMessage, onClose = null) {
+  const url = `${API_URL.replace(/^http/, "ws")}/stream?session_id=${encodeURIComponent(SESSION_ID)}&save=true`;
+  const socket = new WebSocket(url);
+  let seq = 0;
+  let lastLatencyMs = null;
+
+  socket.onmessage = (event) => {
+    const message = JSON.parse(event.data);
+    if (message.type === "result" && message.sent_at) {
+      // End-to-end latency on our own clock, reported with the next frame
+      lastLatencyMs = Date.now() - message.sent_at;
+    }
+    onMessage(message);
+  };
+  socket.onclose = () => onClose && onClose();
+
+  return {
+    async sendFrame(imageUri, location = null) {
+      if (socket.readyState !== WebSocket.OPEN) return false;
+      const image = await (await fetch(imageUri)).blob();
+      socket.send(
+        JSON.stringify({
+          seq: seq++,
+          latitude: location ? location.latitude : null,
+          longitude: location ? location.longitude : null,
+          sent_at: Date.now(),
+          last_latency_ms: lastLatencyMs,
+        })
+      );
+      socket.send(image);
+      return true;
+    },
+    requestStats() {
+      if (socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify({ type: "stats" }));
+    },
+    close() {
+      socket.close();
+    },
+  };
+}
+
 /**
  * Get detection history from the backend.
  * @param {number} limit - Number of records to fetch
  * @param {number} offset - Offset for pagination
- * @returns {object} - { success, records, total }
+ * @param {string} cursor - `next_cursor` from the previous page (faster than offset)
+ * @returns {object} - { success, records, total, next_cursor }
  */
-export async function getHistory(limit = 50, offset = 0) {
-  const response = await api.get("/history", { params: { limit, offset } });
+export async function getHistory(limit = 50, offset = 0, cursor = null) {
+  const params = cursor ? { limit, cursor } : { limit, offset };
+  const response = await api.get("/history", { params });
   return response.data;
 }
 
 /**
  * Get map markers (detections with GPS coordinates).
- * @returns {object} - { success, markers, total }
+ * With a visible region, the server returns clusters when zoomed out and
+ * individual markers when zoomed in.
+ * @param {object} region - react-native-maps region, or null for all markers
+ * @returns {object} - { success, mode, clusters | markers, total }
  */
-export async function getMapData() {
-  const response = await api.get("/history/map");
+export async function getMapData(region = null) {
+  const params = {};
+  if (region) {
+    const { latitude, longitude, latitudeDelta, longitudeDelta } = region;
+    params.bbox = [
+      longitude - longitudeDelta / 2,
+      latitude - latitudeDelta / 2,
+      longitude + longitudeDelta / 2,
+      latitude + latitudeDelta / 2,
+    ].join(",");
+    params.zoom = Math.round(Math.log2(360 / longitudeDelta));
+  }
+  const response = await api.get("/history/map", { params });
   return response.data;
 }
 
@@ -96,8 +175,9 @@ export async function checkConnection() {
 /**
  * Get the full URL for an uploaded image.
  * @param {string} filename - Image filename from detection result
+ * @param {string} [size] - "thumb" (160 px) or "preview" (640 px); omit for the original
  * @returns {string} - Full URL
  */
-export function getImageUrl(filename) {
-  return `${API_URL}/uploads/${filename}`;
+export function getImageUrl(filename, size) {
+  return `${API_URL}/uploads/${filename}${size ? `?size=${size}` : ""}`;
 }